@@ -1,256 +1,550 @@
-from flask import Flask, render_template, request
-import folium
-import networkx as nx
-import xml.etree.ElementTree as ET
+import io
+import itertools
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import (Flask, abort, copy_current_request_context, g, has_request_context, jsonify, make_response,
+                   redirect, render_template, request, stream_with_context, url_for)
+from markupsafe import escape
+import numpy as np
+
+from batch_routing import ElementTooLarge, iter_pairs, stream_routes
+from kml_store import KMLGeometryStore, extract_route_coordinates_from_kml, file_digest
+from map_cache import ByteLRUCache, MapArtifactStore
+from map_layers import OVERLAY_PLACEHOLDER, LayeredMap
+from metrics import MetricsRegistry
+from network_model import load_network
+from raptor import RaptorEngine
+from render_pool import RenderPool, RenderQueueFull
+from routing_engine import RouteTable, RoutingEngine, haversine_km, polyline_length_km
+from segment_table import build_segment_tables
+from simplify import tolerance_for_zoom, zoom_for_bounds
+from spatial_index import StationIndex, nearest_vertex_scan
+from station_catalog import StationCatalog
+from station_search import StationSearchIndex
+from startup_artifact import load_startup_artifact, network_fingerprint, save_startup_artifact
+from timetable import Timetable, format_gtfs_time, load_gtfs, parse_gtfs_time, synthetic_feed
+from vector_tiles import NetworkTiles
 
 app = Flask(__name__)
 
-# Define metro stations and their coordinates
-corridor_1 = {  # Red Line
-    "Sarthana": (21.236086, 72.9084832),
-    "Nature Park": (21.2290956, 72.8978939),
-    "Varachha Chopati Garden": (21.2232511, 72.8860303),
-    "Shri Swaminarayan Mandir (Kalakuj)": (21.2194506, 72.8764763),
-    "Kapodra": (21.2164576, 72.8674935),
-    "Labheshwar Chowk": (21.210109, 72.8572694),
-    "Central Warehouse": (21.2059456, 72.8480292),
-    "Surat Railway Station": (21.2041852,72.8426996),
-    "Maskati Hospital": (21.197986,72.8329793),
-    "Chowk Bazar": (21.1945927,72.8185266),
-    "Kadarsha Ni Nal": (21.1869574,72.8193993),
-    "Majura Gate": (21.1807111,72.8185441),
-    "Rupali Canal": (21.1711507,72.8160023),
-    "Althan Tenament": (21.161746,72.8114613),
-    "Althan Gam": (21.1543952,72.8089202),
-    "VIP Road": (21.1453708,72.8051957),
-    "Woman ITI": (21.1360053,72.8009184),
-    "Bhimrad": (21.130703,72.7983709),
-    "Convention Center": (21.1224239,72.7995601),
-    "Surat Dream City Station": (21.1092915,72.7986141)
-}
+# Route geometry is parsed once and shared; it is re-read only when base.kml changes
+KML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base.kml')
+kml_geometry = KMLGeometryStore(KML_PATH)
+
+# Rendered route maps keyed by (view, start, end, line filter, renderer version).
+# Bump RENDERER_VERSION whenever the map output changes so stale entries are never served.
+RENDERER_VERSION = 4
+MAP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+rendered_maps = ByteLRUCache(MAP_CACHE_MAX_BYTES)
+
+
+# Every rendered map is published as a content-addressed artifact served from /maps/<digest>.html,
+# so each page iframes the exact map it rendered. The directory lets other workers serve it too;
+# it lives under the app's build directory rather than a shared /tmp, and is pruned to its budget.
+MAP_ARTIFACT_DIR = os.environ.get(
+    'METRO_MAP_ARTIFACT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build', 'map_artifacts')
+)
+MAP_ARTIFACT_MAX_DISK_BYTES = 4 * MAP_CACHE_MAX_BYTES
+map_artifacts = MapArtifactStore(MAP_CACHE_MAX_BYTES, MAP_ARTIFACT_DIR, MAP_ARTIFACT_MAX_DISK_BYTES)
+
+
+def publish_map(map_html):
+    """
+    Publish a rendered map document (bytes) and return the URL to iframe.
+    """
+    digest = map_artifacts.publish(map_html)
+    return url_for('map_artifact', digest=digest)
+
+
+# Per-endpoint request latency and per-stage pipeline timings, exposed on /metrics.
+# Recording is a few increments; all formatting happens when /metrics is scraped.
+request_metrics = MetricsRegistry()
+request_metrics.describe('metro_requests_total', 'Requests handled, by endpoint, method and status')
+request_metrics.describe('metro_request_duration_seconds', 'Request latency, by endpoint')
+request_metrics.describe('metro_stage_duration_seconds',
+                         'Time spent in each request pipeline stage (geometry, route, folium_build, '
+                         'overlay, serialize, publish, search, template), by endpoint')
+
+
+def _stage_labels(stage):
+    endpoint = request.endpoint if has_request_context() else None
+    return (('endpoint', endpoint or 'none'), ('stage', stage))
+
+
+def timed_stage(stage):
+    """
+    Context manager timing a block as a pipeline stage of the current endpoint.
+    """
+    return request_metrics.time('metro_stage_duration_seconds', _stage_labels(stage))
+
+
+@app.context_processor
+def line_context():
+    # Network name and line colors for every page, whatever lines the network has
+    return {'network_name': network.name, 'line_colors': LINE_COLORS}
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        request_metrics.observe('metro_request_duration_seconds', (('endpoint', endpoint),),
+                                time.perf_counter() - start)
+        request_metrics.inc('metro_requests_total',
+                            (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+    return response
+
+
+def map_cache_key(view, start, end, line_filter):
+    # The KML digest is part of the key so edited geometry is never served from cache
+    return (view, start, end, line_filter, RENDERER_VERSION, kml_geometry.digest)
+
+
+# Route maps are rendered on a bounded pool of worker threads, so a request returns as soon as
+# its route is known and the map follows when ready. When the queue is full, renders are rejected
+# rather than queued without bound.
+RENDER_WORKERS = int(os.environ.get('METRO_RENDER_WORKERS', 2))
+RENDER_QUEUE_MAX = int(os.environ.get('METRO_RENDER_QUEUE', 16))
+RENDER_POLL_SECONDS = 1
+request_metrics.describe('metro_render_wait_seconds', 'Time background map renders spent queued, by view')
+request_metrics.describe('metro_render_duration_seconds', 'Background map render time, by view')
+
+
+def record_render(job):
+    labels = (('view', job.key[0]),)
+    request_metrics.observe('metro_render_wait_seconds', labels, job.wait_seconds())
+    request_metrics.observe('metro_render_duration_seconds', labels, job.render_seconds())
+
+
+render_pool = RenderPool(RENDER_WORKERS, RENDER_QUEUE_MAX, on_finish=record_render)
+
+
+def render_in_background(cache_key, render):
+    """
+    Render a map document on the render pool, unless it is already rendering.
+
+    The worker runs in a copy of the current request context, so its stage
+    timings are recorded under the requesting endpoint. The document is put
+    into rendered_maps and published; the job's result is the artifact digest.
+
+    Args:
+        cache_key (tuple): map_cache_key() of the document
+        render (callable): Returns the map document as bytes
+
+    Returns:
+        RenderJob or None if the render queue is full
+    """
+    @copy_current_request_context
+    def run():
+        map_html = render()
+        rendered_maps.put(cache_key, map_html)
+        with timed_stage('publish'):
+            return map_artifacts.publish(map_html)
+
+    try:
+        return render_pool.submit(cache_key, run)
+    except RenderQueueFull:
+        return None
+
+
+def render_pending_response(refresh_url, job=None):
+    """
+    202 placeholder page for a map that is still rendering. It reloads
+    refresh_url every RENDER_POLL_SECONDS, so it also works inside an
+    iframe and without JavaScript. X-Render-Job names the job for
+    /api/render. Without a job, the render was rejected and the page is a
+    503 asking the client to retry.
+    """
+    status = 202 if job is not None else 503
+    message = 'Rendering map&hellip;' if job is not None else 'The map renderer is busy, retrying&hellip;'
+    body = (f'<!DOCTYPE html><html><head><meta charset="utf-8">'
+            f'<meta http-equiv="refresh" content="{RENDER_POLL_SECONDS};url={escape(refresh_url)}">'
+            f'<title>Rendering map</title></head>'
+            f'<body style="margin:0;display:flex;align-items:center;justify-content:center;height:100vh;'
+            f'font-family:sans-serif;color:#555">{message}</body></html>')
+    response = app.response_class(body, status=status, mimetype='text/html')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['Retry-After'] = str(RENDER_POLL_SECONDS)
+    if job is not None:
+        response.headers['X-Render-Job'] = job.id
+    return response
+
+# Lines, stations and their coordinates are data, loaded from network.json (or METRO_NETWORK)
+NETWORK_PATH = os.environ.get('METRO_NETWORK', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'network.json'))
+network = load_network(NETWORK_PATH)
 
-corridor_2 = {  # Green Line
-    "Bheshan": (21.2183247,72.7647846),
-    "Botanical Garden": (21.2214452,72.7770538),
-    "Ugat Vaarigruh": (21.2182041,72.7812077),
-    "Palanpur Road": (21.2089361,72.7825809),
-    "L P Savani School": (21.1999268,72.7826694),
-    "Performing Art Centre": (21.1946262,72.7862638),
-    "Adajan Gam": (21.1897933,72.7892611),
-    "Aquarium": (21.1862338,72.792351),
-    "Badri Narayan Temple": (21.1877719,72.8010253),
-    "Athwa Chopati": (21.1848672,72.8083791),
-    "Majura Gate": (21.1807111,72.8185441),  # Bnuuy
-    "Udhna Darwaja": (21.183866,72.8321091),
-    "Kamela Darwaja": (21.1870192,72.8390921),
-    "Anjana Farm": (21.185375,72.8489572),
-    "Model Town": (21.1861302,72.855636),
-    "Magob": (21.1902815,72.868475),
-    "Cancer Hospital": (21.1898563,72.878821),
-    "Saroli": (21.1889488,72.8933009)
-}
 
-# Extract route coordinates from KML file
-def extract_route_coordinates_from_kml(kml_file_path):
-    # Parse the KML file
-    tree = ET.parse(kml_file_path)
-    root = tree.getroot()
-    
-    # Define namespace for KML
-    ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-    
-    # Find all Placemarks
-    routes = {}
-    
-    for placemark in root.findall('.//kml:Placemark', ns):
-        # Get the name of the route
-        name_elem = placemark.find('kml:name', ns)
-        if name_elem is not None:
-            route_name = name_elem.text
-            
-            # Find LineString coordinates
-            coords_elem = placemark.find('.//kml:coordinates', ns)
-            if coords_elem is not None:
-                # Parse coordinates
-                coord_text = coords_elem.text.strip()
-                coordinates = []
-                
-                for coord in coord_text.split():
-                    parts = coord.split(',')
-                    if len(parts) >= 2:
-                        # KML format is longitude,latitude,altitude - we need latitude,longitude for Folium
-                        lon = float(parts[0])
-                        lat = float(parts[1])
-                        coordinates.append((lat, lon))
-                
-                routes[route_name] = coordinates
-    
-    return routes
-
-# Make sure the function to get station line works
 def get_station_line(station):
-    if station in corridor_1:
-        return "Red Line"  # This corresponds to "Orange Line" in KML
-    elif station in corridor_2:
-        return "Green Line"
-    return None
-
-# Build the graph for shortest path calculation
-G = nx.Graph()
-for corridor in [corridor_1, corridor_2]:
-    station_list = list(corridor.keys())
-    for i in range(len(station_list) - 1):
-        G.add_edge(station_list[i], station_list[i + 1])
+    """
+    Return the first line serving station, or None for unknown stations.
+    """
+    return network.primary_line(station)
 
 # Routes for station lookup
-all_stations = {**corridor_1, **corridor_2}
-stations = list(set(list(corridor_1.keys()) + list(corridor_2.keys())))
-intersection_stations = ["Majura Gate"]  # As defined in your original code
+all_stations = network.station_coords
+intersection_stations = network.transfer_stations  # Stations served by more than one line
 
-@app.route('/all_routes', methods=['GET', 'POST'])
-def show_all_routes():
-    # Create the map centered on Surat
-    metro_map = folium.Map(location=[21.2, 72.85], zoom_start=12, tiles='cartodbpositron')
-    
-    # Extract KML data (make sure the path is correct)
-    kml_routes = extract_route_coordinates_from_kml('base.kml')
-    
-    # Map KML route names to our corridor names and colors
-    route_mapping = {
-        'Green Line': {
-            'kml_name': 'Green Line',
-            'color': '#00ff00',  # Bright green
-            'emoji': '🟢',
-            'stations': list(corridor_2.keys())
-        },
-        'Red Line': {  # This is "Orange Line" in the KML
-            'kml_name': 'Orange Line',
-            'color': '#ff0000',  # Bright red (or you could use orange: '#FFA500')
-            'emoji': '🔴',
-            'stations': list(corridor_1.keys())
-        }
+# Every station with its lines, transfer flag and sort key, in the order all pages and APIs list them
+station_catalog = StationCatalog(network)
+stations = station_catalog.names
+
+# Typeahead search over station names and aliases, built on first use. Above STATION_DROPDOWN_MAX
+# stations the index page asks for names as they are typed instead of listing every one.
+STATION_SEARCH_MAX_LIMIT = 50
+STATION_DROPDOWN_MAX = 200
+_station_search = {'version': None, 'index': None}
+
+
+def station_search():
+    """
+    Return the StationSearchIndex over the station catalog, building it on first use.
+    """
+    if _station_search['version'] != station_catalog.version:
+        with _network_lock:
+            if _station_search['version'] != station_catalog.version:
+                _station_search['index'] = StationSearchIndex(
+                    [(station.name, station.aliases) for station in station_catalog], STATION_SEARCH_MAX_LIMIT)
+                _station_search['version'] = station_catalog.version
+    return _station_search['index']
+
+
+def resolve_station(text):
+    """
+    Return the station text names exactly, ignoring case, punctuation and
+    abbreviations or by one of its aliases, or None.
+    """
+    if not text or text in all_stations:
+        return text or None
+    matches = station_search().search(text, 1)
+    return matches[0].station if matches and matches[0].match == 'exact' else None
+
+
+def dropdown_stations():
+    # The station names to list in the index page's dropdowns, or None to search as the user types
+    return stations if len(stations) <= STATION_DROPDOWN_MAX else None
+
+# The routing engine and the all-pairs route table are built together by build_network()
+routing_engine = None
+route_table = None
+network_version = 0
+_network_digest = None
+_network_lock = threading.RLock()
+
+# Prebuilt network loaded by create_app(), so new workers skip parsing and precomputation.
+# Build it with `flask --app base build-startup-artifact`, or let the first worker write it.
+STARTUP_ARTIFACT_PATH = os.environ.get(
+    'METRO_STARTUP_ARTIFACT',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build', 'startup_artifact.pkl')
+)
+startup_timings = {}
+
+# Routing engine parameters
+METRO_SPEED_KMH = 34.0  # Average in-vehicle speed
+DWELL_SECONDS = 30.0  # Stop time at each station
+TRANSFER_PENALTY_SECONDS = 300.0  # Walking and waiting when changing lines
+
+# KML placemark name for each line
+KML_LINE_NAMES = {name: line.kml_name for name, line in network.lines.items()}
+LINE_COLORS = {name: line.color for name, line in network.lines.items()}
+
+# Timetable for /api/journey: a GTFS feed (directory or .zip) from METRO_GTFS, otherwise a
+# synthetic timetable generated from the network with a fixed headway
+GTFS_PATH = os.environ.get('METRO_GTFS')
+SYNTHETIC_HEADWAY_SECONDS = 600
+SYNTHETIC_TRANSFER_SECONDS = 180
+_journey_engine = {'key': None, 'engine': None}
+
+# Above this many stations, routes are searched per request instead of read from the route table.
+# At 400 stations the table builds in about 0.1 s and holds 2.6 MB (10 MB at 800): its arrays grow
+# with stations x (station, line) states, and it is pickled into the startup artifact.
+ROUTE_TABLE_MAX_STATIONS = 400
+
+# Per-line station-to-station geometry, rebuilt when the KML or the network changes
+_segment_tables = {'key': None, 'tables': {}}
+
+
+def get_line_stations():
+    """
+    Return each line's stations in order, keyed by line name.
+    """
+    return network.line_stations()
+
+
+def segment_tables():
+    """
+    Return the LineSegmentTable for each KML line, keyed by KML line name.
+    """
+    key = (kml_geometry.digest, network_version)
+    if _segment_tables['key'] != key:
+        line_stations = {KML_LINE_NAMES[line]: station_list for line, station_list in get_line_stations().items()}
+        _segment_tables['tables'] = build_segment_tables(kml_geometry, line_stations, all_stations)
+        _segment_tables['key'] = key
+    return _segment_tables['tables']
+
+
+# Zoom level the network overview maps open at
+OVERVIEW_ZOOM = 12
+
+
+def line_geometry(kml_name, tolerance=0.0):
+    """
+    Return a whole KML line simplified to tolerance (metres, one of
+    SIMPLIFY_TOLERANCES_M), or at full resolution if it has no segment table.
+    """
+    table = segment_tables().get(kml_name)
+    if table is None:
+        return kml_geometry.get(kml_name)
+    return table.line(tolerance)
+
+
+# The network layer as z/x/y GeoJSON tiles, built once per network and KML version
+TILE_MIN_ZOOM = 10
+TILE_MAX_ZOOM = 16
+_network_tiles = {'key': None, 'tiles': None}
+
+
+def network_tiles():
+    """
+    Return the NetworkTiles for the current network, building them on first use.
+    Each zoom level is cut from the line geometry simplified for that zoom.
+    """
+    key = (kml_geometry.digest, network_version)
+    if _network_tiles['key'] != key:
+        with _network_lock:
+            route_mapping = get_route_mapping()
+            latitude = network.center[0]
+            lines = [{
+                'name': line,
+                'id': data['id'],
+                'color': data['color'],
+                'geometry': lambda zoom, kml_name=data['kml_name']: line_geometry(
+                    kml_name, tolerance_for_zoom(zoom, latitude))
+            } for line, data in route_mapping.items() if kml_geometry.get(data['kml_name']) is not None]
+            stations = [{
+                'name': station.name,
+                'coord': (station.lat, station.lon),
+                'lines': list(station.line_ids),
+                'color': station.color,
+                'transfer': station.is_transfer
+            } for station in station_catalog if station.lines]
+            _network_tiles['tiles'] = NetworkTiles(lines, stations, TILE_MIN_ZOOM, TILE_MAX_ZOOM)
+            _network_tiles['key'] = key
+    return _network_tiles['tiles']
+
+
+def network_tiles_config():
+    """
+    What the browser needs to load the network tiles: the versioned URL
+    template and the zoom range.
+    """
+    tiles = network_tiles()
+    return {
+        'url': f"/tiles/network/{tiles.version}/{{z}}/{{x}}/{{y}}.geojson",
+        'min_zoom': tiles.min_zoom,
+        'max_zoom': tiles.max_zoom,
     }
+
+
+def add_network_tile_layer(metro_map, line_ids=None, stations=False, opacity=1.0):
+    """
+    Draw the network lines on a folium map from the network tiles, instead of
+    inlining their polylines into the document.
     
-    # Plot each route using KML data
-    for route_name, route_data in route_mapping.items():
-        kml_name = route_data['kml_name']
-        
-        if kml_name in kml_routes:
-            # Draw the route line using KML coordinates
-            folium.PolyLine(
-                locations=kml_routes[kml_name],
-                color=route_data['color'],
-                weight=4,
-                opacity=1.0,
-                popup=route_name
-            ).add_to(metro_map)
-        
-        # Add station markers
-        for station in route_data['stations']:
-            coord = all_stations[station]
-            
-            # Skip intersection stations that are already added
-            if station in intersection_stations and route_name == 'Red Line' and station in corridor_2:
-                continue
-                
-            # Create custom HTML for the popup
-            popup_html = f"""
-            <div style="font-family: Arial; text-align: center;">
-                <h4 style="margin: 0;">{station}</h4>
-                <p style="margin: 5px 0;">{route_data['emoji']} {route_name}</p>
-            </div>
-            """
-            
-            # Add the marker
-            folium.Marker(
-                location=coord,
-                popup=folium.Popup(popup_html, max_width=200),
-                tooltip=station,
-                icon=folium.DivIcon(
-                    html=f'<div style="font-size: 15px; text-align: center;">🚉</div>',
-                    icon_size=(20, 20),
-                    icon_anchor=(10, 10)
-                )
-            ).add_to(metro_map)
-            
-            # Add circle marker for better visibility
-            folium.CircleMarker(
-                location=coord,
-                radius=3,
-                color=route_data['color'],
-                fill=True,
-                fillColor=route_data['color'],
-                fillOpacity=1,
-                weight=2,
-                opacity=0.8
-            ).add_to(metro_map)
+    Args:
+        line_ids (list): Only draw these lines, by id (default: every line)
+        stations (bool): Also draw the stations, with transfers ringed
+        opacity (float): Line opacity
+    """
+    import folium
+    from branca.element import MacroElement
+    from folium.template import Template
     
-    # Save the map
-    metro_map.save("static/map.html")
+    config = network_tiles_config()
+    metro_map.get_root().header.add_child(folium.JavascriptLink('/static/network_tiles.js'))
     
-    return render_template('index.html', 
-                         all_routes=route_mapping, 
-                         stations=stations,
-                         show_map=True)
+    layer = MacroElement()
+    layer._name = 'NetworkTileLayer'
+    layer._template = Template("""
+        {% macro script(this, kwargs) %}
+            networkTileLayer({{ this.url|tojavascript }}, {{ this.options|tojavascript }}).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+    layer.url = config['url']
+    layer.options = {'minZoom': config['min_zoom'], 'maxZoom': config['max_zoom'], 'lines': line_ids,
+                     'stations': stations, 'opacity': opacity}
+    layer.add_to(metro_map)
 
-@app.route('/route_info', methods=['GET'])
-def route_info():
-    # Create the map
-    metro_map = folium.Map(location=[21.2, 72.85], zoom_start=12, tiles='cartodbpositron')
-    
-    # Extract KML data
-    kml_routes = extract_route_coordinates_from_kml('base.kml')
-    
-    # Map KML route names to our corridor names and colors
-    route_mapping = {
-        'Green Line': {
-            'kml_name': 'Green Line',
-            'color': '#00ff00',
-            'emoji': '🟢',
-            'stations': list(corridor_2.keys()),
-            'coords': list(corridor_2.values())
-        },
-        'Red Line': {  # This is "Orange Line" in the KML
-            'kml_name': 'Orange Line',
-            'color': '#ff0000',
-            'emoji': '🔴',
-            'stations': list(corridor_1.keys()),
-            'coords': list(corridor_1.values())
+
+def map_tolerance(bounds):
+    """
+    Simplification tolerance for a map fitted to bounds.
+    """
+    return tolerance_for_zoom(zoom_for_bounds(bounds), network.center[0])
+
+
+def get_route_mapping():
+    """
+    Map our line names to their KML route names, colors, emoji, stations and
+    station coordinates. Built once per network version.
+    """
+    if _route_mapping['version'] != network_version:
+        _route_mapping['mapping'] = {
+            name: {
+                'id': line.id,
+                'kml_name': line.kml_name,
+                'color': line.color,
+                'emoji': line.emoji,
+                'stations': list(line.stations),
+                'coords': [all_stations[station] for station in line.stations]
+            }
+            for name, line in network.lines.items()
         }
-    }
+        _route_mapping['version'] = network_version
+    return _route_mapping['mapping']
+
+
+# Network overview maps (/all_routes, /route_info and /map without a route) only change with the
+# network or the KML, so each one is rendered once and kept until either changes.
+OverviewMap = namedtuple('OverviewMap', ['html', 'etag', 'last_modified'])
+OVERVIEW_LINE_FILTERS = ('all',) + tuple(network.line_ids)
+_route_mapping = {'version': None, 'mapping': {}}
+_travel_times = {'version': None, 'matrix': None}
+_route_matrices = {'version': None, 'matrices': None}
+
+# Isochrone overlay colors, for the first, second and last third of the time budget
+ISOCHRONE_COLORS = ('#1a9850', '#fdae61', '#d73027')
+_overview_maps = {'key': None, 'maps': {}}
+
+
+def overview_map(view, line_filter=None):
+    """
+    Return the cached OverviewMap for a view ('all_routes', 'route_info' or
+    'map'), rendering it on first use.
+    """
+    key = (kml_geometry.digest, network_version, RENDERER_VERSION)
+    if _overview_maps['key'] != key:
+        _overview_maps['maps'] = {}
+        _overview_maps['key'] = key
     
-    # Plot each route using KML data
-    for route_name, route_data in route_mapping.items():
-        kml_name = route_data['kml_name']
-        
-        if kml_name in kml_routes:
-            # Draw the route line using KML coordinates
-            folium.PolyLine(
-                locations=kml_routes[kml_name],
-                color=route_data['color'],
-                weight=4,
-                opacity=1.0,
-                popup=route_name
-            ).add_to(metro_map)
-            
-        # Add station markers
+    entry = _overview_maps['maps'].get((view, line_filter))
+    if entry is None:
+        # The base layer with an empty overlay
+        html = base_layer(view, line_filter or 'all').compose()
+        entry = OverviewMap(
+            html=html,
+            etag=MapArtifactStore.digest_of(html),
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0)
+        )
+        _overview_maps['maps'][(view, line_filter)] = entry
+    return entry
+
+
+def overview_response(body, overview, etag=None):
+    """
+    Wrap a page built around an overview map in a response that supports
+    conditional GET, so repeat clients get a 304. Without an explicit etag
+    one is derived from the body.
+    """
+    response = make_response(body)
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    response.last_modified = overview.last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def station_lines_html(station):
+    """
+    Popup text listing every line serving a station, e.g. "🔴 Red Line<br>🟢 Green Line".
+    """
+    return '<br>'.join(f"{network.lines[line].emoji} {line}" for line in network.lines_of(station))
+
+
+# Every map is a base network layer, rendered once per view and line filter, plus a per-request
+# overlay (route legs, station icons, isochrone circles) spliced into it as JSON. Composing a map
+# costs as much as its overlay, whatever the size of the network.
+_base_layers = {'key': None, 'layers': {}}
+
+# What each view's base layer draws: station markers (with popups) on the lines, transfer rings,
+# or only faded lines with the stations from the network tiles, under a route
+BASE_LAYER_STYLES = {
+    'all_routes': {'station_radius': 3, 'popups': True},
+    'route_info': {'station_radius': 3, 'popups': True},
+    'map': {'station_radius': 5, 'transfer_rings': True},
+    'index': {'faded': True},
+    'map_route': {'faded': True},
+}
+FADED_LINE_OPACITY = 0.35
+
+
+def add_overlay_slot(metro_map):
+    """
+    Add the slot a LayeredMap splices each request's overlay into; the
+    overlay is drawn by /static/map_overlay.js.
+    """
+    import folium
+    from branca.element import MacroElement
+    from folium.template import Template
+    
+    metro_map.get_root().header.add_child(folium.JavascriptLink('/static/map_overlay.js'))
+    
+    slot = MacroElement()
+    slot._name = 'MapOverlay'
+    slot._template = Template("""
+        {% macro script(this, kwargs) %}
+            drawMapOverlay({{ this._parent.get_name() }}, """ + OVERLAY_PLACEHOLDER + """);
+        {% endmacro %}
+    """)
+    slot.add_to(metro_map)
+
+
+def add_station_markers(metro_map, line_filter='all', station_radius=3, popups=False, transfer_rings=False):
+    """
+    Draw every station on the lines selected by line_filter once: an icon
+    marker and a circle in the color of the first selected line serving it.
+    
+    Args:
+        popups (bool): Give each marker a popup listing the lines serving the station
+        transfer_rings (bool): Ring the stations served by several lines
+    """
+    import folium
+    
+    drawn_stations = set()
+    for route_name, route_data in get_route_mapping().items():
+        if line_filter != 'all' and line_filter != route_data['id']:
+            continue
         for station, coord in zip(route_data['stations'], route_data['coords']):
-            # Skip intersection stations already added
-            if station in intersection_stations and route_name == 'Red Line' and station in corridor_2:
+            # Stations served by several lines are drawn once
+            if station in drawn_stations:
                 continue
-                
-            # Create popup HTML
-            popup_html = f"""
-            <div style="font-family: Arial; text-align: center;">
-                <h4 style="margin: 0;">{station}</h4>
-                <p style="margin: 5px 0;">{route_data['emoji']} {route_name}</p>
-            </div>
-            """
+            drawn_stations.add(station)
+            
+            popup = None
+            if popups:
+                popup_html = f"""
+                <div style="font-family: Arial; text-align: center;">
+                    <h4 style="margin: 0;">{station}</h4>
+                    <p style="margin: 5px 0;">{station_lines_html(station)}</p>
+                </div>
+                """
+                popup = folium.Popup(popup_html, max_width=200)
             
-            # Add marker
             folium.Marker(
                 location=coord,
-                popup=folium.Popup(popup_html, max_width=200),
+                popup=popup,
                 tooltip=station,
                 icon=folium.DivIcon(
                     html=f'<div style="font-size: 15px; text-align: center;">🚉</div>',
@@ -259,10 +553,10 @@ def route_info():
                 )
             ).add_to(metro_map)
             
-            # Add circle marker
+            # Add circle marker for better visibility
             folium.CircleMarker(
                 location=coord,
-                radius=3,
+                radius=station_radius,
                 color=route_data['color'],
                 fill=True,
                 fillColor=route_data['color'],
@@ -270,325 +564,833 @@ def route_info():
                 weight=2,
                 opacity=0.8
             ).add_to(metro_map)
-    
-    # Save the map
-    metro_map.save("static/map.html")
-    
-    return render_template('route_info.html', 
-                         routes=route_mapping,
-                         intersection_stations=intersection_stations)
+            
+            if transfer_rings and station in intersection_stations:
+                folium.CircleMarker(
+                    location=coord,
+                    radius=10,
+                    color="#FF6B6B",
+                    fill=False,
+                    weight=2,
+                    opacity=0.8,
+                    tooltip=f"Transfer Station: {station}"
+                ).add_to(metro_map)
 
 
-def find_nearest_point_index(kml_coords, station_coord):
+def build_base_map(view, line_filter='all'):
     """
-    Find the index of the point in kml_coords that is closest to station_coord
+    Build the folium map of a view's base network layer, with an overlay slot.
+    
+    The lines come from the network tiles, fetched by the browser and cached
+    across pages. Any line_filter other than 'all' or a line id draws no lines.
     """
-    min_dist = float('inf')
-    min_index = 0
+    # folium (with branca, jinja2 and requests) is imported on the first render, not at startup
+    import folium
     
-    for i, coord in enumerate(kml_coords):
-        # Calculate approximate distance (Euclidean, which is good enough for finding closest point)
-        dist = ((coord[0] - station_coord[0]) ** 2 + (coord[1] - station_coord[1]) ** 2) ** 0.5
-        
-        if dist < min_dist:
-            min_dist = dist
-            min_index = i
+    style = BASE_LAYER_STYLES[view]
+    metro_map = folium.Map(location=network.center, zoom_start=13 if view == 'index' else OVERVIEW_ZOOM,
+                           tiles='cartodbpositron')
     
-    return min_index
+    line_ids = None if line_filter == 'all' else [line_filter]
+    if style.get('faded'):
+        # Context for a route: the overlay draws the route on top at full strength
+        add_network_tile_layer(metro_map, line_ids, stations=True, opacity=FADED_LINE_OPACITY)
+    else:
+        add_network_tile_layer(metro_map, line_ids)
+        add_station_markers(metro_map, line_filter, style['station_radius'], style.get('popups', False),
+                            style.get('transfer_rings', False))
+    add_overlay_slot(metro_map)
+    return metro_map
+
+
+def fullscreen_document(map_html):
+    """
+    Wrap a folium map's HTML in the full-screen /map document.
+    """
+    return f"""
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>{network.name} Map</title>
+        <style>
+            body, html {{
+                margin: 0;
+                padding: 0;
+                height: 100vh;
+                width: 100%;
+                overflow: hidden;
+            }}
+            .folium-map {{
+                height: 100vh !important;
+                width: 100% !important;
+            }}
+            iframe {{
+                height: 100vh !important;
+                width: 100% !important;
+                border: none;
+            }}
+        </style>
+    </head>
+    <body>
+        {map_html}
+        <script>
+            // Fix iframe sizing after load
+            document.addEventListener('DOMContentLoaded', function() {{
+                var iframes = document.getElementsByTagName('iframe');
+                for(var i = 0; i < iframes.length; i++) {{
+                    iframes[i].style.height = '100vh';
+                    iframes[i].style.width = '100%';
+                }}
+            }});
+            // remove attribution
+            $('.leaflet-control-attribution').hide()
+        </script>
+    </body>
+    </html>
+    """
 
 
+def base_layer_ready(view, line_filter='all'):
+    key = (kml_geometry.digest, network_version, RENDERER_VERSION)
+    return _base_layers['key'] == key and (view, line_filter) in _base_layers['layers']
 
-def extract_route_segment(kml_coords, start_station_coord, end_station_coord):
+
+def base_layer(view, line_filter='all'):
     """
-    Extract the segment of kml_coords that connects start_station_coord to end_station_coord
-    with improved handling for finding the correct path
+    Return the LayeredMap of a view's base layer ('all_routes', 'route_info',
+    'map', 'index' or 'map_route'), rendering it on first use.
     """
-    # Find indices of nearest points
-    start_index = find_nearest_point_index(kml_coords, start_station_coord)
-    end_index = find_nearest_point_index(kml_coords, end_station_coord)
+    key = (kml_geometry.digest, network_version, RENDERER_VERSION)
+    if base_layer_ready(view, line_filter):
+        return _base_layers['layers'][(view, line_filter)]
     
-    # Extract the segment (ensure proper order)
-    if start_index <= end_index:
-        return kml_coords[start_index:end_index + 1]
-    else:
-        # If the route goes backwards in the KML
-        return list(reversed(kml_coords[end_index:start_index + 1]))
+    with _network_lock:
+        if _base_layers['key'] != key:
+            _base_layers['layers'] = {}
+            _base_layers['key'] = key
+        layer = _base_layers['layers'].get((view, line_filter))
+        if layer is None:
+            with timed_stage('folium_build'):
+                metro_map = build_base_map(view, line_filter)
+            with timed_stage('serialize'):
+                if view in ('map', 'map_route'):
+                    # /map embeds the map document in an iframe srcdoc
+                    layer = LayeredMap(fullscreen_document(metro_map._repr_html_()), srcdoc=True)
+                else:
+                    layer = LayeredMap(metro_map.get_root().render())
+            _base_layers['layers'][(view, line_filter)] = layer
+    return layer
 
-# Then update the index route function
-@app.route("/", methods=["GET", "POST"])
-def index():
-    route = []
-    start = end = None
-    
-    if request.method == "POST":
-        start = request.form.get("start")
-        end = request.form.get("end")
 
-        if start in all_stations and end in all_stations:
-            # Find route with changes
-            route = find_route_with_changes(start, end)
-            
-            # Create map focused on the route only
-            metro_map = folium.Map(location=[21.2, 72.85], zoom_start=13, tiles='cartodbpositron')
-            
-            # Extract KML data
-            kml_routes = extract_route_coordinates_from_kml('base.kml')
-            
-            # Create a list of coordinates for all stations in the route
-            route_coords = []
-            for station_info in route:
-                station_coord = all_stations[station_info['station']]
-                if station_coord not in route_coords:  # Avoid duplicates for transfer stations
-                    route_coords.append(station_coord)
-            
-            # Calculate bounds to focus the map on the route
-            if route_coords:
-                lats = [coord[0] for coord in route_coords]
-                lons = [coord[1] for coord in route_coords]
-                min_lat, max_lat = min(lats), max(lats)
-                min_lon, max_lon = min(lons), max(lons)
-                # Add some padding
-                padding = 0.01  # about 1km
-                bounds = [[min_lat - padding, min_lon - padding], 
-                         [max_lat + padding, max_lon + padding]]
-                metro_map.fit_bounds(bounds)
-            
-            # Route color mapping
-            route_colors = {
-                'Red Line': '#ff0000',
-                'Green Line': '#00ff00'
+def _rounded(coords):
+    # 6 decimals is about 0.1 m, well below what a map can show
+    return np.round(np.asarray(coords, dtype=np.float64), 6).tolist()
+
+
+def route_overlay(route, popups=False):
+    """
+    The overlay drawing a route found by find_route_with_changes(): its legs
+    in line colors, transfer highlights and station icons, and the bounds
+    the map opens at.
+    
+    Args:
+        popups (bool): Give the station icons popups
+    """
+    line_segments = segment_tables()
+    overlay = {'lines': [], 'circles': [], 'markers': []}
+    
+    # Calculate bounds to focus the map on the route
+    route_coords = [all_stations[station_info['station']] for station_info in route]
+    tolerance = 0.0
+    if route_coords:
+        lats = [coord[0] for coord in route_coords]
+        lons = [coord[1] for coord in route_coords]
+        padding = 0.01  # about 1km
+        overlay['bounds'] = [[min(lats) - padding, min(lons) - padding],
+                             [max(lats) + padding, max(lons) + padding]]
+        # Simplify the geometry for the zoom the map will open at
+        tolerance = map_tolerance(overlay['bounds'])
+    
+    for curr_station, next_station in zip(route, route[1:]):
+        line = curr_station['line']
+        if curr_station['station'] == next_station['station']:
+            if line != next_station['line']:
+                overlay['circles'].append({
+                    'coord': all_stations[curr_station['station']],
+                    'radius': 10,
+                    'color': '#FF6B6B',
+                    'fillColor': '#FF6B6B',
+                    'tooltip': (f"Transfer at {curr_station['station']}: "
+                                f"{line} to {next_station['line']}")
+                })
+            continue
+        kml_line_name = KML_LINE_NAMES.get(line)
+        if line != next_station['line'] or kml_line_name not in line_segments:
+            continue
+        # Precomputed route segment from KML
+        overlay['lines'].append({
+            'coords': _rounded(line_segments[kml_line_name].segment(
+                curr_station['station'], next_station['station'], tolerance)),
+            'color': LINE_COLORS.get(line),
+            'tooltip': f"{curr_station['station']} to {next_station['station']} ({line})"
+        })
+    
+    for i, station_info in enumerate(route):
+        station_name = station_info['station']
+        # Transfer stations appear twice in a row; draw them once
+        if i > 0 and station_name == route[i - 1]['station']:
+            continue
+        station_line = station_info['line']
+        
+        # Use different icons for start, end, and transfer stations
+        icon = "🚉"
+        if i == 0:
+            icon = "🚆"
+        elif i == len(route) - 1:
+            icon = "🏁"
+        elif station_name in intersection_stations:
+            icon = "🔄"
+        
+        marker = {'coord': all_stations[station_name], 'name': station_name, 'icon': icon}
+        if popups:
+            marker['popup'] = {
+                'title': station_name,
+                'lines': [f"🚉 {station_line}"],
+                'note': 'Transfer Station' if station_name in intersection_stations else None
             }
-            
-            # KML route name mapping
-            kml_name_mapping = {
-                'Red Line': 'Orange Line',  # The KML uses "Orange Line" for what we call "Red Line"
-                'Green Line': 'Green Line'
+        overlay['markers'].append(marker)
+        overlay['circles'].append({
+            'coord': all_stations[station_name],
+            'radius': 8,
+            'color': LINE_COLORS.get(station_line, '#ff0000'),
+            'fillColor': LINE_COLORS.get(station_line, '#ff0000')
+        })
+    return overlay
+
+
+def isochrone_overlay(origin, minutes):
+    """
+    The overlay highlighting the stations reachable from origin within
+    minutes, colored by thirds of the time budget.
+    """
+    circles = []
+    for reachable in isochrone(origin, minutes):
+        share = reachable['minutes'] / minutes if minutes else 0.0
+        color = ISOCHRONE_COLORS[min(int(share * len(ISOCHRONE_COLORS)), len(ISOCHRONE_COLORS) - 1)]
+        circles.append({
+            'coord': all_stations[reachable['station']],
+            'radius': 14 if reachable['station'] == origin else 11,
+            'color': '#333333' if reachable['station'] == origin else color,
+            'fillColor': color,
+            'fillOpacity': 0.6,
+            'tooltip': f"{reachable['station']}: {reachable['minutes']} min from {origin}"
+        })
+    return {'circles': circles}
+
+
+def compose_map(cache_key, view, line_filter, overlay):
+    """
+    Return the map document for cache_key, composing it from the view's
+    base layer and the overlay returned by overlay() on a cache miss.
+    
+    While the base layer is not rendered yet, the map is composed on the
+    render pool instead.
+    
+    Returns:
+        tuple: (document bytes, None), or (None, RenderJob) while rendering
+            in the background, or (None, None) if the render queue is full
+    """
+    map_html = rendered_maps.get(cache_key)
+    if map_html is not None:
+        return map_html, None
+    
+    def render():
+        base = base_layer(view, line_filter)
+        with timed_stage('overlay'):
+            layer = overlay()
+        with timed_stage('serialize'):
+            return base.compose(layer)
+    
+    if not base_layer_ready(view, line_filter):
+        return None, render_in_background(cache_key, render)
+    map_html = render()
+    rendered_maps.put(cache_key, map_html)
+    return map_html, None
+
+
+@app.route('/all_routes', methods=['GET', 'POST'])
+def show_all_routes():
+    # The map only depends on the network, so it is rendered once and reused
+    overview = overview_map('all_routes')
+    
+    # Publish the map
+    with timed_stage('publish'):
+        map_url = publish_map(overview.html)
+    
+    with timed_stage('template'):
+        page = render_template('index.html', 
+                             all_routes=get_route_mapping(), 
+                             stations=dropdown_stations(),
+                             show_map=True,
+                             map_url=map_url,
+                             network_tiles=network_tiles_config(),
+                             network_center=network.center)
+    return overview_response(page, overview)
+
+
+@app.route('/route_info', methods=['GET'])
+def route_info():
+    # The map only depends on the network, so it is rendered once and reused
+    overview = overview_map('route_info')
+    
+    # Publish the map
+    with timed_stage('publish'):
+        map_url = publish_map(overview.html)
+    
+    with timed_stage('template'):
+        page = render_template('route_info.html', 
+                             routes=get_route_mapping(),
+                             intersection_stations=intersection_stations,
+                             map_url=map_url)
+    return overview_response(page, overview)
+
+
+def find_nearest_point_index(kml_coords, station_coord, vertex_index=None):
+    """
+    Find the index of the point in kml_coords that is closest to station_coord.
+    Uses vertex_index (a spatial index over kml_coords) when one is given.
+    """
+    if vertex_index is not None:
+        return vertex_index.nearest(station_coord)
+    
+    # No index - vectorized scan (Euclidean, which is good enough for finding closest point)
+    return nearest_vertex_scan(kml_coords, station_coord)
+
+
+def extract_route_segment(kml_coords, start_station_coord, end_station_coord, vertex_index=None):
+    """
+    Extract the segment of kml_coords that connects start_station_coord to end_station_coord
+    with improved handling for finding the correct path
+    """
+    # Find indices of nearest points in one batch query
+    if vertex_index is not None:
+        start_index, end_index = vertex_index.nearest_batch([start_station_coord, end_station_coord])
+    else:
+        start_index = find_nearest_point_index(kml_coords, start_station_coord)
+        end_index = find_nearest_point_index(kml_coords, end_station_coord)
+    
+    # Extract the segment (ensure proper order)
+    if start_index <= end_index:
+        return kml_coords[start_index:end_index + 1]
+    else:
+        # If the route goes backwards in the KML
+        return kml_coords[end_index:start_index + 1][::-1]
+
+
+def route_legs(route):
+    """
+    Split a route from find_route_with_changes() into legs: runs of
+    consecutive stations on the same line, as (line, [station names]).
+    A transfer station ends one leg and starts the next.
+    """
+    legs = []
+    for station_info in route:
+        if legs and legs[-1][0] == station_info['line']:
+            legs[-1][1].append(station_info['station'])
+        else:
+            legs.append((station_info['line'], [station_info['station']]))
+    return legs
+
+
+def route_geojson(route):
+    """
+    Build a GeoJSON FeatureCollection for a route: one LineString per leg,
+    merged from the precomputed station-to-station segments, plus a Point
+    for every station with its role (start, end, transfer or stop).
+    Coordinates are [lon, lat] rounded to 6 decimals (about 10 cm).
+    """
+    line_segments = segment_tables()
+    route_mapping = get_route_mapping()
+    features = []
+    
+    for line, leg_stations in route_legs(route):
+        kml_line_name = KML_LINE_NAMES.get(line)
+        if kml_line_name not in line_segments or len(leg_stations) < 2:
+            continue
+        
+        # Join the station-to-station segments, dropping the vertex shared by consecutive segments
+        parts = [line_segments[kml_line_name].segment(a, b) for a, b in zip(leg_stations, leg_stations[1:])]
+        parts = [parts[0]] + [part[1:] for part in parts[1:]]
+        coords = np.round(np.concatenate(parts)[:, ::-1], 6).tolist()
+        
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': coords},
+            'properties': {
+                'kind': 'leg',
+                'line': line,
+                'color': route_mapping[line]['color'],
+                'from': leg_stations[0],
+                'to': leg_stations[-1],
+                'stations': leg_stations
             }
-            
-            # Group continuous segments by line
-            segments_by_line = {}
-            current_segment = []
-            current_line = None
-            
-            for i, station_info in enumerate(route):
-                station_name = station_info['station']
-                station_coord = all_stations[station_name]
-                station_line = station_info['line']
-                
-                # Start of a new segment or a new line
-                if current_line is None or station_line != current_line:
-                    # If there was a previous segment, finish it
-                    if current_segment:
-                        if current_line not in segments_by_line:
-                            segments_by_line[current_line] = []
-                        segments_by_line[current_line].append(current_segment)
-                    
-                    # Start a new segment on this line
-                    current_segment = [station_name]
-                    current_line = station_line
-                else:
-                    # Continue the current segment
-                    current_segment.append(station_name)
-            
-            # Add the final segment
-            if current_segment:
-                if current_line not in segments_by_line:
-                    segments_by_line[current_line] = []
-                segments_by_line[current_line].append(current_segment)
-            
-            # Draw each line segment with appropriate color
-            for line, segments in segments_by_line.items():
-                kml_line_name = kml_name_mapping.get(line)
-                line_color = route_colors.get(line)
-                
-                if kml_line_name in kml_routes:
-                    for segment in segments:
-                        if len(segment) >= 2:  # Need at least 2 stations to form a segment
-                            # For each adjacent pair of stations in the segment
-                            for j in range(len(segment) - 1):
-                                start_station = segment[j]
-                                end_station = segment[j+1]
-                                start_coord = all_stations[start_station]
-                                end_coord = all_stations[end_station]
-                                
-                                # Extract route segment from KML
-                                route_segment = extract_route_segment(
-                                    kml_routes[kml_line_name],
-                                    start_coord,
-                                    end_coord
-                                )
-                                
-                                # Draw segment
-                                folium.PolyLine(
-                                    locations=route_segment,
-                                    color=line_color,
-                                    weight=5,
-                                    opacity=1.0,
-                                    tooltip=f"{start_station} to {end_station} ({line})"
-                                ).add_to(metro_map)
-            
-            # Special handling for transfer stations - draw connector line if needed
-            for i in range(len(route) - 1):
-                curr_station = route[i]
-                next_station = route[i+1]
-                
-                # If both entries refer to the same station but different lines, add a connector
-                if curr_station['station'] == next_station['station'] and curr_station['line'] != next_station['line']:
-                    station_coord = all_stations[curr_station['station']]
-                    
-                    # Add a visible connecting line at the transfer station
-                    folium.PolyLine(
-                        locations=[station_coord, station_coord],  # Same point, creates a dot
-                        color="#FF6B6B",  # Bright red for transfer
-                        weight=8,  # Make it wider than the route lines
-                        opacity=0.8,
-                        tooltip=f"Transfer at {curr_station['station']}: {curr_station['line']} to {next_station['line']}"
-                    ).add_to(metro_map)
-            
-            # Add markers for all stations in the route
-            for i, station_info in enumerate(route):
-                station_name = station_info['station']
-                station_coord = all_stations[station_name]
-                station_line = station_info['line']
-                
-                # Skip duplicate markers for transfer stations (when the same station appears twice)
-                skip = False
-                if i > 0 and station_name == route[i-1]['station']:
-                    skip = True
-                
-                if not skip:
-                    # Create popup
-                    popup_html = f"""
-                    <div style="font-family: Arial; text-align: center;">
-                        <h4 style="margin: 0;">{station_name}</h4>
-                        <p style="margin: 5px 0;">🚉 {station_line}</p>
-                        {f'<p style="color: #ff6b6b;">Transfer Station</p>' if station_name in intersection_stations else ''}
-                    </div>
-                    """
-                    
-                    # Use different icons for start, end, and transfer stations
-                    icon_html = "🚉"  # Default
-                    if i == 0:
-                        icon_html = "🚆"  # Start station
-                    elif i == len(route) - 1:
-                        icon_html = "🏁"  # End station
-                    elif station_name in intersection_stations:
-                        icon_html = "🔄"  # Transfer station
-                    
-                    # Add marker
-                    folium.Marker(
-                        location=station_coord,
-                        popup=folium.Popup(popup_html, max_width=200),
-                        tooltip=station_name,
-                        icon=folium.DivIcon(
-                            html=f'<div style="font-size: 15px; text-align: center;">{icon_html}</div>',
-                            icon_size=(20, 20),
-                            icon_anchor=(10, 10)
-                        )
-                    ).add_to(metro_map)
-                    
-                    # Add circle with line color
-                    folium.CircleMarker(
-                        location=station_coord,
-                        radius=8,
-                        color=route_colors.get(station_line, '#ff0000'),
-                        fill=True,
-                        fillColor=route_colors.get(station_line, '#ff0000'),
-                        fillOpacity=0.8,
-                        weight=2,
-                        opacity=1.0
-                    ).add_to(metro_map)
-            
-            # Save the map
-            metro_map.save("static/map.html")
+        })
+    
+    for i, station_info in enumerate(route):
+        # Transfer stations appear twice in the route - one point is enough
+        if i > 0 and station_info['station'] == route[i - 1]['station']:
+            continue
+        
+        if i == 0:
+            role = 'start'
+        elif i == len(route) - 1:
+            role = 'end'
+        elif station_info['station'] in intersection_stations:
+            role = 'transfer'
+        else:
+            role = 'stop'
+        
+        lat, lon = all_stations[station_info['station']]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+            'properties': {
+                'kind': 'station',
+                'name': station_info['station'],
+                'line': station_info['line'],
+                'role': role
+            }
+        })
+    
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def compose_index_map(start, end):
+    """
+    compose_map() for the index page's map of the route from start to end,
+    with station popups. Without a route between them it shows the network alone.
+    """
+    def overlay():
+        with timed_stage('route'):
+            try:
+                route = find_route_with_changes(start, end)
+            except ValueError:
+                return None
+        return route_overlay(route, popups=True)
+    
+    return compose_map(map_cache_key('index', start, end, None), 'index', 'all', overlay)
+
+
+# Then update the index route function
+@app.route("/", methods=["GET", "POST"])
+def index():
+    route = []
+    start = end = None
+    map_url = None
+    
+    if request.method == "POST":
+        # Typed names are accepted by alias or abbreviation too, e.g. "Railway Stn"
+        start = resolve_station(request.form.get("start"))
+        end = resolve_station(request.form.get("end"))
+
+        if start in all_stations and end in all_stations:
+            # Find route with changes
+            with timed_stage('route'):
+                try:
+                    route = find_route_with_changes(start, end)
+                except ValueError:
+                    # No route between them - the page shows no result
+                    pass
+        
+        if route:
+            # The route is spliced into the cached base layer. Until that is rendered, the
+            # map is composed in the background and the page iframes /maps/route, which
+            # any worker can answer.
+            map_html, _ = compose_index_map(start, end)
+            if map_html is not None:
+                with timed_stage('publish'):
+                    map_url = publish_map(map_html)
+            else:
+                map_url = url_for('route_map', start=start, end=end)
+
+    with timed_stage('template'):
+        return render_template("index.html", 
+                             stations=dropdown_stations(), 
+                             start=start, 
+                             end=end, 
+                             route=route if route else None,
+                             map_url=map_url,
+                             network_tiles=network_tiles_config(),
+                             network_center=network.center)
+
+
 
-    return render_template("index.html", 
-                         stations=stations, 
-                         start=start, 
-                         end=end, 
-                         route=route if route else None)
+def line_segment_lengths():
+    """
+    Track length in km between adjacent stations, keyed by (line, a, b) and
+    measured along the KML line. Never shorter than the straight line, which
+    keeps the routing engine's A* heuristic admissible.
+    """
+    line_segments = segment_tables()
+    segment_lengths = {}
+    for line, station_list in get_line_stations().items():
+        line_table = line_segments.get(KML_LINE_NAMES[line])
+        for a, b in zip(station_list, station_list[1:]):
+            length = haversine_km(all_stations[a], all_stations[b])
+            if line_table is not None:
+                length = max(length, polyline_length_km(line_table.segment(a, b)))
+            segment_lengths[(line, a, b)] = length
+    return segment_lengths
+
+
+def build_network():
+    """
+    Build the (station, line) routing engine from the network's lines, then
+    the RouteTable holding the least-time route, with transfers resolved,
+    of every origin/destination pair.
+    
+    Call this again whenever the network definition changes; the engine
+    and the route table are always swapped in together. In-vehicle edges are
+    weighted by track length along the KML, so a KML change rebuilds too.
+    """
+    global routing_engine, route_table, network_version, _network_digest
+    
+    with _network_lock:
+        # New version first, so the segment tables below are built for this network
+        network_version += 1
+        
+        engine = RoutingEngine(
+            get_line_stations(),
+            all_stations,
+            line_segment_lengths(),
+            speed_kmh=METRO_SPEED_KMH,
+            dwell_seconds=DWELL_SECONDS,
+            transfer_penalty_seconds=TRANSFER_PENALTY_SECONDS
+        )
+        
+        # Shortest-path trees from every origin, unless the network is too large for that
+        table = RouteTable(engine) if len(all_stations) <= ROUTE_TABLE_MAX_STATIONS else None
+        
+        routing_engine, route_table = engine, table
+        _network_digest = kml_geometry.digest
 
 
 def find_route_with_changes(start, end):
     """
     Find the best route between two stations, accounting for line transfers.
     
+    Routes are least-time routes from the routing engine, read from the
+    route table built by build_network().
+    
     Args:
         start (str): The starting station name
         end (str): The destination station name
         
     Returns:
         list: A list of dictionaries containing station information along the route
+    
+    Raises:
+        KeyError: If either station is unknown
+        ValueError: If there is no route between them
     """
-    # Find the shortest path using networkx
-    route = nx.shortest_path(G, start, end)
-    route_with_changes = []
+    return find_timed_route(start, end)[1]
+
+
+def find_timed_route(start, end):
+    """
+    Like find_route_with_changes(), but returns (travel time in seconds,
+    route), both read from the route table when there is one.
+    """
+    if _network_digest != kml_geometry.digest:
+        build_network()
     
-    # Get the starting line
-    current_line = get_station_line(route[0])
+    if route_table is None:
+        # Not precomputed - search directly
+        return routing_engine.timed_route(start, end)
+    return route_table.timed_route(start, end)
+
+
+def travel_time_matrix():
+    """
+    Least travel time in seconds between every pair of stations, indexed like
+    routing_engine.station_names. Computed once per network version and shared.
+    """
+    if _network_digest != kml_geometry.digest:
+        build_network()
     
-    for i, station in enumerate(route):
-        station_line = get_station_line(station)
-        
-        # Special handling for transfer stations
-        if station in intersection_stations:
-            # Check if this is a transfer point (not the start/end and line change is needed)
-            is_transfer = False
-            transfer_to = None
-            
-            if i > 0 and i < len(route) - 1:
-                # Get the previous and next station's line to determine if we need to transfer
-                prev_station = route[i - 1]
-                next_station = route[i + 1]
-                prev_line = get_station_line(prev_station)
-                next_line = get_station_line(next_station)
-                
-                # If the next station is on a different line, this is a transfer point
-                if next_line != prev_line:
-                    is_transfer = True
-                    transfer_to = next_line
-                    
-                    # Add the intersection station on the current line first
-                    route_with_changes.append({
-                        'station': station,
-                        'line': prev_line,
-                        'is_transfer': True,
-                        'transfer_to': next_line
-                    })
-                    
-                    # Then add it again as the starting point on the new line
-                    route_with_changes.append({
-                        'station': station,
-                        'line': next_line,
-                        'is_transfer': True,
-                        'transfer_to': None  # Already transferred
-                    })
-                    
-                    # Update current line
-                    current_line = next_line
-                    continue  # Skip the normal addition since we added it twice
-            
-            # If not a transfer or start/end, add normally
-            if not is_transfer:
-                route_with_changes.append({
-                    'station': station,
-                    'line': station_line if i == 0 or i == len(route) - 1 else current_line,
-                    'is_transfer': False,
-                    'transfer_to': None
-                })
-                # Update current line if this is the start
-                if i == 0:
-                    current_line = station_line
+    if _travel_times['version'] != network_version:
+        with _network_lock:
+            # float32 halves the cache; answers are reported to a tenth of a minute
+            matrix = routing_engine.travel_time_matrix().astype(np.float32)
+            matrix.setflags(write=False)
+            _travel_times['matrix'] = matrix
+            _travel_times['version'] = network_version
+    return _travel_times['matrix']
+
+
+# All-pairs matrices along the least-time routes, downloadable from /api/matrices
+ROUTE_MATRIX_NAMES = ('seconds', 'distance_km', 'hops', 'transfers')
+
+
+def route_matrices():
+    """
+    Dense station-to-station matrices of travel time (seconds), track
+    distance along the KML (distance_km), station-to-station rides (hops)
+    and line changes (transfers) on the least-time route of every pair,
+    indexed like routing_engine.station_names. Computed once per network
+    version and shared; unreachable pairs are inf or -1.
+    """
+    if _network_digest != kml_geometry.digest:
+        build_network()
+    
+    if _route_matrices['version'] != network_version:
+        with _network_lock:
+            matrices = routing_engine.route_matrices()
+            # float32 and int16 keep the cache and the downloads small
+            for name in ROUTE_MATRIX_NAMES:
+                dtype = np.float32 if name in ('seconds', 'distance_km') else np.int16
+                matrices[name] = matrices[name].astype(dtype)
+                matrices[name].setflags(write=False)
+            _route_matrices['matrices'] = matrices
+            _route_matrices['version'] = network_version
+    return _route_matrices['matrices']
+
+
+def export_route_matrices(fmt, names):
+    """
+    Serialize route matrices for download.
+    
+    Args:
+        fmt (str): 'npy' (a single matrix), 'npz' or 'json'
+        names (tuple): Matrix names, from ROUTE_MATRIX_NAMES
+    
+    Returns:
+        bytes: The document. npz and json include the station index; in json
+        unreachable pairs are null
+    """
+    matrices = route_matrices()
+    station_names = routing_engine.station_names
+    buffer = io.BytesIO()
+    if fmt == 'npy':
+        np.save(buffer, matrices[names[0]], allow_pickle=False)
+        return buffer.getvalue()
+    if fmt == 'npz':
+        np.savez_compressed(buffer, stations=np.array(station_names), **{name: matrices[name] for name in names})
+        return buffer.getvalue()
+    
+    document = {'stations': station_names}
+    for name in names:
+        matrix = matrices[name]
+        if matrix.dtype.kind == 'f':
+            reachable = np.isfinite(matrix)
+            rows = np.round(matrix.astype(np.float64), 3).astype(object)
         else:
-            # Regular station (not an intersection)
-            route_with_changes.append({
-                'station': station,
-                'line': current_line,
-                'is_transfer': False,
-                'transfer_to': None
-            })
+            reachable = matrix >= 0
+            rows = matrix.astype(object)
+        rows[~reachable] = None
+        document[name] = rows.tolist()
+    return json.dumps(document, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+# Nearest-station lookups by position; the index is built on first use
+NEAREST_MAX_K = 20
+NEAREST_BATCH_MAX_POINTS = 100000
+_station_index = {'index': None}
+
+
+def station_index():
+    """
+    Return the StationIndex over all stations, building it on first use.
+    """
+    if _station_index['index'] is None:
+        with _network_lock:
+            if _station_index['index'] is None:
+                _station_index['index'] = StationIndex(
+                    station_catalog.names, [(station.lat, station.lon) for station in station_catalog])
+    return _station_index['index']
+
+
+def nearest_stations(points, k=1):
+    """
+    The k stations closest to each (lat, lon) point, by great-circle distance.
+    
+    Returns:
+        tuple: (names, distances_km) - one list of k names and one list of
+        k distances per point, nearest first
+    """
+    index = station_index()
+    indices, distances = index.nearest(points, k)
+    names = index.names
+    return [[names[i] for i in row] for row in indices.tolist()], np.round(distances, 4).tolist()
+
+
+def parse_points(values):
+    # (lat, lon) pairs as an (n, 2) float array, or None if any is not a valid coordinate
+    try:
+        points = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if points.ndim != 2 or points.shape[1] != 2 or not np.isfinite(points).all():
+        return None
+    if (np.abs(points[:, 0]) > 90).any() or (np.abs(points[:, 1]) > 180).any():
+        return None
+    return points
+
+
+def isochrone(origin, minutes):
+    """
+    Stations reachable from origin within the given number of minutes,
+    read from one row of the travel-time matrix.
+    
+    Returns:
+        list: {'station', 'minutes', 'lines'} dicts, nearest first (origin included)
     
-    return route_with_changes
+    Raises:
+        KeyError: If origin is unknown
+    """
+    matrix = travel_time_matrix()
+    row = matrix[routing_engine.station_id[origin]]
+    reachable = np.flatnonzero(row <= minutes * 60.0)
+    reachable = reachable[np.argsort(row[reachable], kind='stable')]
+    station_names = routing_engine.station_names
+    return [{
+        'station': station_names[i],
+        'minutes': round(float(row[i]) / 60.0, 1),
+        'lines': list(station_catalog.get(station_names[i]).lines)
+    } for i in reachable.tolist()]
+
+
+def journey_engine():
+    """
+    Return the RAPTOR engine over the timetable: the GTFS feed at GTFS_PATH,
+    or a synthetic timetable generated from the network when none is set.
+    Built on first use and rebuilt with the network.
+    """
+    if _network_digest != kml_geometry.digest:
+        build_network()
+    
+    key = (GTFS_PATH, network_version)
+    if _journey_engine['key'] != key:
+        with _network_lock:
+            if GTFS_PATH:
+                timetable = load_gtfs(GTFS_PATH)
+            else:
+                hop_seconds = {
+                    segment: length / METRO_SPEED_KMH * 3600.0
+                    for segment, length in line_segment_lengths().items()
+                }
+                timetable = Timetable(synthetic_feed(
+                    get_line_stations(),
+                    hop_seconds,
+                    all_stations,
+                    headway_seconds=SYNTHETIC_HEADWAY_SECONDS,
+                    dwell_seconds=int(DWELL_SECONDS),
+                    transfer_seconds=SYNTHETIC_TRANSFER_SECONDS
+                ))
+            _journey_engine['engine'] = RaptorEngine(timetable)
+            _journey_engine['key'] = key
+    return _journey_engine['engine']
+
+
+def find_journey(start, end, departure_time):
+    """
+    Find the earliest-arriving timetabled journey between two stations,
+    leaving no earlier than departure_time.
+    
+    Args:
+        start (str): The starting station name
+        end (str): The destination station name
+        departure_time (int): Seconds after midnight
+    
+    Returns:
+        dict: Departure and arrival times and one entry per leg, or None when no
+        journey reaches end (e.g. after the last departure)
+    
+    Raises:
+        KeyError: If either station has no stop in the timetable
+    """
+    engine = journey_engine()
+    timetable = engine.timetable
+    journey = engine.earliest_arrival(timetable.stops_by_name[start], timetable.stops_by_name[end], departure_time)
+    if journey is None:
+        return None
+    
+    legs = [{
+        'line': leg.line,
+        'trip_id': leg.trip_id,
+        'from': timetable.stop_names[leg.from_stop],
+        'to': timetable.stop_names[leg.to_stop],
+        'departure': format_gtfs_time(leg.departure),
+        'arrival': format_gtfs_time(leg.arrival),
+        'stops': [timetable.stop_names[stop] for stop in leg.stops]
+    } for leg in journey.legs]
+    return {
+        'start': start,
+        'end': end,
+        'departure': format_gtfs_time(journey.departure),
+        'arrival': format_gtfs_time(journey.arrival),
+        'duration_minutes': round((journey.arrival - journey.departure) / 60.0, 1),
+        'transfers': max(sum(1 for leg in journey.legs if leg.line is not None) - 1, 0),
+        'legs': legs
+    }
+
+
+def network_artifact_fingerprint(kml_digest):
+    return network_fingerprint(
+        kml_digest,
+        get_line_stations(),
+        all_stations,
+        {
+            'speed_kmh': METRO_SPEED_KMH,
+            'dwell_seconds': DWELL_SECONDS,
+            'transfer_penalty_seconds': TRANSFER_PENALTY_SECONDS,
+            'kml_line_names': KML_LINE_NAMES,
+        }
+    )
+
+
+def load_network_artifact(path):
+    """
+    Install the KML geometry, segment tables, routing engine and route table
+    from a startup artifact, skipping KML parsing, station snapping and the
+    all-pairs precomputation.
+    
+    Returns:
+        bool: False if there is no artifact for the current base.kml and network
+    """
+    global routing_engine, route_table, network_version, _network_digest
+    
+    kml_digest = file_digest(KML_PATH)
+    payload = load_startup_artifact(path, network_artifact_fingerprint(kml_digest))
+    if payload is None:
+        return False
+    
+    with _network_lock:
+        kml_geometry.preload(kml_digest, payload['kml_routes'])
+        network_version += 1
+        _segment_tables['tables'] = payload['segment_tables']
+        _segment_tables['key'] = (kml_digest, network_version)
+        routing_engine, route_table = payload['routing_engine'], payload['route_table']
+        _network_digest = kml_digest
+    return True
+
+
+def save_network_artifact(path):
+    """
+    Write the current network, built if necessary, as a startup artifact.
+    """
+    with _network_lock:
+        if _network_digest != kml_geometry.digest:
+            build_network()
+        payload = {
+            'kml_routes': kml_geometry.routes(),
+            'segment_tables': segment_tables(),
+            'routing_engine': routing_engine,
+            'route_table': route_table,
+        }
+        save_startup_artifact(path, network_artifact_fingerprint(_network_digest), payload)
 
 
 @app.route('/map', methods=['GET'])
@@ -600,301 +1402,628 @@ def fullscreen_map():
     Query parameters:
     - start: Optional starting station name
     - end: Optional ending station name
-    - line: Optional line filter ('red', 'green', or 'all')
+    - line: Optional line filter ('all' or a line id from network.json, e.g. 'red')
+    - isochrone: Optional origin station; highlights the stations reachable
+      from it within `minutes` (default 20) on the overview
     """
     # Get query parameters
     start = request.args.get('start')
     end = request.args.get('end')
     line_filter = request.args.get('line', 'all').lower()
+    isochrone_origin = request.args.get('isochrone')
+    # Any other filter value draws no lines
+    if line_filter not in OVERVIEW_LINE_FILTERS:
+        line_filter = 'none'
+    
+    if isochrone_origin in all_stations and not (start and end and start in all_stations and end in all_stations):
+        minutes = request.args.get('minutes', 20, type=float)
+        if not 0 <= minutes <= 24 * 60:
+            minutes = 20.0
+        
+        cache_key = map_cache_key('map_isochrone', isochrone_origin, minutes, line_filter)
+        return fullscreen_response(cache_key, 'map', line_filter, lambda: isochrone_overlay(isochrone_origin, minutes))
     
-    # Create a clean map
-    metro_map = folium.Map(location=[21.2, 72.85], zoom_start=12, tiles='cartodbpositron')
+    if not (start and end and start in all_stations and end in all_stations):
+        # Network overview, rendered once per line filter
+        overview = overview_map('map', line_filter)
+        return overview_response(overview.html, overview, overview.etag)
     
-    # Extract KML data
-    kml_routes = extract_route_coordinates_from_kml('base.kml')
+    # Repeat route queries are served from the rendered map cache
+    def overlay():
+        with timed_stage('route'):
+            try:
+                route = find_route_with_changes(start, end)
+            except ValueError:
+                # No route between them - show the network alone
+                return None
+        return route_overlay(route)
     
-    # Map KML route names to corridor names and colors
-    route_mapping = {
-        'Green Line': {
-            'kml_name': 'Green Line',
-            'color': '#00ff00',  # Bright green
-            'emoji': '🟢',
-            'stations': list(corridor_2.keys()),
-            'coords': list(corridor_2.values())
-        },
-        'Red Line': {  # This is "Orange Line" in the KML
-            'kml_name': 'Orange Line',
-            'color': '#ff0000',  # Bright red
-            'emoji': '🔴',
-            'stations': list(corridor_1.keys()),
-            'coords': list(corridor_1.values())
+    cache_key = map_cache_key('map', start, end, line_filter)
+    return fullscreen_response(cache_key, 'map_route', line_filter, overlay)
+
+
+def fullscreen_response(cache_key, view, line_filter, overlay):
+    """
+    Serve a /map document composed by compose_map(). While it renders in the
+    background, answer with a placeholder that reloads the same URL.
+    """
+    fullscreen_html, job = compose_map(cache_key, view, line_filter, overlay)
+    if fullscreen_html is not None:
+        return fullscreen_html
+    return render_pending_response(request.full_path, job)
+
+
+# The station list only changes with the catalog, so the page is rendered once
+_station_details = {'version': None, 'page': None, 'etag': None, 'last_modified': None}
+
+
+@app.route('/station_details', methods=['GET'])
+def station_details():
+    """
+    Every station with the lines serving it, in catalog order. The page is
+    rendered once per catalog version and supports conditional GET.
+    """
+    if _station_details['version'] != station_catalog.version:
+        with timed_stage('template'):
+            page = render_template('station_details.html', stations=station_catalog.stations,
+                                   line_emojis={name: line.emoji for name, line in network.lines.items()})
+        _station_details['page'] = page.encode('utf-8')
+        _station_details['etag'] = MapArtifactStore.digest_of(_station_details['page'])
+        _station_details['last_modified'] = datetime.now(timezone.utc).replace(microsecond=0)
+        _station_details['version'] = station_catalog.version
+    
+    response = app.response_class(_station_details['page'], mimetype='text/html')
+    response.set_etag(_station_details['etag'])
+    response.last_modified = _station_details['last_modified']
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+
+@app.route('/api/stations', methods=['GET'])
+def api_stations():
+    """
+    The station catalog as JSON: every station's name, coordinates, lines
+    and transfer flag, in the order the pages list them.
+    """
+    response = app.response_class(station_catalog.json, mimetype='application/json')
+    response.set_etag(station_catalog.version)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+
+@app.route('/api/stations/search', methods=['GET'])
+def api_station_search():
+    """
+    Typeahead station search, e.g. GET /api/stations/search?q=railway+stn
+    
+    Query parameters:
+    - q: Part of a station name or alias; case, punctuation and common
+      abbreviations ("Stn", "Rly", "Rd") do not matter, and misspellings
+      are matched by trigrams
+    - limit: Most matches to return (default 10, at most STATION_SEARCH_MAX_LIMIT)
+    
+    Matches are ranked exact, then name prefix, then word prefix ("gate" for
+    "Majura Gate"), then fuzzy by score. Each carries the alias it matched, if any.
+    """
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    if not query.strip() or limit is None or not 1 <= limit <= STATION_SEARCH_MAX_LIMIT:
+        response = jsonify({'error': f'q is required and limit must be between 1 and {STATION_SEARCH_MAX_LIMIT}'})
+        response.status_code = 400
+        return response
+    
+    with timed_stage('search'):
+        matches = station_search().search(query, limit)
+    with timed_stage('serialize'):
+        body = json.dumps({
+            'query': query,
+            'matches': [{
+                'station': match.station,
+                'lines': list(station_catalog.get(match.station).lines),
+                'match': match.match,
+                'alias': match.alias,
+                'score': match.score
+            } for match in matches]
+        }, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    response = app.response_class(body, mimetype='application/json')
+    # Results only change with the station catalog
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@app.route('/api/route', methods=['GET'])
+def api_route():
+    """
+    JSON routing API for client-side rendering.
+    
+    Query parameters:
+    - start: Starting station name (or alias)
+    - end: Destination station name (or alias)
+    
+    Returns the route from find_route_with_changes() together with its
+    geometry as a GeoJSON FeatureCollection, or 404 when there is no route.
+    """
+    start = resolve_station(request.args.get('start'))
+    end = resolve_station(request.args.get('end'))
+    
+    if start not in all_stations or end not in all_stations:
+        response = jsonify({'error': 'start and end must be known station names'})
+        response.status_code = 400
+        return response
+    
+    # Serialized once per pair; answers only change with the network or the KML
+    cache_key = map_cache_key('api_route', start, end, None)
+    body = rendered_maps.get(cache_key)
+    if body is None:
+        try:
+            with timed_stage('route'):
+                travel_seconds, route = find_timed_route(start, end)
+        except ValueError:
+            response = jsonify({'start': start, 'end': end, 'error': 'no route'})
+            response.status_code = 404
+            return response
+        with timed_stage('geometry'):
+            geometry = route_geojson(route)
+        with timed_stage('serialize'):
+            body = json.dumps({
+                'start': start,
+                'end': end,
+                'route': route,
+                'estimated_minutes': round(travel_seconds / 60.0, 1),
+                'transfers': sum(1 for station_info in route if station_info['is_transfer']) // 2,
+                'geometry': geometry
+            }, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        rendered_maps.put(cache_key, body)
+    
+    response = app.response_class(body, mimetype='application/json')
+    response.add_etag()
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+@app.route('/api/isochrone', methods=['GET'])
+def api_isochrone():
+    """
+    Reachability API: every station reachable from an origin within a time budget.
+    
+    Query parameters:
+    - origin: Station name
+    - minutes: Time budget in minutes (default 20)
+    
+    Answers are rows of the cached all-pairs travel-time matrix, so no search
+    runs per request.
+    """
+    origin = request.args.get('origin')
+    try:
+        minutes = float(request.args.get('minutes', 20))
+    except ValueError:
+        minutes = -1.0
+    
+    if origin not in all_stations or not 0 <= minutes <= 24 * 60:
+        response = jsonify({'error': 'origin must be a known station name and minutes between 0 and 1440'})
+        response.status_code = 400
+        return response
+    
+    cache_key = map_cache_key('api_isochrone', origin, minutes, None)
+    body = rendered_maps.get(cache_key)
+    if body is None:
+        with timed_stage('route'):
+            reachable = isochrone(origin, minutes)
+        with timed_stage('serialize'):
+            body = json.dumps({
+                'origin': origin,
+                'minutes': minutes,
+                'count': len(reachable),
+                'stations': reachable
+            }, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        rendered_maps.put(cache_key, body)
+    
+    response = app.response_class(body, mimetype='application/json')
+    response.add_etag()
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+@app.route('/api/nearest', methods=['GET'])
+def api_nearest():
+    """
+    Nearest stations to a position, for clients that start from GPS.
+    
+    Query parameters:
+    - lat, lon: Position in degrees
+    - k: Number of stations to return (default 1, at most NEAREST_MAX_K)
+    """
+    try:
+        points = parse_points([[float(request.args['lat']), float(request.args['lon'])]])
+        k = int(request.args.get('k', 1))
+    except (KeyError, ValueError):
+        points = None
+    
+    if points is None or not 1 <= k <= NEAREST_MAX_K:
+        response = jsonify({'error': f'lat and lon must be valid coordinates and k between 1 and {NEAREST_MAX_K}'})
+        response.status_code = 400
+        return response
+    
+    with timed_stage('route'):
+        names, distances = nearest_stations(points, k)
+    return jsonify({
+        'lat': float(points[0, 0]),
+        'lon': float(points[0, 1]),
+        'stations': [{
+            'station': station,
+            'distance_km': distance,
+            'lines': list(station_catalog.get(station).lines)
+        } for station, distance in zip(names[0], distances[0])]
+    })
+
+@app.route('/api/nearest/batch', methods=['POST'])
+def api_nearest_batch():
+    """
+    Nearest stations for many positions in one vectorized query, e.g. to snap
+    trip datasets onto the network.
+    
+    The body is JSON: {"points": [[lat, lon], ...], "k": 1}, or just the array
+    of points. The response lists, in request order, the names and distances
+    of the k nearest stations of every point:
+    {"k": 1, "count": n, "stations": [[name], ...], "distance_km": [[km], ...]}
+    """
+    body = request.get_json(silent=True)
+    k = 1
+    if isinstance(body, dict):
+        k = body.get('k', 1)
+        body = body.get('points')
+    points = parse_points(body) if isinstance(body, list) else None
+    
+    if points is None and body == []:
+        points = np.empty((0, 2))
+    if (points is None or len(points) > NEAREST_BATCH_MAX_POINTS
+            or not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= NEAREST_MAX_K):
+        response = jsonify({'error': f'points must be at most {NEAREST_BATCH_MAX_POINTS} [lat, lon] pairs '
+                                     f'and k an integer between 1 and {NEAREST_MAX_K}'})
+        response.status_code = 400
+        return response
+    
+    with timed_stage('route'):
+        names, distances = nearest_stations(points, k)
+    with timed_stage('serialize'):
+        body = json.dumps({
+            'k': k,
+            'count': len(names),
+            'stations': names,
+            'distance_km': distances
+        }, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/api/matrices.<fmt>', methods=['GET'])
+@app.route('/api/matrices/<name>.<fmt>', methods=['GET'])
+def api_matrices(fmt, name=None):
+    """
+    Download the all-pairs route matrices from route_matrices().
+    
+    - /api/matrices.npz, /api/matrices.json: every matrix and the station index
+    - /api/matrices/<name>.npy, /api/matrices/<name>.json: one matrix, where
+      name is seconds, distance_km, hops or transfers. Rows and columns of the
+      .npy follow the station index of the .npz and .json documents.
+    """
+    if name is None and fmt in ('npz', 'json'):
+        names = ROUTE_MATRIX_NAMES
+    elif name in ROUTE_MATRIX_NAMES and fmt in ('npy', 'json'):
+        names = (name,)
+    else:
+        abort(404)
+    
+    cache_key = map_cache_key('api_matrices', name, fmt, None)
+    body = rendered_maps.get(cache_key)
+    if body is None:
+        with timed_stage('route'):
+            route_matrices()
+        with timed_stage('serialize'):
+            body = export_route_matrices(fmt, names)
+        rendered_maps.put(cache_key, body)
+    
+    if fmt == 'json':
+        response = app.response_class(body, mimetype='application/json')
+    else:
+        response = app.response_class(body, mimetype='application/octet-stream')
+        filename = f"{name or 'matrices'}.{fmt}"
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.add_etag()
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+@app.route('/api/journey', methods=['GET'])
+def api_journey():
+    """
+    Timetable journey planner.
+    
+    Query parameters:
+    - start: Starting station name (or alias)
+    - end: Destination station name (or alias)
+    - depart: Departure time as HH:MM or HH:MM:SS (defaults to now)
+    
+    Returns the earliest-arriving journey from find_journey(), or 404 when
+    there is none, e.g. after the last departure.
+    """
+    start = resolve_station(request.args.get('start'))
+    end = resolve_station(request.args.get('end'))
+    depart = request.args.get('depart')
+    
+    try:
+        if depart:
+            departure_time = parse_gtfs_time(depart)
+        else:
+            now = datetime.now()
+            departure_time = now.hour * 3600 + now.minute * 60 + now.second
+    except ValueError:
+        response = jsonify({'error': 'depart must be HH:MM or HH:MM:SS'})
+        response.status_code = 400
+        return response
+    
+    try:
+        with timed_stage('route'):
+            journey = find_journey(start, end, departure_time)
+    except KeyError:
+        response = jsonify({'error': 'start and end must be known station names'})
+        response.status_code = 400
+        return response
+    
+    if journey is None:
+        response = jsonify({'start': start, 'end': end, 'departure': format_gtfs_time(departure_time),
+                            'error': 'no journey'})
+        response.status_code = 404
+        return response
+    return jsonify(journey)
+
+@app.route('/api/routes/batch', methods=['POST'])
+def api_routes_batch():
+    """
+    Batch routing API for many origin/destination pairs.
+    
+    The body is a JSON array (application/json) or NDJSON
+    (application/x-ndjson) of {"start": ..., "end": ...} objects, optionally
+    with an "id", or [start, end] pairs. Results are streamed
+    back as NDJSON, one line per pair in request order, as they are computed,
+    followed by a {"done": true, ...} summary line. The body is read
+    incrementally, so memory stays flat however many pairs are sent.
+
+    A body whose first pair is malformed is rejected with 400, and one whose
+    first pair is longer than MAX_ELEMENT_SIZE with 413. Later failures are
+    reported in-band, as the status line has already been sent.
+    """
+    def solve(start, end):
+        # Unknown stations raise KeyError, which stream_routes() reports for the pair
+        try:
+            travel_seconds, route = find_timed_route(start, end)
+        except ValueError:
+            return {'start': start, 'end': end, 'error': 'no route'}
+        return {
+            'start': start,
+            'end': end,
+            'route': route,
+            'estimated_minutes': round(travel_seconds / 60.0, 1)
         }
+    
+    pairs = iter_pairs(request.stream, request.mimetype)
+    try:
+        first = next(pairs, None)
+    except ValueError as e:
+        response = jsonify({'error': f'malformed request body: {e}'})
+        response.status_code = 413 if isinstance(e, ElementTooLarge) else 400
+        return response
+    if first is not None:
+        pairs = itertools.chain([first], pairs)
+    
+    results = stream_routes(pairs, solve)
+    return app.response_class(stream_with_context(results), mimetype='application/x-ndjson')
+
+@app.route('/tiles/network/<version>/<int:z>/<int:x>/<int:y>.geojson', methods=['GET'])
+def network_tile(version, z, x, y):
+    """
+    Serve one tile of the network layer as GeoJSON. The URL carries the
+    tile set version, so a tile never changes and may be cached indefinitely.
+    """
+    tiles = network_tiles()
+    body = tiles.get(z, x, y) if version == tiles.version else None
+    if body is None:
+        abort(404)
+    
+    response = app.response_class(body, mimetype='application/geo+json')
+    response.add_etag()
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+@app.route('/maps/<digest>.html', methods=['GET'])
+def map_artifact(digest):
+    """
+    Serve a published map artifact. Artifacts are content-addressed and
+    therefore immutable, so clients may cache them indefinitely.
+    """
+    if len(digest) != 32 or any(c not in '0123456789abcdef' for c in digest):
+        abort(404)
+    map_html = map_artifacts.get(digest)
+    if map_html is None:
+        abort(404)
+    
+    response = app.response_class(map_html, mimetype='text/html')
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+def render_job_status(job):
+    status = {
+        'id': job.id,
+        'status': job.status,
+        'wait_ms': round(job.wait_seconds() * 1000.0, 3),
+        'render_ms': round(job.render_seconds() * 1000.0, 3),
     }
+    if job.status == 'done':
+        status['map_url'] = url_for('map_artifact', digest=job.result)
+    elif job.status == 'failed':
+        status['error'] = job.error
+    return status
+
+
+@app.route('/maps/route', methods=['GET'])
+def route_map():
+    """
+    The index page's map of the route from start to end: a placeholder that
+    reloads itself while the map is rendering, then a redirect to the
+    published map. Pages iframe this URL when their map is not rendered yet.
+    It names the route rather than a render job, so whichever worker answers
+    a reload can compose the map.
+    """
+    start = request.args.get('start')
+    end = request.args.get('end')
+    if start not in all_stations or end not in all_stations:
+        abort(404)
     
-    if start and end and start in all_stations and end in all_stations:
-        # Generate route between stations
-        route = find_route_with_changes(start, end)
-        
-        # Create a list of coordinates for all stations in the route
-        route_coords = []
-        for station_info in route:
-            station_coord = all_stations[station_info['station']]
-            if station_coord not in route_coords:  # Avoid duplicates
-                route_coords.append(station_coord)
-        
-        # Calculate bounds to focus the map on the route
-        if route_coords:
-            lats = [coord[0] for coord in route_coords]
-            lons = [coord[1] for coord in route_coords]
-            min_lat, max_lat = min(lats), max(lats)
-            min_lon, max_lon = min(lons), max(lons)
-            padding = 0.01  # about 1km
-            bounds = [[min_lat - padding, min_lon - padding], 
-                     [max_lat + padding, max_lon + padding]]
-            metro_map.fit_bounds(bounds)
-        
-        # Route color mapping
-        route_colors = {
-            'Red Line': '#ff0000',
-            'Green Line': '#00ff00'
-        }
-        
-        # KML route name mapping
-        kml_name_mapping = {
-            'Red Line': 'Orange Line',  # KML uses "Orange Line" for "Red Line"
-            'Green Line': 'Green Line'
-        }
-        
-        # Group continuous segments by line
-        segments_by_line = {}
-        current_segment = []
-        current_line = None
-        
-        for i, station_info in enumerate(route):
-            station_name = station_info['station']
-            station_line = station_info['line']
-            
-            # Start of a new segment or a new line
-            if current_line is None or station_line != current_line:
-                # If there was a previous segment, finish it
-                if current_segment:
-                    if current_line not in segments_by_line:
-                        segments_by_line[current_line] = []
-                    segments_by_line[current_line].append(current_segment)
-                
-                # Start a new segment on this line
-                current_segment = [station_name]
-                current_line = station_line
+    map_html, job = compose_index_map(start, end)
+    if map_html is None:
+        return render_pending_response(request.full_path, job)
+    with timed_stage('publish'):
+        return redirect(publish_map(map_html))
+
+
+@app.route('/api/render/<job_id>', methods=['GET'])
+def api_render_job(job_id):
+    """
+    Status of a background map render, for polling: status is 'queued',
+    'running', 'done' (with map_url) or 'failed' (with error).
+    """
+    job = render_pool.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown render job: {job_id}"}), 404
+    return jsonify(render_job_status(job))
+
+
+@app.route('/api/render/<job_id>/events', methods=['GET'])
+def api_render_job_events(job_id):
+    """
+    Server-Sent Events stream for a background map render. Sends one
+    'status' event with the job's status when it finishes, then closes.
+    Keep-alive comments are sent while it is pending.
+    """
+    job = render_pool.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown render job: {job_id}"}), 404
+    
+    def events():
+        while not job.wait(15):
+            yield ': pending\n\n'
+        yield f"event: status\ndata: {json.dumps(render_job_status(job), separators=(',', ':'))}\n\n"
+    
+    response = app.response_class(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def render_metrics():
+    """
+    Scrape-time collector for the render pool.
+    """
+    pool = render_pool.stats()
+    return [
+        ('metro_render_queue_depth', 'gauge', 'Map renders waiting for a worker', [((), pool['queued'])]),
+        ('metro_render_active', 'gauge', 'Map renders in progress', [((), pool['active'])]),
+        ('metro_render_jobs_total', 'counter', 'Background map renders, by outcome',
+         [((('outcome', outcome),), pool[outcome]) for outcome in ('completed', 'failed', 'rejected')]),
+    ]
+
+
+def cache_metrics():
+    """
+    Scrape-time collector for the cache and geometry store counters.
+    """
+    caches = {'rendered_maps': rendered_maps.stats(), 'map_artifacts': map_artifacts.stats()}
+    kml_stats = kml_geometry.stats()
+    return [
+        ('metro_cache_hits_total', 'counter', 'Cache hits',
+         [((('cache', name),), cache['hits']) for name, cache in caches.items()]),
+        ('metro_cache_misses_total', 'counter', 'Cache misses',
+         [((('cache', name),), cache['misses']) for name, cache in caches.items()]),
+        ('metro_cache_evictions_total', 'counter', 'Cache evictions',
+         [((('cache', name),), cache['evictions']) for name, cache in caches.items()]),
+        ('metro_cache_bytes', 'gauge', 'Bytes held in the cache',
+         [((('cache', name),), cache['bytes']) for name, cache in caches.items()]),
+        ('metro_cache_entries', 'gauge', 'Entries held in the cache',
+         [((('cache', name),), cache['entries']) for name, cache in caches.items()]),
+        ('metro_kml_hits_total', 'counter', 'Geometry store lookups', [((), kml_stats['hits'])]),
+        ('metro_kml_reloads_total', 'counter', 'Times base.kml was parsed', [((), kml_stats['reloads'])]),
+    ]
+
+
+request_metrics.register_collector(cache_metrics)
+request_metrics.register_collector(render_metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of request, stage and cache metrics.
+    """
+    return app.response_class(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Cache and geometry store counters, for monitoring.
+    """
+    return jsonify({
+        'kml_geometry': kml_geometry.stats(),
+        'simplification': {
+            kml_name: {
+                str(tolerance): {'vertices': len(table.simplified[tolerance]),
+                                 'max_deviation_m': round(table.max_deviation_m[tolerance], 2)}
+                for tolerance in table.levels
+            } for kml_name, table in segment_tables().items()
+        },
+        'network_tiles': network_tiles().stats(),
+        'base_layers': {f"{view}/{line_filter}": layer.nbytes
+                        for (view, line_filter), layer in _base_layers['layers'].items()},
+        'rendered_maps': rendered_maps.stats(),
+        'map_artifacts': map_artifacts.stats(),
+        'render_pool': render_pool.stats(),
+        'startup': startup_timings
+    })
+
+
+def create_app(startup_artifact_path=None):
+    """
+    Prepare the app for serving and return it, e.g. `gunicorn 'base:create_app()'`.
+    
+    Importing this module only defines the app; the network is loaded here, from
+    the startup artifact when it matches base.kml and the network definition.
+    Otherwise it is built and the artifact is written for the next worker.
+    Anything left unloaded is built on first use.
+    """
+    path = startup_artifact_path or STARTUP_ARTIFACT_PATH
+    started = time.perf_counter()
+    
+    with _network_lock:
+        if routing_engine is None:
+            if load_network_artifact(path):
+                startup_timings['network_source'] = 'artifact'
             else:
-                # Continue the current segment
-                current_segment.append(station_name)
-        
-        # Add the final segment
-        if current_segment:
-            if current_line not in segments_by_line:
-                segments_by_line[current_line] = []
-            segments_by_line[current_line].append(current_segment)
-        
-        # Draw each line segment with appropriate color
-        for line, segments in segments_by_line.items():
-            kml_line_name = kml_name_mapping.get(line)
-            line_color = route_colors.get(line)
-            
-            if kml_line_name in kml_routes:
-                for segment in segments:
-                    if len(segment) >= 2:  # Need at least 2 stations
-                        for j in range(len(segment) - 1):
-                            start_station = segment[j]
-                            end_station = segment[j+1]
-                            start_coord = all_stations[start_station]
-                            end_coord = all_stations[end_station]
-                            
-                            # Extract route segment from KML
-                            route_segment = extract_route_segment(
-                                kml_routes[kml_line_name],
-                                start_coord,
-                                end_coord
-                            )
-                            
-                            # Draw segment
-                            folium.PolyLine(
-                                locations=route_segment,
-                                color=line_color,
-                                weight=5,
-                                opacity=1.0,
-                                tooltip=f"{start_station} to {end_station} ({line})"
-                            ).add_to(metro_map)
-        
-        # Draw transfer points
-        for i in range(len(route) - 1):
-            curr_station = route[i]
-            next_station = route[i+1]
-            
-            if curr_station['station'] == next_station['station'] and curr_station['line'] != next_station['line']:
-                station_coord = all_stations[curr_station['station']]
-                
-                # Add transfer indicator
-                folium.CircleMarker(
-                    location=station_coord,
-                    radius=10,
-                    color="#FF6B6B",
-                    fill=True,
-                    fillColor="#FF6B6B",
-                    fillOpacity=0.8,
-                    weight=2,
-                    tooltip=f"Transfer at {curr_station['station']}: {curr_station['line']} to {next_station['line']}"
-                ).add_to(metro_map)
-        
-        # Add markers for all stations in the route
-        for i, station_info in enumerate(route):
-            station_name = station_info['station']
-            station_coord = all_stations[station_name]
-            station_line = station_info['line']
-            
-            # Skip duplicate markers for transfer stations
-            skip = False
-            if i > 0 and station_name == route[i-1]['station']:
-                skip = True
-            
-            if not skip:
-                # Use different icons for start, end, and transfer stations
-                icon_html = "🚉"  # Default
-                if i == 0:
-                    icon_html = "🚆"  # Start station
-                elif i == len(route) - 1:
-                    icon_html = "🏁"  # End station
-                elif station_name in intersection_stations:
-                    icon_html = "🔄"  # Transfer station
-                
-                # Add marker
-                folium.Marker(
-                    location=station_coord,
-                    tooltip=station_name,
-                    icon=folium.DivIcon(
-                        html=f'<div style="font-size: 15px; text-align: center;">{icon_html}</div>',
-                        icon_size=(20, 20),
-                        icon_anchor=(10, 10)
-                    )
-                ).add_to(metro_map)
-                
-                # Add circle with line color
-                folium.CircleMarker(
-                    location=station_coord,
-                    radius=8,
-                    color=route_colors.get(station_line, '#ff0000'),
-                    fill=True,
-                    fillColor=route_colors.get(station_line, '#ff0000'),
-                    fillOpacity=0.8,
-                    weight=2,
-                    opacity=1.0
-                ).add_to(metro_map)
+                build_network()
+                startup_timings['network_source'] = 'built'
+                try:
+                    save_network_artifact(path)
+                except OSError:
+                    # Read-only deployment - later workers build it themselves
+                    pass
     
-    else:
-        # No route specified, show all lines based on line_filter
-        for route_name, route_data in route_mapping.items():
-            if line_filter == 'all' or (line_filter == 'red' and route_name == 'Red Line') or (line_filter == 'green' and route_name == 'Green Line'):
-                kml_name = route_data['kml_name']
-                
-                if kml_name in kml_routes:
-                    # Draw the entire route line using KML coordinates
-                    folium.PolyLine(
-                        locations=kml_routes[kml_name],
-                        color=route_data['color'],
-                        weight=4,
-                        opacity=1.0,
-                        tooltip=route_name
-                    ).add_to(metro_map)
-                
-                # Add station markers
-                for station, coord in zip(route_data['stations'], route_data['coords']):
-                    # Skip intersection stations that are already added
-                    if station in intersection_stations and route_name == 'Red Line' and station in corridor_2:
-                        continue
-                    
-                    # Add the marker
-                    folium.Marker(
-                        location=coord,
-                        tooltip=station,
-                        icon=folium.DivIcon(
-                            html=f'<div style="font-size: 15px; text-align: center;">🚉</div>',
-                            icon_size=(20, 20),
-                            icon_anchor=(10, 10)
-                        )
-                    ).add_to(metro_map)
-                    
-                    # Add circle marker for better visibility
-                    folium.CircleMarker(
-                        location=coord,
-                        radius=5,
-                        color=route_data['color'],
-                        fill=True,
-                        fillColor=route_data['color'],
-                        fillOpacity=1,
-                        weight=2,
-                        opacity=0.8
-                    ).add_to(metro_map)
-                    
-                    # Highlight intersection stations
-                    if station in intersection_stations:
-                        folium.CircleMarker(
-                            location=coord,
-                            radius=10,
-                            color="#FF6B6B",
-                            fill=False,
-                            weight=2,
-                            opacity=0.8,
-                            tooltip=f"Transfer Station: {station}"
-                        ).add_to(metro_map)
-    
-    # Save map to a temporary file
-    map_html = metro_map._repr_html_()
-    
-    # Create a full-screen template
-    fullscreen_html = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Surat Metro Map</title>
-        <style>
-            body, html {{
-                margin: 0;
-                padding: 0;
-                height: 100vh;
-                width: 100%;
-                overflow: hidden;
-            }}
-            .folium-map {{
-                height: 100vh !important;
-                width: 100% !important;
-            }}
-            iframe {{
-                height: 100vh !important;
-                width: 100% !important;
-                border: none;
-            }}
-        </style>
-    </head>
-    <body>
-        {map_html}
-        <script>
-            // Fix iframe sizing after load
-            document.addEventListener('DOMContentLoaded', function() {{
-                var iframes = document.getElementsByTagName('iframe');
-                for(var i = 0; i < iframes.length; i++) {{
-                    iframes[i].style.height = '100vh';
-                    iframes[i].style.width = '100%';
-                }}
-            }});
-            // remove attribution
-            $('.leaflet-control-attribution').hide()
-        </script>
-    </body>
-    </html>
+    startup_timings['create_app_ms'] = round((time.perf_counter() - started) * 1000.0, 3)
+    return app
+
+
+@app.cli.command('build-startup-artifact')
+def build_startup_artifact_command():
+    """
+    Build the routing and geometry startup artifact.
     """
+    build_network()
+    save_network_artifact(STARTUP_ARTIFACT_PATH)
+    print(f"Startup artifact written to {STARTUP_ARTIFACT_PATH}")
 
-    return fullscreen_html
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    create_app().run(debug=True, host="0.0.0.0", port=5000)
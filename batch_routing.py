@@ -0,0 +1,181 @@
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+# Longest array element worth waiting for more of the body; pairs are far shorter
+MAX_ELEMENT_SIZE = CHUNK_SIZE
+# A decode error this close to the end of the buffer may be a token cut short (e.g. "-Infin")
+TRUNCATION_SLACK = len('-Infinity')
+
+
+class ElementTooLarge(ValueError):
+    """
+    Raised when one array element or NDJSON line is longer than MAX_ELEMENT_SIZE.
+    """
+
+
+def _iter_chunks(stream, first=b''):
+    if first:
+        yield first
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_ndjson(chunks):
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        # The unfinished line is all that is buffered, so memory stays bounded by its length
+        if len(buffer) > MAX_ELEMENT_SIZE:
+            raise ElementTooLarge(f'NDJSON line longer than {MAX_ELEMENT_SIZE} bytes')
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+def _iter_json_array(chunks):
+    # Decode one array element at a time so the whole body is never held in memory
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    started = False
+    exhausted = False
+
+    def refill():
+        nonlocal buffer, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            return False
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        return True
+
+    while True:
+        # Skip whitespace and separators
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n' + (',' if started else ''):
+            pos += 1
+        if pos >= len(buffer):
+            if not refill():
+                raise ValueError('Unexpected end of JSON array')
+            continue
+
+        if not started:
+            if buffer[pos] != '[':
+                raise ValueError('Expected a JSON array')
+            started = True
+            pos += 1
+            continue
+
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            # Only an element split across chunks is worth reading on for. An error before the
+            # end of the buffer cannot be fixed by more input, so the body is not buffered past it.
+            truncated = e.pos >= len(buffer) - TRUNCATION_SLACK or e.msg.startswith('Unterminated string')
+            if truncated and not exhausted and len(buffer) - pos > MAX_ELEMENT_SIZE:
+                raise ElementTooLarge(f'JSON array element longer than {MAX_ELEMENT_SIZE} characters')
+            if not truncated or exhausted or not refill():
+                raise ValueError(f'Malformed JSON array element: {e.msg}')
+            continue
+        # A number at the very end of the buffer may continue in the next chunk
+        if end == len(buffer) and not exhausted and refill():
+            continue
+        pos = end
+        yield item
+
+
+def iter_pairs(stream, mimetype=None):
+    """
+    Incrementally read (start, end) pairs from a request body that is either
+    a JSON array or NDJSON. Items may be {"start": ..., "end": ...} objects
+    (with an optional "id" that is echoed back) or [start, end] arrays.
+
+    Args:
+        stream: File-like request body
+        mimetype (str): 'application/json' for an array, 'application/x-ndjson'
+            for NDJSON; anything else is sniffed from the first byte
+
+    Yields:
+        tuple: (id or None, start, end)
+
+    Raises:
+        ElementTooLarge: Once an item passes MAX_ELEMENT_SIZE, so one huge item
+            cannot make the body buffer grow without bound
+        ValueError: For a body that is not valid JSON or NDJSON
+    """
+    first = stream.read(CHUNK_SIZE)
+    chunks = _iter_chunks(stream, first)
+    if mimetype == 'application/json':
+        is_array = True
+    elif mimetype in ('application/x-ndjson', 'application/jsonl', 'application/jsonlines'):
+        is_array = False
+    else:
+        is_array = first.lstrip()[:1] == b'['
+    items = _iter_json_array(chunks) if is_array else _iter_ndjson(chunks)
+
+    for item in items:
+        if isinstance(item, dict):
+            yield item.get('id'), item.get('start'), item.get('end')
+        elif isinstance(item, list) and len(item) == 2:
+            yield None, item[0], item[1]
+        else:
+            yield None, None, None
+
+
+def stream_routes(pairs, solve):
+    """
+    Turn (id, start, end) pairs into NDJSON lines, one per pair, as they are
+    computed. Repeated pairs are solved once per batch.
+
+    Args:
+        pairs: Iterable of (id, start, end)
+        solve: Callable(start, end) -> dict, raising KeyError for unknown stations; any other
+            per-pair failure is reported in the dict it returns
+
+    Yields:
+        bytes: One NDJSON line per pair, followed by a final summary line
+    """
+    solved = {}  # (start, end) -> serialized result, bounded by the number of station pairs
+    count = 0
+    pairs = iter(pairs)
+    while True:
+        try:
+            item = next(pairs, None)
+        except ValueError as e:
+            # Malformed body - report it in-band, the status line has already been sent
+            yield (json.dumps({'error': f'malformed request body: {e}'}) + '\n').encode('utf-8')
+            return
+        if item is None:
+            break
+
+        item_id, start, end = item
+        count += 1
+        if not isinstance(start, str) or not isinstance(end, str):
+            start = end = None
+        result = solved.get((start, end))
+        if result is None:
+            try:
+                result = json.dumps(solve(start, end), separators=(',', ':'), ensure_ascii=False)[1:-1]
+                solved[(start, end)] = result
+            except KeyError:
+                # Errors are not remembered, so bad input cannot grow the dedup table
+                result = json.dumps({'start': start, 'end': end, 'error': 'unknown station'},
+                                    separators=(',', ':'), ensure_ascii=False)[1:-1]
+
+        if item_id is not None:
+            result = '"id":' + json.dumps(item_id, ensure_ascii=False) + ',' + result
+        yield ('{' + result + '}\n').encode('utf-8')
+
+    yield (json.dumps({'done': True, 'count': count, 'unique': len(solved)}) + '\n').encode('utf-8')
@@ -0,0 +1,319 @@
+"""
+Endpoint and hot-path benchmarks for the metro route finder.
+
+Drives every route through the Flask test client and micro-benchmarks the
+routing and geometry helpers, then writes p50/p95/p99 latencies to JSON and
+compares them against a stored baseline. Every benchmark is measured in
+several rounds and each statistic is the median over the rounds, so one noisy
+round does not fail the gate.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # run and compare with baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline    # record a new baseline
+    python benchmarks/run_benchmarks.py --threshold 0.5 --metric p99_ms
+
+Exits with status 1 when a benchmark regresses past both the relative
+threshold and its noise floor: the spread of the statistic over the rounds,
+in this run or the baseline, and at least --min-delta-ms. Re-record the
+baseline whenever a benchmark is added, so that it is gated too.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results.json')
+
+
+def measure(fn, iterations, warmup=3):
+    """
+    Call fn repeatedly and return latency statistics in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = (time.perf_counter() - t0) * 1000.0
+
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'n': iterations,
+        'mean_ms': round(float(samples.mean()), 4),
+        'min_ms': round(float(samples.min()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'max_ms': round(float(samples.max()), 4),
+    }
+
+
+def endpoint_benchmarks(base):
+    """
+    Return {name: callable} for every endpoint, each asserting a 200 response.
+    """
+    client = base.app.test_client()
+    registered = {rule.rule for rule in base.app.url_map.iter_rules()}
+
+    def get(url):
+        def call():
+            response = client.get(url)
+            job_id = response.headers.get('X-Render-Job')
+            if response.status_code == 202 and job_id:
+                # Rendered in the background; measure until the map is served
+                base.render_pool.get(job_id).wait()
+                response = client.get(url)
+            assert response.status_code == 200, f"GET {url} -> {response.status_code}"
+        return call
+
+    def post(url, data):
+        def call():
+            response = client.post(url, data=data)
+            assert response.status_code == 200, f"POST {url} -> {response.status_code}"
+        return call
+
+    def uncached(call):
+        # Drop the rendered map caches first, so composing the map is measured. The base
+        # layers stay cached, as they do in a running server.
+        def cold():
+            base.rendered_maps.clear()
+            base._overview_maps['key'] = None
+            call()
+        return cold
+
+    benchmarks = {
+        'GET /': get('/'),
+        'POST /': post('/', {'start': 'Sarthana', 'end': 'Bheshan'}),
+        'GET /all_routes': get('/all_routes'),
+        'GET /route_info': get('/route_info'),
+        'GET /station_details': get('/station_details'),
+        'GET /map': get('/map'),
+        'GET /map?line=red': get('/map?line=red'),
+        'GET /map?start&end': get('/map?start=Sarthana&end=Saroli'),
+        'GET /api/route': get('/api/route?start=Sarthana&end=Bheshan'),
+        'GET /api/stations': get('/api/stations'),
+        'GET /api/stations/search': get('/api/stations/search?q=railway+stn'),
+        'GET /api/isochrone': get('/api/isochrone?origin=Surat%20Railway%20Station&minutes=20'),
+        'GET /api/nearest': get('/api/nearest?lat=21.2&lon=72.84&k=3'),
+        'GET /api/journey': get('/api/journey?start=Sarthana&end=Bheshan&depart=08:00'),
+        'POST / (uncached)': uncached(post('/', {'start': 'Sarthana', 'end': 'Bheshan'})),
+        'GET /map (uncached)': uncached(get('/map')),
+        'GET /map?start&end (uncached)': uncached(get('/map?start=Sarthana&end=Saroli')),
+        'GET /api/route (uncached)': uncached(get('/api/route?start=Sarthana&end=Bheshan')),
+    }
+
+    # Only benchmark routes this tree actually serves
+    def path_of(name):
+        return name.split(' ')[1].split('?', 1)[0]
+
+    return {name: fn for name, fn in benchmarks.items() if path_of(name) in registered}
+
+
+# Word lists for the synthetic station catalog
+SYNTHETIC_PLACES = ('Adajan', 'Althan', 'Bhatar', 'Bhestan', 'Dindoli', 'Dumas', 'Godadara', 'Hazira', 'Jahangirpura',
+                    'Kamrej', 'Katargam', 'Kosad', 'Limbayat', 'Magdalla', 'Majura', 'Nanpura', 'Olpad', 'Pal',
+                    'Palanpur', 'Pandesara', 'Parvat', 'Piplod', 'Punagam', 'Rander', 'Sachin', 'Sagrampura',
+                    'Salabatpura', 'Sarthana', 'Udhna', 'Umra', 'Varachha', 'Ved', 'Vesu', 'Yogi Chowk')
+SYNTHETIC_KINDS = ('Gate', 'Garden', 'Road', 'Market', 'Circle', 'Char Rasta', 'Station', 'Chowk', 'Bazar', 'Nagar',
+                   'Park', 'Depot', 'Darwaja', 'Hospital', 'Lake', 'Bridge')
+
+
+def synthetic_station_catalog(count=10000, seed=0):
+    """
+    (name, aliases) pairs for count distinct station names like "Vesu Market 12",
+    about one in ten with an abbreviated alias, for benchmarking station search.
+    """
+    rng = np.random.default_rng(seed)
+    names = {}
+    while len(names) < count:
+        place = SYNTHETIC_PLACES[rng.integers(len(SYNTHETIC_PLACES))]
+        kind = SYNTHETIC_KINDS[rng.integers(len(SYNTHETIC_KINDS))]
+        name = f"{place} {kind} {rng.integers(1, 400)}"
+        if name not in names:
+            names[name] = (f"{place} Stn {len(names)}",) if rng.random() < 0.1 else ()
+    return list(names.items())
+
+
+def micro_benchmarks(base):
+    """
+    Return {name: callable} for the routing and geometry helpers.
+    """
+    kml_routes = base.kml_geometry.routes()
+    line_coords = kml_routes['Orange Line']
+    line_coords_list = [tuple(coord) for coord in line_coords.tolist()]
+    vertex_index = base.kml_geometry.vertex_index('Orange Line')
+    start_coord = base.all_stations['Sarthana']
+    end_coord = base.all_stations['Surat Railway Station']
+    # A fixed spread of positions around the network for the batch nearest-station lookup
+    snap_points = [(21.05 + (i % 40) * 0.006, 72.70 + (i // 40) * 0.01) for i in range(1000)]
+    route = base.find_route_with_changes('Sarthana', 'Bheshan')
+    search_index = base.StationSearchIndex(synthetic_station_catalog(10000))
+
+    return {
+        'extract_route_coordinates_from_kml': lambda: base.extract_route_coordinates_from_kml(base.KML_PATH),
+        'find_nearest_point_index (scan)': lambda: base.find_nearest_point_index(line_coords_list, start_coord),
+        'find_nearest_point_index (index)': lambda: base.find_nearest_point_index(line_coords, start_coord, vertex_index),
+        'extract_route_segment (scan)': lambda: base.extract_route_segment(line_coords_list, start_coord, end_coord),
+        'extract_route_segment (index)': lambda: base.extract_route_segment(line_coords, start_coord, end_coord, vertex_index),
+        'find_route_with_changes': lambda: base.find_route_with_changes('Sarthana', 'Bheshan'),
+        'RoutingEngine.search': lambda: base.routing_engine.search('Sarthana', 'Bheshan'),
+        'isochrone': lambda: base.isochrone('Surat Railway Station', 20),
+        'RoutingEngine.route_matrices': lambda: base.routing_engine.route_matrices(),
+        'nearest_stations (1000 points)': lambda: base.nearest_stations(snap_points, 1),
+        'find_journey (RAPTOR)': lambda: base.find_journey('Sarthana', 'Bheshan', 8 * 3600),
+        'route_overlay + compose': lambda: base.base_layer('index').compose(base.route_overlay(route)),
+        'build_base_map (map)': lambda: base.build_base_map('map').get_root().render(),
+        'station search (10k, short prefix)': lambda: search_index.search('ve', 10),
+        'station search (10k, prefix)': lambda: search_index.search('varachha mar', 10),
+        'station search (10k, word)': lambda: search_index.search('char rasta 12', 10),
+        'station search (10k, alias)': lambda: search_index.search('vesu stn', 10),
+        'station search (10k, fuzzy)': lambda: search_index.search('varacha markte', 10),
+    }
+
+
+STATISTICS = ('mean_ms', 'min_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+
+
+def median_stats(rounds):
+    """
+    Combine the measure() statistics of several rounds by taking the median of
+    each. spread_ms holds how far each statistic moved between the rounds.
+    """
+    combined = {'n': rounds[0]['n']}
+    for key in STATISTICS:
+        combined[key] = round(float(np.median([stats[key] for stats in rounds])), 4)
+    combined['spread_ms'] = {key: round(max(stats[key] for stats in rounds) - min(stats[key] for stats in rounds), 4)
+                             for key in STATISTICS}
+    return combined
+
+
+def compare(results, baseline, metric, threshold, min_delta_ms):
+    """
+    Return a list of (name, baseline value, current value) for every
+    benchmark slower than baseline * (1 + threshold) by more than its noise
+    floor: the larger spread of the metric over the rounds of either run, and
+    at least min_delta_ms. Sub-millisecond endpoints swing by more than 25%
+    between runs on the same code, while a microsecond helper can regress
+    many times over by less than a millisecond, so the floor follows each
+    benchmark's own noise.
+    """
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        noise = max(current.get('spread_ms', {}).get(metric, 0.0), previous.get('spread_ms', {}).get(metric, 0.0),
+                    min_delta_ms)
+        if current[metric] > previous[metric] * (1 + threshold) and current[metric] - previous[metric] > noise:
+            regressions.append((name, previous[metric], current[metric]))
+    return regressions
+
+
+def run(base, args):
+    """
+    Run the selected benchmarks, write the results and compare with the baseline.
+    Returns the process exit status.
+    """
+    benchmarks = {}
+    benchmarks.update(endpoint_benchmarks(base))
+    benchmarks.update(micro_benchmarks(base))
+    if args.only:
+        benchmarks = {name: fn for name, fn in benchmarks.items() if args.only in name}
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'repeats': args.repeats,
+        },
+        'results': {},
+    }
+
+    # Rounds run every benchmark in turn, so a burst of machine noise hits one round of each
+    rounds = {name: [] for name in benchmarks}
+    for _ in range(args.repeats):
+        for name, fn in benchmarks.items():
+            rounds[name].append(measure(fn, args.iterations))
+
+    for name in benchmarks:
+        stats = median_stats(rounds[name])
+        results['results'][name] = stats
+        print(f"{name:<40} p50 {stats['p50_ms']:>9.3f} ms   p95 {stats['p95_ms']:>9.3f} ms   p99 {stats['p99_ms']:>9.3f} ms")
+
+    target = args.baseline if args.update_baseline else args.output
+    with open(target, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {target}")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    ungated = [name for name in results['results'] if name not in baseline.get('results', {})]
+    if ungated:
+        print(f"\nNot in the baseline, so not gated (re-record it with --update-baseline): {', '.join(ungated)}")
+
+    regressions = compare(results, baseline, args.metric, args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) in {args.metric} beyond {args.threshold:.0%} and the noise floor:")
+        for name, previous, current in regressions:
+            print(f"  {name}: {previous:.3f} ms -> {current:.3f} ms")
+        return 1
+
+    print(f"No regressions in {args.metric} beyond {args.threshold:.0%}")
+    return 0
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help='Timed calls per benchmark and round')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Rounds per benchmark; each statistic is the median over the rounds')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Where to write the results JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare against')
+    parser.add_argument('--metric', default='p95_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'],
+                        help='Latency statistic compared against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown as a fraction of the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help='Ignore regressions smaller than this many milliseconds, whatever the noise')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--only', help='Only run benchmarks whose name contains this string')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter('ignore')
+    os.chdir(ROOT)
+    # Uncached renders publish a new artifact every call - keep them out of the real cache directory
+    artifact_dir = tempfile.mkdtemp(prefix='metro_bench_maps_')
+    os.environ['METRO_MAP_ARTIFACT_DIR'] = artifact_dir
+    os.environ['METRO_STARTUP_ARTIFACT'] = os.path.join(artifact_dir, 'startup_artifact.pkl')
+    try:
+        import base
+        base.create_app()
+        return run(base, args)
+    finally:
+        shutil.rmtree(artifact_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Cold-start report for the metro route finder.
+
+Starts fresh interpreters and reports where startup time goes: the modules
+imported by `import base` (from `python -X importtime`), and the time spent
+in create_app() without and with the prebuilt startup artifact. Exits with
+status 1 when a start with the artifact exceeds the startup budget.
+
+Usage:
+    python benchmarks/startup_report.py                    # report and check the default budget
+    python benchmarks/startup_report.py --budget-ms 300 --top 25
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Time a full worker start in a fresh interpreter and print it as JSON
+STARTUP_SNIPPET = """
+import json, time, warnings
+warnings.simplefilter('ignore')
+started = time.perf_counter()
+import base
+imported = time.perf_counter()
+base.create_app()
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000.0,
+    'create_app_ms': (finished - imported) * 1000.0,
+    'total_ms': (finished - started) * 1000.0,
+    'network_source': base.startup_timings.get('network_source'),
+    'folium_loaded': 'folium' in __import__('sys').modules,
+    'scipy_loaded': 'scipy' in __import__('sys').modules,
+}))
+"""
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(env):
+    """
+    Return [(module, self_us, cumulative_us, depth)] for `import base`.
+    """
+    result = run_python(['-X', 'importtime', '-c', 'import base'], env)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def startup_times(env, runs):
+    """
+    Start a worker `runs` times and return the median of each timing.
+    """
+    samples = [json.loads(run_python(['-c', STARTUP_SNIPPET], env).stdout) for _ in range(runs)]
+    summary = {key: round(statistics.median(sample[key] for sample in samples), 3)
+               for key in ('import_ms', 'create_app_ms', 'total_ms')}
+    for key in ('network_source', 'folium_loaded', 'scipy_loaded'):
+        summary[key] = samples[-1][key]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=400.0,
+                        help='Maximum median import + create_app() time with the startup artifact')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreter starts per scenario')
+    parser.add_argument('--top', type=int, default=15, help='Number of imports to list')
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='metro_startup_')
+    env = dict(os.environ)
+    env['METRO_MAP_ARTIFACT_DIR'] = os.path.join(work_dir, 'maps')
+    env['METRO_STARTUP_ARTIFACT'] = os.path.join(work_dir, 'startup_artifact.pkl')
+    try:
+        rows = import_times(env)
+        # importtime lists children before their parent, so the direct imports of
+        # base are the depth-1 rows right above it
+        base_at = next(i for i, row in enumerate(rows) if row[0] == 'base' and row[3] == 0)
+        top_level = []
+        for row in reversed(rows[:base_at]):
+            if row[3] == 0:
+                break
+            if row[3] == 1:
+                top_level.append(row)
+        total_us = rows[base_at][2]
+
+        print(f"import base: {total_us / 1000.0:.1f} ms\n")
+        print(f"{'Direct imports of base':<40} {'cumulative':>12}")
+        for name, _, cumulative_us, _ in sorted(top_level, key=lambda row: -row[2]):
+            print(f"  {name:<38} {cumulative_us / 1000.0:>9.1f} ms")
+
+        print(f"\n{'Slowest modules (self time)':<40} {'self':>12}")
+        for name, self_us, _, _ in sorted(rows[:base_at + 1], key=lambda row: -row[1])[:args.top]:
+            print(f"  {name:<38} {self_us / 1000.0:>9.1f} ms")
+
+        # The first start builds the network and writes the artifact, later starts load it
+        cold = startup_times(env, 1)
+        warm = startup_times(env, args.runs)
+        print()
+        for label, timings in (('Without artifact', cold), ('With artifact', warm)):
+            print(f"{label:<18} import {timings['import_ms']:>8.1f} ms   create_app {timings['create_app_ms']:>8.1f} ms"
+                  f"   total {timings['total_ms']:>8.1f} ms   (network {timings['network_source']},"
+                  f" folium loaded: {timings['folium_loaded']}, scipy loaded: {timings['scipy_loaded']})")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if warm['total_ms'] > args.budget_ms:
+        print(f"\nStartup {warm['total_ms']:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        return 1
+    print(f"\nStartup {warm['total_ms']:.1f} ms is within the {args.budget_ms:.0f} ms budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import numpy as np
+
+from spatial_index import VertexIndex
+
+
+# Extract route coordinates from KML file
+def extract_route_coordinates_from_kml(kml_file_path):
+    import xml.etree.ElementTree as ET
+
+    # Parse the KML file (a path or an open file object)
+    tree = ET.parse(kml_file_path)
+    root = tree.getroot()
+
+    # Define namespace for KML
+    ns = {'kml': 'http://www.opengis.net/kml/2.2'}
+
+    # Find all Placemarks
+    routes = {}
+
+    for placemark in root.findall('.//kml:Placemark', ns):
+        # Get the name of the route
+        name_elem = placemark.find('kml:name', ns)
+        if name_elem is not None:
+            route_name = name_elem.text
+
+            # Find LineString coordinates
+            coords_elem = placemark.find('.//kml:coordinates', ns)
+            if coords_elem is not None:
+                # Parse coordinates
+                coord_text = coords_elem.text.strip()
+                coordinates = []
+
+                for coord in coord_text.split():
+                    parts = coord.split(',')
+                    if len(parts) >= 2:
+                        # KML format is longitude,latitude,altitude - we need latitude,longitude for Folium
+                        lon = float(parts[0])
+                        lat = float(parts[1])
+                        coordinates.append((lat, lon))
+
+                routes[route_name] = coordinates
+
+    return routes
+
+
+def file_digest(path):
+    """
+    Content hash identifying a version of a KML file, without parsing it.
+    """
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class KMLGeometryStore:
+    """
+    Parses a KML file once and keeps every line as a compact (N, 2) float
+    array of (lat, lon) rows shared by all requests.
+
+    The file is re-checked at most every `check_interval` seconds. A changed
+    mtime only triggers a re-parse if the content hash changed as well.
+    """
+
+    def __init__(self, kml_file_path, check_interval=1.0):
+        self.kml_file_path = kml_file_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._indexes = {}
+        self._mtime = None
+        self._digest = None
+        self._next_check = 0.0
+        self.version = 0
+        self.hits = 0
+        self.reloads = 0
+
+    def _load(self, mtime):
+        with open(self.kml_file_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        self._mtime = mtime
+
+        # Touched but not modified - keep the arrays we already have
+        if digest == self._digest:
+            return
+
+        routes = {}
+        for name, coords in extract_route_coordinates_from_kml(io.BytesIO(data)).items():
+            arr = np.array(coords, dtype=np.float64).reshape(-1, 2)
+            arr.setflags(write=False)  # Shared between requests
+            routes[name] = arr
+
+        self._routes = routes
+        self._indexes = {}
+        self._digest = digest
+        self.version += 1
+        self.reloads += 1
+
+    def preload(self, digest, routes):
+        """
+        Seed the store with arrays parsed earlier (e.g. from a startup
+        artifact) for the KML content with this digest. The file is still
+        checked as usual, and only re-parsed if its content differs.
+        """
+        with self._lock:
+            for coords in routes.values():
+                coords.setflags(write=False)
+            self._routes = dict(routes)
+            self._indexes = {}
+            self._digest = digest
+            self.version += 1
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            mtime = os.stat(self.kml_file_path).st_mtime_ns
+            if mtime != self._mtime:
+                self._load(mtime)
+            self._next_check = now + self.check_interval
+
+    def routes(self):
+        """
+        Return a dict of route name -> read-only (N, 2) array of (lat, lon).
+        """
+        self._refresh()
+        self.hits += 1
+        return self._routes
+
+    def get(self, route_name):
+        return self.routes().get(route_name)
+
+    def vertex_index(self, route_name):
+        """
+        Return the spatial index over the vertices of a route, built on first
+        use and dropped whenever the KML is reloaded. None for unknown routes.
+        """
+        coords = self.get(route_name)
+        if coords is None:
+            return None
+        index = self._indexes.get(route_name)
+        if index is None or index.coords is not coords:
+            index = VertexIndex(coords)
+            self._indexes[route_name] = index
+        return index
+
+    @property
+    def digest(self):
+        self._refresh()
+        return self._digest
+
+    def stats(self):
+        return {
+            'path': self.kml_file_path,
+            'version': self.version,
+            'digest': self._digest,
+            'hits': self.hits,
+            'reloads': self.reloads,
+            'lines': {name: len(coords) for name, coords in self._routes.items()},
+        }
@@ -0,0 +1,212 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """
+    Thread-safe LRU cache for rendered documents, bounded by the total size
+    of the cached values in bytes rather than by the number of entries.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        # A single value larger than the whole budget is never cached
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old)
+            self._entries[key] = value
+            self.total_bytes += size
+
+            # Evict least recently used entries until we are back under budget
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class MapArtifactStore:
+    """
+    Content-addressed store for rendered map documents.
+
+    Each document is stored under the hash of its bytes, so a page can
+    reference exactly the map it rendered. Documents are kept in memory and,
+    when cache_dir is set, written once to disk so that other worker
+    processes can serve artifacts they did not render themselves.
+
+    The directory is private to the user running the app, and files read
+    back from it are served only if they still hash to their name. Files on
+    disk are pruned least recently used first (by mtime, refreshed on each
+    disk read) once they take more than max_disk_bytes.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None, max_disk_bytes=None):
+        """
+        Args:
+            max_bytes (int): Budget for the documents kept in memory
+            cache_dir (str): Directory shared with other workers, or None for memory only
+            max_disk_bytes (int): Budget for the files in cache_dir, defaults to 4 * max_bytes
+
+        Raises:
+            PermissionError: If cache_dir belongs to another user
+        """
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else 4 * max_bytes
+        self._memory = ByteLRUCache(max_bytes)
+        self._prune_lock = threading.Lock()
+        self.disk_bytes = 0
+        self.disk_evictions = 0
+        self.corrupt_reads = 0
+        if cache_dir:
+            self._prepare_dir(cache_dir)
+
+    @staticmethod
+    def _prepare_dir(cache_dir):
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not hasattr(os, 'getuid'):
+            return
+        # Another user's directory (e.g. pre-created in a shared /tmp) could feed us any document
+        st = os.stat(cache_dir)
+        if st.st_uid != os.getuid():
+            raise PermissionError(f"Map artifact directory {cache_dir} is owned by another user")
+        if st.st_mode & 0o077:
+            os.chmod(cache_dir, 0o700)
+
+    @staticmethod
+    def digest_of(html):
+        return hashlib.sha256(html).hexdigest()[:32]
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, digest + '.html')
+
+    def publish(self, html):
+        """
+        Store a rendered document (bytes) and return its digest.
+        """
+        digest = self.digest_of(html)
+        if digest in self._memory:
+            return digest
+        self._memory.put(digest, html)
+
+        if self.cache_dir:
+            path = self._path(digest)
+            if os.path.exists(path):
+                self._touch(path)
+            else:
+                # Write to a temporary name first so readers never see a partial file
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(html)
+                os.replace(tmp_path, path)
+                self._prune()
+        return digest
+
+    def get(self, digest):
+        html = self._memory.get(digest)
+        if html is None and self.cache_dir:
+            path = self._path(digest)
+            try:
+                with open(path, 'rb') as f:
+                    html = f.read()
+            except (OSError, ValueError):
+                return None
+            if self.digest_of(html) != digest:
+                # Tampered with or damaged on disk - never serve it
+                self.corrupt_reads += 1
+                return None
+            self._touch(path)
+            self._memory.put(digest, html)
+        return html
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        """
+        Delete the least recently used files until the directory is within
+        max_disk_bytes. Other workers may be pruning too, so files that have
+        already gone are skipped.
+        """
+        with self._prune_lock:
+            files = []
+            try:
+                with os.scandir(self.cache_dir) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith('.html'):
+                            continue
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        files.append((st.st_mtime, st.st_size, entry.path))
+            except OSError:
+                return
+            total = sum(size for _, size, _ in files)
+            files.sort()
+            for _, size, path in files:
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    self.disk_evictions += 1
+                except OSError:
+                    pass
+                total -= size
+            self.disk_bytes = total
+
+    def stats(self):
+        stats = self._memory.stats()
+        stats['cache_dir'] = self.cache_dir
+        stats['disk_bytes'] = self.disk_bytes
+        stats['max_disk_bytes'] = self.max_disk_bytes
+        stats['disk_evictions'] = self.disk_evictions
+        stats['corrupt_reads'] = self.corrupt_reads
+        return stats
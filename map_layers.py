@@ -0,0 +1,54 @@
+import html
+import json
+
+# Marks the spot in a base document where the overlay is spliced in. It contains nothing
+# HTML-escaping changes, so it survives being embedded in an iframe's srcdoc.
+OVERLAY_PLACEHOLDER = '__MAP_OVERLAY__'
+
+
+def overlay_json(overlay):
+    """
+    Serialize an overlay for inlining into a <script> block.
+    """
+    body = json.dumps(overlay, separators=(',', ':'), ensure_ascii=False)
+    # A "</script>" in a station name must not end the script block
+    return body.replace('</', '<\\/')
+
+
+class LayeredMap:
+    """
+    A map document whose base layer is rendered once, with a slot for a
+    per-request overlay.
+
+    The base document is split at OVERLAY_PLACEHOLDER when it is built, so
+    composing a map is serializing the overlay and joining three byte
+    strings: the cost grows with the overlay, not with the base layer.
+    """
+
+    def __init__(self, document, srcdoc=False):
+        """
+        Args:
+            document (str): Rendered base document containing OVERLAY_PLACEHOLDER once
+            srcdoc (bool): The placeholder sits in an HTML-escaped iframe srcdoc,
+                so the overlay has to be escaped the same way
+        """
+        head, placeholder, tail = document.partition(OVERLAY_PLACEHOLDER)
+        if not placeholder:
+            raise ValueError("Base document has no overlay slot")
+        self.head = head.encode('utf-8')
+        self.tail = tail.encode('utf-8')
+        self.srcdoc = srcdoc
+
+    def compose(self, overlay=None):
+        """
+        Return the document with overlay (a JSON-serializable dict, or None
+        for the base layer alone) spliced in, as bytes.
+        """
+        body = overlay_json(overlay)
+        if self.srcdoc:
+            body = html.escape(body)
+        return b''.join((self.head, body.encode('utf-8'), self.tail))
+
+    @property
+    def nbytes(self):
+        return len(self.head) + len(self.tail)
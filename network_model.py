@@ -0,0 +1,138 @@
+import json
+from collections import namedtuple
+
+# One metro line: display name, short id used by ?line= filters, KML placemark
+# name, color, emoji and its stations in order
+Line = namedtuple('Line', ['name', 'id', 'kml_name', 'color', 'emoji', 'stations'])
+
+
+class MetroNetwork:
+    """
+    A metro network with any number of lines, indexed for constant-time
+    lookups: station -> coordinates, station -> the lines serving it, and
+    line id -> line.
+
+    A station served by more than one line is a transfer station.
+    """
+
+    def __init__(self, name, center, station_coords, lines, aliases=None):
+        """
+        Args:
+            name (str): Network name shown in page titles
+            center (tuple): (lat, lon) the overview maps are centered on
+            station_coords (dict): Station name -> (lat, lon)
+            lines (list): Line tuples, in display order
+            aliases (dict): Station name -> other names it is searched by
+        """
+        self.name = name
+        self.center = center
+        self.station_coords = station_coords
+        self.aliases = {station: tuple(names) for station, names in (aliases or {}).items()}
+        self.lines = {line.name: line for line in lines}
+        self.line_ids = {line.id: line.name for line in lines}
+
+        station_lines = {}
+        for line in lines:
+            for station in line.stations:
+                served_by = station_lines.setdefault(station, [])
+                if line.name not in served_by:
+                    served_by.append(line.name)
+        self.station_lines = {station: tuple(served_by) for station, served_by in station_lines.items()}
+        self.transfer_stations = frozenset(
+            station for station, served_by in self.station_lines.items() if len(served_by) > 1
+        )
+
+    def lines_of(self, station):
+        """
+        Return the names of the lines serving station, in display order.
+        """
+        return self.station_lines.get(station, ())
+
+    def primary_line(self, station):
+        """
+        Return the first line serving station, or None for unknown stations.
+        """
+        served_by = self.station_lines.get(station)
+        return served_by[0] if served_by else None
+
+    def line_stations(self):
+        """
+        Return each line's stations in order, keyed by line name.
+        """
+        return {name: list(line.stations) for name, line in self.lines.items()}
+
+
+def load_network(path):
+    """
+    Load a MetroNetwork from a JSON file of the form
+
+        {
+            "name": "Surat Metro",
+            "center": [lat, lon],
+            "stations": {"Station name": [lat, lon], ...},
+            "lines": [
+                {"name": "Red Line", "id": "red", "kml_name": "Orange Line",
+                 "color": "#ff0000", "emoji": "🔴", "stations": ["Station name", ...]},
+                ...
+            ],
+            "aliases": {"Station name": ["Other name", ...], ...}
+        }
+
+    "center" defaults to the mean of the station coordinates, "id" to the
+    first word of the line name in lower case, and "kml_name" to the line name.
+    "aliases" is optional. Every station must be on a line. Lines need not
+    share stations: pairs of stations with no route between them are
+    answered as such.
+
+    Raises:
+        ValueError: If the file is not a valid network description
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    station_coords = {}
+    for station, coord in data.get('stations', {}).items():
+        if len(coord) != 2:
+            raise ValueError(f"Station {station!r} needs [lat, lon] coordinates")
+        station_coords[station] = (float(coord[0]), float(coord[1]))
+    if not station_coords:
+        raise ValueError(f"No stations in {path}")
+
+    lines = []
+    for entry in data.get('lines', []):
+        name = entry['name']
+        stations = list(entry['stations'])
+        unknown = [station for station in stations if station not in station_coords]
+        if unknown:
+            raise ValueError(f"{name} lists stations with no coordinates: {', '.join(unknown)}")
+        lines.append(Line(
+            name=name,
+            id=entry.get('id', name.split()[0].lower()),
+            kml_name=entry.get('kml_name', name),
+            color=entry.get('color', '#3388ff'),
+            emoji=entry.get('emoji', '🚇'),
+            stations=tuple(stations)
+        ))
+    if not lines:
+        raise ValueError(f"No lines in {path}")
+    if len({line.name for line in lines}) != len(lines) or len({line.id for line in lines}) != len(lines):
+        raise ValueError(f"Line names and ids in {path} must be unique")
+    if {'all', 'none'} & {line.id for line in lines}:
+        raise ValueError("'all' and 'none' are reserved line filters, not line ids")
+    served = {station for line in lines for station in line.stations}
+    unserved = [station for station in station_coords if station not in served]
+    if unserved:
+        raise ValueError(f"Stations on no line: {', '.join(unserved)}")
+
+    aliases = data.get('aliases', {})
+    unknown = [station for station in aliases if station not in station_coords]
+    if unknown:
+        raise ValueError(f"Aliases given for unknown stations: {', '.join(unknown)}")
+
+    center = data.get('center')
+    if center is None:
+        coords = list(station_coords.values())
+        center = (sum(lat for lat, _ in coords) / len(coords), sum(lon for _, lon in coords) / len(coords))
+
+    return MetroNetwork(data.get('name', 'Metro'), (float(center[0]), float(center[1])), station_coords, lines,
+                        aliases)
@@ -0,0 +1,187 @@
+from bisect import bisect_left
+from collections import namedtuple
+
+# One leg of a journey. line is None for a footpath between stops
+JourneyLeg = namedtuple('JourneyLeg', ['line', 'trip_id', 'from_stop', 'to_stop', 'departure', 'arrival', 'stops'])
+Journey = namedtuple('Journey', ['departure', 'arrival', 'legs'])
+
+INFINITY = 2 ** 31 - 1
+
+
+class RaptorEngine:
+    """
+    Earliest-arrival queries over a Timetable with RAPTOR (Delling et al.,
+    "Round-Based Public Transit Routing").
+
+    Round k finds the earliest arrival at every stop using at most k trips:
+    each pattern touched in the previous round is scanned once along its
+    stops, hopping onto the earliest trip catchable at each stop, then
+    footpaths are relaxed. There is no priority queue; the work is a
+    sequence of scans over the timetable's flat arrays.
+    """
+
+    def __init__(self, timetable, max_rounds=8):
+        self.timetable = timetable
+        self.max_rounds = max_rounds
+
+        # Zero-copy views of the timetable arrays; indexing them yields plain Python
+        # ints, which keeps the per-element cost of the scans low
+        self._pattern_stops = memoryview(timetable.pattern_stops)
+        self._stop_ptr = memoryview(timetable.pattern_stop_ptr)
+        self._time_ptr = memoryview(timetable.pattern_time_ptr)
+        self._trip_counts = memoryview(timetable.pattern_trip_counts)
+        self._arrivals = memoryview(timetable.arrivals)
+        self._departures = memoryview(timetable.departures)
+        self._stop_pattern_ptr = memoryview(timetable.stop_pattern_ptr)
+        self._stop_patterns = memoryview(timetable.stop_patterns)
+        self._stop_pattern_positions = memoryview(timetable.stop_pattern_positions)
+        self._change_seconds = memoryview(timetable.change_seconds)
+        self._footpath_ptr = memoryview(timetable.footpath_ptr)
+        self._footpath_stops = memoryview(timetable.footpath_stops)
+        self._footpath_seconds = memoryview(timetable.footpath_seconds)
+
+    def _earliest_trip(self, pattern, position, ready):
+        # Departures of all trips at this stop are a sorted, contiguous run
+        count = self._trip_counts[pattern]
+        start = self._time_ptr[pattern] + position * count
+        trip = bisect_left(self._departures, ready, start, start + count) - start
+        return trip if trip < count else None
+
+    def earliest_arrival(self, origins, targets, departure_time):
+        """
+        Find the journey that reaches any of the target stops earliest,
+        leaving any of the origin stops no earlier than departure_time.
+        Ties are broken in favour of fewer trips.
+
+        Args:
+            origins (list): Origin stop indices
+            targets (list): Target stop indices
+            departure_time (int): Seconds after midnight
+
+        Returns:
+            Journey or None if no target is reachable within max_rounds trips
+        """
+        num_stops = len(self.timetable.stop_ids)
+        best = [INFINITY] * num_stops
+        previous_round = [INFINITY] * num_stops
+        ready = [INFINITY] * num_stops  # When a trip can be boarded at the stop, after any change time
+        parents = [{}]
+        targets = set(targets)
+        best_target = INFINITY
+
+        for stop in origins:
+            previous_round[stop] = best[stop] = ready[stop] = departure_time
+        marked = set(origins)
+        self._relax_footpaths(marked, previous_round, best, ready, parents[0])
+        for stop in targets:
+            best_target = min(best_target, best[stop])
+
+        for _ in range(self.max_rounds):
+            # Earliest marked position on every pattern through a marked stop
+            queue = {}
+            for stop in marked:
+                for i in range(self._stop_pattern_ptr[stop], self._stop_pattern_ptr[stop + 1]):
+                    pattern = self._stop_patterns[i]
+                    position = self._stop_pattern_positions[i]
+                    if position < queue.get(pattern, INFINITY):
+                        queue[pattern] = position
+
+            current_round = previous_round[:]
+            next_ready = ready[:]
+            round_parents = {}
+            marked = set()
+
+            for pattern, first_position in queue.items():
+                stop_offset = self._stop_ptr[pattern]
+                num_pattern_stops = self._stop_ptr[pattern + 1] - stop_offset
+                time_offset = self._time_ptr[pattern]
+                count = self._trip_counts[pattern]
+                trip = None
+                boarded_at = None
+
+                for position in range(first_position, num_pattern_stops):
+                    stop = self._pattern_stops[stop_offset + position]
+                    if trip is not None:
+                        arrival = self._arrivals[time_offset + position * count + trip]
+                        if arrival < best[stop] and arrival < best_target:
+                            current_round[stop] = best[stop] = arrival
+                            next_ready[stop] = arrival + self._change_seconds[stop]
+                            round_parents[stop] = (pattern, trip, boarded_at, position)
+                            marked.add(stop)
+                            if stop in targets:
+                                best_target = arrival
+
+                    # Hop onto an earlier trip if the previous round reached this stop in time
+                    if ready[stop] < INFINITY and (
+                            trip is None or ready[stop] <= self._departures[time_offset + position * count + trip]):
+                        earlier = self._earliest_trip(pattern, position, ready[stop])
+                        if earlier is not None and (trip is None or earlier < trip):
+                            trip = earlier
+                            boarded_at = position
+
+            self._relax_footpaths(marked, current_round, best, next_ready, round_parents)
+            parents.append(round_parents)
+            previous_round, ready = current_round, next_ready
+            if not marked:
+                break
+
+        return self._journey(parents, origins, targets, best, departure_time)
+
+    def _relax_footpaths(self, marked, arrivals, best, ready, round_parents):
+        for stop in list(marked):
+            for i in range(self._footpath_ptr[stop], self._footpath_ptr[stop + 1]):
+                other = self._footpath_stops[i]
+                arrival = arrivals[stop] + self._footpath_seconds[i]
+                if arrival < best[other]:
+                    arrivals[other] = best[other] = ready[other] = arrival
+                    round_parents[other] = ('walk', stop, arrivals[stop], arrival)
+                    marked.add(other)
+
+    @staticmethod
+    def _label_round(parents, stop, round_index):
+        # The latest round, up to round_index, that set the stop's arrival (0 for an origin)
+        for k in range(round_index, 0, -1):
+            if stop in parents[k]:
+                return k
+        return 0
+
+    def _journey(self, parents, origins, targets, best, departure_time):
+        reached = [stop for stop in targets if best[stop] < INFINITY]
+        if not reached:
+            return None
+        # Earliest arrival first, then the fewest trips
+        target = min(reached, key=lambda stop: (best[stop], self._label_round(parents, stop, len(parents) - 1)))
+
+        legs = []
+        stop = target
+        round_index = self._label_round(parents, stop, len(parents) - 1)
+        while True:
+            parent = parents[round_index].get(stop)
+            if parent is None:
+                break  # Back at an origin
+            if parent[0] == 'walk':
+                _, from_stop, walk_departure, walk_arrival = parent
+                legs.append(JourneyLeg(None, None, from_stop, stop, walk_departure, walk_arrival, [from_stop, stop]))
+                stop = from_stop
+                round_index = self._label_round(parents, stop, round_index)
+                continue
+
+            pattern, trip, boarded_at, alighted_at = parent
+            count = self._trip_counts[pattern]
+            time_offset = self._time_ptr[pattern]
+            stop_offset = self._stop_ptr[pattern]
+            stops = self._pattern_stops[stop_offset + boarded_at:stop_offset + alighted_at + 1].tolist()
+            legs.append(JourneyLeg(
+                self.timetable.pattern_names[pattern],
+                self.timetable.pattern_trip_ids[pattern][trip],
+                stops[0],
+                stops[-1],
+                self._departures[time_offset + boarded_at * count + trip],
+                self._arrivals[time_offset + alighted_at * count + trip],
+                stops
+            ))
+            stop = stops[0]
+            round_index = self._label_round(parents, stop, round_index - 1)
+
+        legs.reverse()
+        return Journey(departure_time, best[target], legs)
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RenderQueueFull(Exception):
+    """
+    Raised when a render is submitted while the queue is at capacity.
+    """
+
+
+class RenderJob:
+    """
+    One background render. status moves from 'queued' to 'running' to
+    'done' (result holds the return value) or 'failed' (error holds the
+    message).
+    """
+
+    def __init__(self, job_id, key):
+        self.id = job_id
+        self.key = key
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """
+        Block until the job has finished or timeout seconds have passed.
+        Returns True if it finished.
+        """
+        return self._done.wait(timeout)
+
+    def wait_seconds(self):
+        # Time spent queued, so far if not started yet
+        return (self.started or time.perf_counter()) - self.submitted
+
+    def render_seconds(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+
+class RenderPool:
+    """
+    Bounded thread pool for rendering map documents off the request thread.
+
+    At most max_queue jobs wait for a worker; submitting more raises
+    RenderQueueFull so callers can shed load instead of piling up work.
+    Jobs are identified by their cache key: submitting a key that is queued
+    or running returns the existing job, so a popular map is rendered once
+    however many requests ask for it. A key whose job finished, or failed, is
+    rendered again. The most recent max_jobs jobs are kept for status lookups.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, max_jobs=1024, on_finish=None):
+        """
+        Args:
+            on_finish (callable): Called with every finished RenderJob, e.g. to record metrics
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self.on_finish = on_finish
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @staticmethod
+    def job_id(key):
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+
+    def submit(self, key, fn):
+        """
+        Queue fn() to run on a worker, unless a job for key is queued or running already.
+
+        Returns:
+            RenderJob
+
+        Raises:
+            RenderQueueFull: If max_queue jobs are already waiting
+        """
+        job_id = self.job_id(key)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in ('queued', 'running'):
+                return job
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise RenderQueueFull(f"{self.queued} renders already queued")
+
+            job = RenderJob(job_id, key)
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            self.queued += 1
+            if self._executor is None:
+                # Worker threads are only started by the first render
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='render')
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        job.started = time.perf_counter()
+        job.status = 'running'
+        try:
+            job.result = fn()
+            job.status = 'done'
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = 'failed'
+        job.finished = time.perf_counter()
+        with self._lock:
+            self.active -= 1
+            if job.status == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+        job._done.set()
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def get(self, job_id):
+        """
+        Return the job with this id, or None if it is unknown or expired.
+        """
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'queued': self.queued,
+            'active': self.active,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
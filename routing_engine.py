@@ -0,0 +1,493 @@
+import heapq
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(a, b):
+    """
+    Great-circle distance in kilometres between two (lat, lon) points.
+    """
+    lat1, lon1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lon2 = math.radians(b[0]), math.radians(b[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def haversine_km_array(lat1, lon1, lat2, lon2):
+    """
+    Vectorized haversine_km over arrays of latitudes and longitudes in
+    radians (broadcast against each other).
+    """
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def polyline_length_km(coords):
+    """
+    Length in kilometres of a polyline given as a sequence of (lat, lon).
+    """
+    return sum(haversine_km(coords[i], coords[i + 1]) for i in range(len(coords) - 1))
+
+
+class RoutingEngine:
+    """
+    Least-time routing over (station, line) states.
+
+    Every station gets one state per line that serves it. Riding between
+    adjacent stations on a line is an in-vehicle edge weighted by travel
+    time (track length / speed + dwell), and changing lines at a station is
+    an explicit transfer edge weighted by a penalty. Queries run A* with a
+    haversine lower bound, so transfers fall out of the search directly.
+
+    Stations, lines and states are interned as integer ids, and the graph is
+    stored as CSR arrays (indptr / indices / weights), so memory grows with
+    the number of edges rather than with per-node dicts and name strings.
+    """
+
+    def __init__(self, lines, station_coords, segment_lengths=None, speed_kmh=34.0,
+                 dwell_seconds=30.0, transfer_penalty_seconds=300.0):
+        """
+        Args:
+            lines (dict): Line name -> ordered list of station names
+            station_coords (dict): Station name -> (lat, lon)
+            segment_lengths (dict): Optional (line, a, b) -> track length in km for
+                adjacent stations; missing pairs use the straight-line distance
+            speed_kmh (float): Average in-vehicle speed
+            dwell_seconds (float): Time spent at each intermediate stop
+            transfer_penalty_seconds (float): Cost of changing lines
+        """
+        segment_lengths = segment_lengths or {}
+        self.speed_kmh = speed_kmh
+        self.dwell_seconds = dwell_seconds
+        self.transfer_penalty_seconds = transfer_penalty_seconds
+
+        # Name <-> id maps for stations and lines
+        self.station_names = list(station_coords)
+        self.station_id = {name: i for i, name in enumerate(self.station_names)}
+        self.line_names = list(lines)
+        self.line_id = {name: i for i, name in enumerate(self.line_names)}
+
+        # Station coordinates in radians, for the vectorized heuristic
+        coords = np.radians(np.array([station_coords[name] for name in self.station_names], dtype=float).reshape(-1, 2))
+        self._lat = coords[:, 0]
+        self._lon = coords[:, 1]
+
+        # Intern every (station, line) state as an integer id
+        state_station = []
+        state_line = []
+        state_id = {}
+        for line, line_stations in lines.items():
+            line_index = self.line_id[line]
+            for station in line_stations:
+                key = (self.station_id[station], line_index)
+                if key not in state_id:
+                    state_id[key] = len(state_station)
+                    state_station.append(key[0])
+                    state_line.append(line_index)
+        self.state_station = np.array(state_station, dtype=np.int32)
+        self.state_line = np.array(state_line, dtype=np.int32)
+        self._state_id = state_id
+
+        # States of each station, as CSR (station_state_ptr / station_state_ids)
+        order = np.argsort(self.state_station, kind='stable').astype(np.int32)
+        counts = np.bincount(self.state_station, minlength=len(self.station_names))
+        self.station_state_ptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+        self.station_state_ids = order
+
+        sources = []
+        targets = []
+        weights = []
+        lengths = []
+
+        # In-vehicle edges between adjacent stations, in both directions
+        for line, line_stations in lines.items():
+            line_index = self.line_id[line]
+            for a, b in zip(line_stations, line_stations[1:]):
+                length = segment_lengths.get((line, a, b))
+                if length is None:
+                    length = haversine_km(station_coords[a], station_coords[b])
+                seconds = length / speed_kmh * 3600.0 + dwell_seconds
+                u = state_id[(self.station_id[a], line_index)]
+                v = state_id[(self.station_id[b], line_index)]
+                sources += (u, v)
+                targets += (v, u)
+                weights += (seconds, seconds)
+                lengths += (length, length)
+
+        # Transfer edges between the lines serving the same station
+        for station in range(len(self.station_names)):
+            station_state_ids = self._states_of(station)
+            for u in station_state_ids:
+                for v in station_state_ids:
+                    if u != v:
+                        sources.append(u)
+                        targets.append(v)
+                        weights.append(transfer_penalty_seconds)
+                        lengths.append(0.0)
+
+        # Pack the edge list into CSR arrays
+        sources = np.array(sources, dtype=np.int32)
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(state_station))
+        self.indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+        self.indices = np.array(targets, dtype=np.int32)[order]
+        self.weights = np.array(weights, dtype=np.float64)[order]
+        self.lengths = np.array(lengths, dtype=np.float64)[order]  # Track km of each edge, 0 for transfers
+        self._bind_views()
+
+        # No in-vehicle edge is faster than this, which keeps the A* heuristic admissible
+        self._seconds_per_km = 3600.0 / speed_kmh
+
+    def _bind_views(self):
+        # Zero-copy views of the CSR arrays; indexing them yields plain Python
+        # numbers, which keeps the per-edge cost of the search loop low
+        self._indptr_view = memoryview(self.indptr)
+        self._indices_view = memoryview(self.indices)
+        self._weights_view = memoryview(self.weights)
+
+    def __getstate__(self):
+        # memoryviews cannot be pickled - they are rebuilt on load
+        state = self.__dict__.copy()
+        for name in ('_indptr_view', '_indices_view', '_weights_view'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind_views()
+
+    @property
+    def num_states(self):
+        return len(self.state_station)
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the graph arrays.
+        """
+        return sum(array.nbytes for array in (self.state_station, self.state_line, self.station_state_ptr,
+                                              self.station_state_ids, self.indptr, self.indices, self.weights,
+                                              self.lengths))
+
+    def travel_time_matrix(self):
+        """
+        Least travel time in seconds between every pair of stations, as a
+        (stations x stations) float array indexed like station_names, with
+        inf for unreachable pairs. Agrees with search() for every pair.
+
+        Shortest paths between all states come from scipy's compiled
+        all-sources Dijkstra over the CSR arrays; each station's row and
+        column are then the minimum over its states, taken with
+        np.minimum.reduceat over the station -> states CSR order.
+        """
+        from scipy.sparse.csgraph import dijkstra
+
+        num_states = self.num_states
+        num_stations = len(self.station_names)
+        matrix = np.full((num_stations, num_stations), np.inf)
+        if num_states == 0:
+            return matrix
+
+        state_seconds = dijkstra(self._scipy_graph()[0], directed=True)
+
+        # Group states by station and reduce rows, then columns, to stations
+        served = np.flatnonzero(np.diff(self.station_state_ptr) > 0)
+        starts = self.station_state_ptr[served]
+        grouped = state_seconds[np.ix_(self.station_state_ids, self.station_state_ids)]
+        reduced = np.minimum.reduceat(np.minimum.reduceat(grouped, starts, axis=0), starts, axis=1)
+        matrix[np.ix_(served, served)] = reduced
+        np.fill_diagonal(matrix, 0.0)
+        return matrix
+
+    def _scipy_graph(self):
+        """
+        The state graph as a scipy CSR matrix of seconds, plus the track length
+        of every kept edge. Only the cheapest of any parallel edges is kept,
+        since scipy would add them up.
+        """
+        from scipy.sparse import csr_matrix
+
+        num_states = self.num_states
+        sources = np.repeat(np.arange(num_states, dtype=np.int32), np.diff(self.indptr))
+        order = np.lexsort((self.weights, self.indices, sources))
+        sources, targets = sources[order], self.indices[order]
+        weights, lengths = self.weights[order], self.lengths[order]
+        first = np.ones(len(sources), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        graph = csr_matrix((weights[first], (sources[first], targets[first])), shape=(num_states, num_states))
+        edge_lengths = csr_matrix((lengths[first], (sources[first], targets[first])), shape=(num_states, num_states))
+        return graph, edge_lengths
+
+    def route_matrices(self, block_size=256):
+        """
+        Station-to-station matrices along the least-time route of every pair,
+        indexed like station_names:
+
+            seconds      travel time (float, inf if unreachable)
+            distance_km  track length ridden (float, inf if unreachable)
+            hops         station-to-station rides (int, -1 if unreachable)
+            transfers    line changes (int, -1 if unreachable)
+
+        One multi-source Dijkstra per origin station yields the shortest-path
+        tree over states, and the attributes are summed along the trees by
+        pointer jumping. Origins are processed block_size at a time, which
+        bounds the working memory to a few block_size x num_states arrays.
+        """
+        from scipy.sparse.csgraph import dijkstra
+
+        num_states = self.num_states
+        num_stations = len(self.station_names)
+        matrices = {
+            'seconds': np.full((num_stations, num_stations), np.inf),
+            'distance_km': np.full((num_stations, num_stations), np.inf),
+            'hops': np.full((num_stations, num_stations), -1, dtype=np.int32),
+            'transfers': np.full((num_stations, num_stations), -1, dtype=np.int32),
+        }
+        if num_states == 0:
+            return matrices
+
+        graph, edge_lengths = self._scipy_graph()
+        group_sizes = np.diff(self.station_state_ptr)
+        served = np.flatnonzero(group_sizes > 0)
+        group_starts, group_sizes = self.station_state_ptr[served], group_sizes[served]
+
+        for first in range(0, num_stations, block_size):
+            origins = range(first, min(first + block_size, num_stations))
+            seconds = np.full((len(origins), num_states), np.inf)
+            predecessors = np.full((len(origins), num_states), -9999, dtype=np.int32)
+            for row, station in enumerate(origins):
+                states = self._states_of(station)
+                if states:
+                    seconds[row], predecessors[row], _ = dijkstra(
+                        graph, directed=True, indices=states, min_only=True, return_predecessors=True
+                    )
+            totals = self._tree_totals(predecessors, edge_lengths)
+
+            # Reduce target states to stations, taking the attributes of each station's fastest state
+            grouped = seconds[:, self.station_state_ids]
+            fastest = np.repeat(np.minimum.reduceat(grouped, group_starts, axis=1), group_sizes, axis=1)
+            positions = np.where(grouped == fastest, np.arange(num_states), num_states)
+            best = self.station_state_ids[np.minimum.reduceat(positions, group_starts, axis=1)]
+            best_seconds = np.take_along_axis(seconds, best, axis=1)
+            reachable = np.isfinite(best_seconds)
+
+            block = slice(origins.start, origins.stop)
+            for name, values in (('seconds', best_seconds),) + tuple(
+                    (name, np.take_along_axis(values, best, axis=1)) for name, values in totals.items()):
+                target = matrices[name][block]
+                target[:, served] = np.where(reachable, values, target[:, served])
+        return matrices
+
+    def _tree_totals(self, predecessors, edge_lengths):
+        # Track km, rides and line changes from the root of every shortest-path tree (one per
+        # row of predecessors) to each state. Every entry repeatedly adds the total of its
+        # current ancestor and skips to that ancestor's ancestor, so paths of any depth take
+        # a logarithmic number of passes. Roots and unreachable states are their own ancestor.
+        num_rows, num_states = predecessors.shape
+        child = np.broadcast_to(np.arange(num_states), predecessors.shape)
+        is_root = predecessors < 0
+        ancestor = np.where(is_root, child, predecessors).astype(np.intp)
+        is_transfer = self.state_station[ancestor] == self.state_station[child]
+        distance = np.asarray(edge_lengths[ancestor.ravel(), child.ravel()]).ravel()
+        hops = (~is_transfer & ~is_root).astype(np.int32).ravel()
+        transfers = (is_transfer & ~is_root).astype(np.int32).ravel()
+
+        # Flat indices from here on; an entry is final once its ancestor is a root
+        ancestor = (ancestor + np.arange(num_rows)[:, None] * num_states).ravel()
+        pending = np.flatnonzero(ancestor[ancestor] != ancestor)
+        while pending.size:
+            jump = ancestor[pending]
+            distance[pending] += distance[jump]
+            hops[pending] += hops[jump]
+            transfers[pending] += transfers[jump]
+            ancestor[pending] = ancestor[jump]
+            pending = pending[ancestor[ancestor[pending]] != ancestor[pending]]
+
+        shape = predecessors.shape
+        return {'distance_km': distance.reshape(shape), 'hops': hops.reshape(shape),
+                'transfers': transfers.reshape(shape)}
+
+    def state(self, u):
+        """
+        Return the (station name, line name) of state id u.
+        """
+        return self.station_names[self.state_station[u]], self.line_names[self.state_line[u]]
+
+    def _states_of(self, station):
+        return self.station_state_ids[self.station_state_ptr[station]:self.station_state_ptr[station + 1]].tolist()
+
+    def _heuristic(self, goal):
+        # Lower bound on the remaining time from every station to goal, in one vectorized pass
+        distance_km = haversine_km_array(self._lat, self._lon, self._lat[goal], self._lon[goal])
+        return (distance_km * self._seconds_per_km)[self.state_station].tolist()
+
+    def search(self, start, end):
+        """
+        Find the least-time path between two stations.
+
+        Returns:
+            tuple: (travel time in seconds, list of state ids along the path)
+
+        Raises:
+            KeyError: If either station is unknown
+            ValueError: If end is unreachable from start
+        """
+        start_station = self.station_id[start]
+        end_station = self.station_id[end]
+        sources = self._states_of(start_station)
+        targets = set(self._states_of(end_station))
+        heuristic = self._heuristic(end_station)
+        indptr, indices, weights = self._indptr_view, self._indices_view, self._weights_view
+
+        best = {u: 0.0 for u in sources}
+        previous = {}
+        heap = [(heuristic[u], 0.0, u) for u in sources]
+        heapq.heapify(heap)
+
+        while heap:
+            _, cost, u = heapq.heappop(heap)
+            if cost > best.get(u, math.inf):
+                continue
+            if u in targets:
+                path = [u]
+                while path[-1] in previous:
+                    path.append(previous[path[-1]])
+                path.reverse()
+                return cost, path
+            lo, hi = indptr[u], indptr[u + 1]
+            for v, weight in zip(indices[lo:hi], weights[lo:hi]):
+                new_cost = cost + weight
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    previous[v] = u
+                    heapq.heappush(heap, (new_cost + heuristic[v], new_cost, v))
+
+        raise ValueError(f"No route from {start} to {end}")
+
+    def route(self, start, end):
+        """
+        Find the least-time route between two stations in the format of
+        find_route_with_changes(): one dict per station with its line, and
+        transfer stations listed once per line with is_transfer set.
+        """
+        return self.timed_route(start, end)[1]
+
+    def timed_route(self, start, end):
+        """
+        Find the least-time route between two stations, with its travel time.
+
+        Returns:
+            tuple: (travel time in seconds, route in the format of route())
+
+        Raises:
+            KeyError: If either station is unknown
+            ValueError: If end is unreachable from start
+        """
+        seconds, path = self.search(start, end)
+        return seconds, self._route_from_path(path)
+
+    def _route_from_path(self, path):
+        states = [self.state(u) for u in path]
+        route_with_changes = []
+
+        for i, (station, line) in enumerate(states):
+            next_state = states[i + 1] if i + 1 < len(states) else None
+            previous_state = states[i - 1] if i > 0 else None
+
+            if next_state is not None and next_state[0] == station:
+                # Arriving on this line and changing to the next one
+                route_with_changes.append({
+                    'station': station,
+                    'line': line,
+                    'is_transfer': True,
+                    'transfer_to': next_state[1]
+                })
+            elif previous_state is not None and previous_state[0] == station:
+                # Departing on the new line after a transfer
+                route_with_changes.append({
+                    'station': station,
+                    'line': line,
+                    'is_transfer': True,
+                    'transfer_to': None  # Already transferred
+                })
+            else:
+                route_with_changes.append({
+                    'station': station,
+                    'line': line,
+                    'is_transfer': False,
+                    'transfer_to': None
+                })
+
+        return route_with_changes
+
+
+class RouteTable:
+    """
+    The least-time route between every pair of stations of a RoutingEngine,
+    without storing the routes themselves.
+
+    One multi-source Dijkstra per origin station gives its shortest-path
+    tree over states. Only the tree's predecessor array (int32 per state),
+    the fastest state of every destination station and the travel times are
+    kept; a route is rebuilt by walking the tree back from its destination
+    when asked for. Memory is O(stations x states) in a few flat arrays.
+    """
+
+    def __init__(self, engine):
+        from scipy.sparse.csgraph import dijkstra
+
+        self.engine = engine
+        num_stations = len(engine.station_names)
+        num_states = engine.num_states
+        self.predecessors = np.full((num_stations, num_states), -1, dtype=np.int32)
+        self.destination_states = np.full((num_stations, num_stations), -1, dtype=np.int32)
+        self.seconds = np.full((num_stations, num_stations), np.inf)
+        if num_states == 0:
+            return
+
+        graph, _ = engine._scipy_graph()
+        group_sizes = np.diff(engine.station_state_ptr)
+        served = np.flatnonzero(group_sizes > 0)
+        group_starts = engine.station_state_ptr[served]
+        for station in served.tolist():
+            seconds, predecessors = dijkstra(graph, directed=True, indices=engine._states_of(station),
+                                             min_only=True, return_predecessors=True)[:2]
+            self.predecessors[station] = np.maximum(predecessors, -1)
+
+            # The fastest state of each destination station, the first of them on ties
+            grouped = seconds[engine.station_state_ids]
+            fastest = np.minimum.reduceat(grouped, group_starts)
+            positions = np.where(grouped == np.repeat(fastest, group_sizes[served]),
+                                 np.arange(num_states), num_states)
+            best = engine.station_state_ids[np.minimum.reduceat(positions, group_starts)]
+            reachable = np.isfinite(fastest)
+            self.destination_states[station, served[reachable]] = best[reachable]
+            self.seconds[station, served[reachable]] = fastest[reachable]
+
+    @property
+    def nbytes(self):
+        return self.predecessors.nbytes + self.destination_states.nbytes + self.seconds.nbytes
+
+    def timed_route(self, start, end):
+        """
+        The route between two stations and its travel time, as
+        RoutingEngine.timed_route() returns them.
+
+        Raises:
+            KeyError: If either station is unknown
+            ValueError: If end is unreachable from start
+        """
+        origin = self.engine.station_id[start]
+        state = int(self.destination_states[origin, self.engine.station_id[end]])
+        if state < 0:
+            raise ValueError(f"No route from {start} to {end}")
+
+        predecessors = self.predecessors[origin]
+        path = [state]
+        while predecessors[path[-1]] >= 0:
+            path.append(int(predecessors[path[-1]]))
+        path.reverse()
+        return float(self.seconds[origin, self.engine.station_id[end]]), self.engine._route_from_path(path)
@@ -0,0 +1,109 @@
+from simplify import SIMPLIFY_TOLERANCES_M, max_deviation_m, simplification_ranks
+
+
+class LineSegmentTable:
+    """
+    Precomputed geometry between stations for one KML line.
+
+    Every station is snapped to its nearest vertex on the line once, and the
+    vertex slice for each pair of adjacent stations on the line is stored, so
+    drawing a leg is a lookup plus an array view with no distance computations.
+
+    The line is also simplified once at each of SIMPLIFY_TOLERANCES_M, with
+    the station vertices pinned, so a simplified station-to-station slice
+    still starts and ends at its stations and stays within the tolerance of
+    the full geometry. max_deviation_m records the measured bound per level.
+    """
+
+    def __init__(self, coords, vertex_index, station_coords, line_stations):
+        """
+        Args:
+            coords (np.ndarray): (N, 2) array of (lat, lon) vertices of the line
+            vertex_index (VertexIndex): Spatial index over coords
+            station_coords (dict): Station name -> (lat, lon) for every station to snap
+            line_stations (list): The stations served by this line, in order
+        """
+        names = list(station_coords)
+        snapped = vertex_index.nearest_batch([station_coords[name] for name in names])
+
+        self.coords = coords
+        self.vertex_of = dict(zip(names, snapped.tolist()))
+
+        # Slice bounds for each adjacent pair, in both travel directions
+        self.pairs = {}
+        for a, b in zip(line_stations, line_stations[1:]):
+            self.pairs[(a, b)] = self._bounds(a, b)
+            self.pairs[(b, a)] = self._bounds(b, a)
+
+        # Simplification levels: a keep mask and the simplified line for each tolerance
+        ranks = simplification_ranks(coords, pinned=[self.vertex_of[station] for station in line_stations])
+        self.levels = {}
+        self.simplified = {}
+        self.max_deviation_m = {}
+        for tolerance in SIMPLIFY_TOLERANCES_M:
+            if tolerance <= 0:
+                continue
+            keep = ranks > tolerance
+            keep.setflags(write=False)
+            simplified = coords[keep]
+            simplified.setflags(write=False)
+            self.levels[tolerance] = keep
+            self.simplified[tolerance] = simplified
+            self.max_deviation_m[tolerance] = max_deviation_m(coords, keep)
+
+    def _bounds(self, start_station, end_station):
+        start_index = self.vertex_of[start_station]
+        end_index = self.vertex_of[end_station]
+        if start_index <= end_index:
+            return start_index, end_index, False
+        # The route goes backwards in the KML
+        return end_index, start_index, True
+
+    def line(self, tolerance=0.0):
+        """
+        Return the whole line, simplified to one of SIMPLIFY_TOLERANCES_M.
+        """
+        if tolerance <= 0:
+            return self.coords
+        return self.simplified[tolerance]
+
+    def segment(self, start_station, end_station, tolerance=0.0):
+        """
+        Return the vertices from start_station to end_station as a read-only
+        view into the line's coordinate array, or at a tolerance from
+        SIMPLIFY_TOLERANCES_M, only the vertices kept at that level.
+        """
+        bounds = self.pairs.get((start_station, end_station))
+        if bounds is None:
+            # Not adjacent on this line, but both ends are still pre-snapped
+            bounds = self._bounds(start_station, end_station)
+
+        lo, hi, reverse = bounds
+        view = self.coords[lo:hi + 1]
+        if tolerance > 0:
+            keep = self.levels[tolerance][lo:hi + 1]
+            if not (keep[0] and keep[-1]):
+                # Ends of a pair that is not adjacent on the line need not be pinned
+                keep = keep.copy()
+                keep[0] = keep[-1] = True
+            view = view[keep]
+        return view[::-1] if reverse else view
+
+
+def build_segment_tables(kml_geometry, line_stations, station_coords):
+    """
+    Build a LineSegmentTable for every KML line in line_stations
+    (KML line name -> ordered station list) that exists in the geometry store.
+    """
+    tables = {}
+    for kml_name, stations in line_stations.items():
+        coords = kml_geometry.get(kml_name)
+        if coords is None or len(coords) == 0:
+            continue
+        tables[kml_name] = LineSegmentTable(
+            coords,
+            kml_geometry.vertex_index(kml_name),
+            station_coords,
+            stations
+        )
+    return tables
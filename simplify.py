@@ -0,0 +1,131 @@
+import math
+
+import numpy as np
+
+from routing_engine import EARTH_RADIUS_KM
+
+# Precomputed simplification levels, as the maximum deviation from the KML line in metres.
+# 0 keeps every vertex.
+SIMPLIFY_TOLERANCES_M = (0.0, 2.0, 5.0, 10.0, 25.0, 50.0)
+
+# Web Mercator ground resolution at the equator, zoom 0, in metres per 256 px tile pixel
+_METRES_PER_PIXEL_Z0 = 2 * math.pi * EARTH_RADIUS_KM * 1000.0 / 256
+
+
+def project_m(coords):
+    """
+    Project (lat, lon) rows onto a local plane in metres (equirectangular
+    around the mean latitude), accurate to well under 1% across a city.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) == 0:
+        return np.empty((0, 2))
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    scale = EARTH_RADIUS_KM * 1000.0
+    return np.column_stack((lon * math.cos(lat.mean()) * scale, lat * scale))
+
+
+def _segment_distances(points, start, end):
+    # Distance from each point to the segment start-end (all in projected metres)
+    direction = end - start
+    length2 = direction @ direction
+    if length2 == 0.0:
+        return np.hypot(*(points - start).T)
+    t = np.clip((points - start) @ direction / length2, 0.0, 1.0)
+    return np.hypot(*(points - start - t[:, None] * direction).T)
+
+
+def simplification_ranks(coords, pinned=()):
+    """
+    Douglas-Peucker ranks for every vertex of a polyline: the vertex is kept
+    by a simplification with tolerance t exactly when its rank is above t.
+
+    One Douglas-Peucker pass records, for each vertex, its distance from the
+    segment it split, capped by the rank of the vertex that split before it
+    (a vertex is only reached if its parent was kept). Thresholding the ranks
+    is then the same as running Douglas-Peucker at that tolerance, so every
+    level comes from a single pass. The ends and the pinned vertices are
+    always kept, and the line is simplified between them independently.
+
+    Args:
+        coords (np.ndarray): (N, 2) array of (lat, lon) vertices
+        pinned (iterable): Vertex indices to keep at every tolerance
+
+    Returns:
+        np.ndarray: Ranks in metres, inf for the ends and pinned vertices
+    """
+    points = project_m(coords)
+    ranks = np.zeros(len(points))
+    if len(points) == 0:
+        return ranks
+    anchors = sorted({0, len(points) - 1} | {int(i) for i in pinned})
+    ranks[anchors] = np.inf
+
+    stack = [(a, b, np.inf) for a, b in zip(anchors, anchors[1:])]
+    while stack:
+        a, b, cap = stack.pop()
+        if b - a < 2:
+            continue
+        distances = _segment_distances(points[a + 1:b], points[a], points[b])
+        split = a + 1 + int(np.argmax(distances))
+        rank = min(float(distances[split - a - 1]), cap)
+        ranks[split] = rank
+        stack.append((a, split, rank))
+        stack.append((split, b, rank))
+    return ranks
+
+
+def max_deviation_m(coords, keep):
+    """
+    Largest distance in metres from a dropped vertex to the simplified line,
+    i.e. to the segment between the kept vertices on either side of it.
+
+    Args:
+        coords (np.ndarray): (N, 2) array of (lat, lon) vertices
+        keep (np.ndarray): Boolean mask of the kept vertices, including both ends
+    """
+    points = project_m(coords)
+    kept = np.flatnonzero(keep)
+    dropped = np.flatnonzero(~np.asarray(keep, dtype=bool))
+    if len(dropped) == 0:
+        return 0.0
+    after = kept[np.searchsorted(kept, dropped)]
+    before = kept[np.searchsorted(kept, dropped) - 1]
+    start, end = points[before], points[after]
+    direction = end - start
+    length2 = np.einsum('ij,ij->i', direction, direction)
+    t = np.einsum('ij,ij->i', points[dropped] - start, direction) / np.where(length2 > 0, length2, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    return float(np.hypot(*(points[dropped] - start - t[:, None] * direction).T).max())
+
+
+def metres_per_pixel(zoom, latitude):
+    """
+    Web Mercator ground resolution at a zoom level and latitude (degrees).
+    """
+    return _METRES_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def zoom_for_bounds(bounds, width_px=1024, height_px=768):
+    """
+    The zoom level at which bounds [[south, west], [north, east]] fit into a
+    viewport of the given size, as Leaflet's fit_bounds picks it.
+    """
+    (south, west), (north, east) = bounds
+    lon_span = max(east - west, 1e-9)
+    y_south = math.log(math.tan(math.pi / 4 + math.radians(south) / 2))
+    y_north = math.log(math.tan(math.pi / 4 + math.radians(north) / 2))
+    y_span = max(y_north - y_south, 1e-9)
+    zoom_x = math.log2(width_px * 360.0 / (256 * lon_span))
+    zoom_y = math.log2(height_px * 2 * math.pi / (256 * y_span))
+    return max(0, min(18, int(math.floor(min(zoom_x, zoom_y)))))
+
+
+def tolerance_for_zoom(zoom, latitude):
+    """
+    The coarsest precomputed tolerance whose deviation stays within half a
+    pixel at this zoom level, so simplification is invisible when rendered.
+    """
+    budget = metres_per_pixel(zoom, latitude) / 2
+    return max(t for t in SIMPLIFY_TOLERANCES_M if t <= budget)
@@ -0,0 +1,106 @@
+import numpy as np
+
+from routing_engine import haversine_km_array
+
+
+class VertexIndex:
+    """
+    KD-tree over the vertices of a polyline, stored as an (N, 2) array of
+    (lat, lon) rows.
+
+    Distances are plain Euclidean in degrees, the same metric the original
+    linear scan used, which is good enough for snapping to the nearest vertex.
+    """
+
+    def __init__(self, coords):
+        # scipy is only imported when the first index is built, not at startup
+        from scipy.spatial import cKDTree
+
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self._tree = cKDTree(self.coords)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def nearest(self, point):
+        """
+        Return the index of the vertex closest to point (lat, lon).
+        """
+        _, index = self._tree.query(point)
+        return int(index)
+
+    def nearest_batch(self, points):
+        """
+        Return an int array with the index of the closest vertex for every
+        (lat, lon) row in points, answered in a single vectorized query.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            return np.empty(0, dtype=np.intp)
+        _, indices = self._tree.query(points)
+        return np.asarray(indices, dtype=np.intp)
+
+
+def nearest_vertex_scan(coords, point):
+    """
+    Vectorized linear scan for the closest vertex, for coordinate lists that
+    have no index. Ties resolve to the first vertex, like the original loop.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) == 0:
+        return 0
+    deltas = coords - np.asarray(point, dtype=np.float64)
+    return int(np.argmin(np.einsum('ij,ij->i', deltas, deltas)))
+
+
+class StationIndex:
+    """
+    Nearest-station lookups by (lat, lon), exact under great-circle distance.
+
+    Stations are stored as points on the unit sphere in a KD-tree. The
+    straight-line (chord) distance between two such points grows with their
+    great-circle distance, so the tree's k nearest are the k nearest on the
+    globe; their distances are then computed with vectorized haversine.
+    """
+
+    def __init__(self, names, coords):
+        """
+        Args:
+            names (list): Station names
+            coords (list): (lat, lon) of each station, in degrees
+        """
+        from scipy.spatial import cKDTree
+
+        self.names = list(names)
+        coords = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+        self._lat, self._lon = coords[:, 0], coords[:, 1]
+        self._tree = cKDTree(_unit_vectors(self._lat, self._lon))
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, points, k=1):
+        """
+        Find the k stations closest to every point.
+
+        Args:
+            points: (lat, lon) rows in degrees, any array-like of shape (n, 2)
+            k (int): Stations per point, at most len(self)
+
+        Returns:
+            tuple: (indices, distances_km), both of shape (n, k), nearest first
+        """
+        points = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        k = min(k, len(self.names))
+        if len(points) == 0 or k <= 0:
+            return np.empty((len(points), 0), dtype=np.intp), np.empty((len(points), 0))
+        lat, lon = points[:, :1], points[:, 1:]
+        _, indices = self._tree.query(_unit_vectors(lat[:, 0], lon[:, 0]), k=k)
+        indices = np.asarray(indices, dtype=np.intp).reshape(len(points), k)
+        distances = haversine_km_array(lat, lon, self._lat[indices], self._lon[indices])
+        return indices, distances
+
+
+def _unit_vectors(lat, lon):
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+import pickle
+
+# Bump whenever the pickled structures change shape
+ARTIFACT_FORMAT = 5
+
+
+def network_fingerprint(kml_digest, lines, station_coords, params):
+    """
+    Key identifying one build of the network: the KML content, the line
+    definitions, the station coordinates and the routing parameters.
+    """
+    definition = json.dumps({
+        'format': ARTIFACT_FORMAT,
+        'kml': kml_digest,
+        'lines': lines,
+        'stations': station_coords,
+        'params': params,
+    }, sort_keys=True)
+    return hashlib.sha256(definition.encode('utf-8')).hexdigest()[:32]
+
+
+def save_startup_artifact(path, fingerprint, payload):
+    """
+    Write payload (a dict of prebuilt structures) to path, tagged with its
+    network fingerprint. The file is replaced atomically.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary name first so a starting worker never reads a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'fingerprint': fingerprint, 'payload': payload}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_startup_artifact(path, fingerprint):
+    """
+    Return the payload stored at path, or None if there is no artifact, it
+    cannot be read, or it was built for a different network.
+
+    Artifacts are pickles - only point this at files this app wrote itself.
+    """
+    try:
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        return None
+    if not isinstance(artifact, dict) or artifact.get('fingerprint') != fingerprint:
+        return None
+    return artifact.get('payload')
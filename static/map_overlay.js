@@ -0,0 +1,69 @@
+// Draws the per-request overlay spliced into a cached base map document (see map_layers.py):
+// route legs, transfer and isochrone circles, station icons, and the bounds to open at.
+// The overlay is plain data, so the server only serializes JSON for each request.
+(function () {
+    function popupContent(popup) {
+        const div = document.createElement("div");
+        div.style.fontFamily = "Arial";
+        div.style.textAlign = "center";
+        const title = document.createElement("h4");
+        title.style.margin = "0";
+        title.textContent = popup.title;
+        div.appendChild(title);
+        (popup.lines || []).forEach(function (text) {
+            const p = document.createElement("p");
+            p.style.margin = "5px 0";
+            p.textContent = text;
+            div.appendChild(p);
+        });
+        if (popup.note) {
+            const note = document.createElement("p");
+            note.style.color = "#ff6b6b";
+            note.textContent = popup.note;
+            div.appendChild(note);
+        }
+        return div;
+    }
+
+    function drawMapOverlay(map, overlay) {
+        if (!overlay) return;
+
+        (overlay.lines || []).forEach(function (line) {
+            const polyline = L.polyline(line.coords, {
+                color: line.color,
+                weight: line.weight || 5,
+                opacity: line.opacity === undefined ? 1.0 : line.opacity
+            }).addTo(map);
+            if (line.tooltip) polyline.bindTooltip(line.tooltip);
+        });
+
+        (overlay.circles || []).forEach(function (circle) {
+            const marker = L.circleMarker(circle.coord, {
+                radius: circle.radius,
+                color: circle.color,
+                fill: circle.fillColor !== null,
+                fillColor: circle.fillColor,
+                fillOpacity: circle.fillOpacity === undefined ? 0.8 : circle.fillOpacity,
+                weight: 2,
+                opacity: circle.opacity === undefined ? 1.0 : circle.opacity
+            }).addTo(map);
+            if (circle.tooltip) marker.bindTooltip(circle.tooltip);
+        });
+
+        (overlay.markers || []).forEach(function (station) {
+            const icon = document.createElement("div");
+            icon.style.fontSize = "15px";
+            icon.style.textAlign = "center";
+            icon.textContent = station.icon;
+            const marker = L.marker(station.coord, {
+                icon: L.divIcon({html: icon, className: "", iconSize: [20, 20], iconAnchor: [10, 10]})
+            }).addTo(map);
+            marker.bindTooltip(station.name);
+            if (station.popup) marker.bindPopup(popupContent(station.popup), {maxWidth: 200});
+        });
+
+        if (overlay.bounds) map.fitBounds(overlay.bounds);
+    }
+
+    window.drawMapOverlay = drawMapOverlay;
+})();
@@ -0,0 +1,107 @@
+// Draws the metro network from the server's GeoJSON tiles (/tiles/network/<version>/{z}/{x}/{y}.geojson)
+// instead of polylines inlined into every page. Tiles are immutable, so the browser caches them
+// across pages; only the tiles covering the view are fetched, and zooms past maxZoom reuse maxZoom tiles.
+(function () {
+    function networkTileLayer(urlTemplate, options) {
+        options = options || {};
+        const minZoom = options.minZoom || 0;
+        const maxZoom = options.maxZoom || 18;
+        const lineIds = options.lines || null;  // Only draw these line ids, or every line
+        const showStations = !!options.stations;
+        const weight = options.weight || 4;
+        const opacity = options.opacity === undefined ? 1.0 : options.opacity;
+
+        const layer = L.layerGroup();
+        const tiles = {};  // "z/x/y" -> L.GeoJSON, once loaded
+        let wantedNow = {};  // Tiles covering the current view
+        let map = null;
+
+        function tileLayer(data) {
+            return L.geoJSON(data, {
+                pane: "network",
+                filter: function (feature) {
+                    const p = feature.properties;
+                    if (p.kind === "station") {
+                        return showStations && (!lineIds || p.lines.some(function (id) {
+                            return lineIds.indexOf(id) !== -1;
+                        }));
+                    }
+                    return !lineIds || lineIds.indexOf(p.id) !== -1;
+                },
+                style: function (feature) {
+                    return {color: feature.properties.color, weight: weight, opacity: opacity};
+                },
+                pointToLayer: function (feature, latlng) {
+                    const p = feature.properties;
+                    return L.circleMarker(latlng, {
+                        pane: "network",
+                        radius: p.transfer ? 6 : 4,
+                        color: p.transfer ? "#ff6b6b" : p.color,
+                        fillColor: p.color,
+                        fillOpacity: 1,
+                        weight: 2
+                    });
+                },
+                onEachFeature: function (feature, featureLayer) {
+                    const p = feature.properties;
+                    featureLayer.bindTooltip(p.kind === "station" ? p.name : p.line);
+                }
+            });
+        }
+
+        function update() {
+            const zoom = Math.max(minZoom, Math.min(maxZoom, Math.round(map.getZoom())));
+            const bounds = map.getBounds();
+            const topLeft = map.project(bounds.getNorthWest(), zoom).divideBy(256).floor();
+            const bottomRight = map.project(bounds.getSouthEast(), zoom).divideBy(256).floor();
+            const limit = Math.pow(2, zoom);
+            const wanted = {};
+
+            for (let x = Math.max(0, topLeft.x); x <= Math.min(limit - 1, bottomRight.x); x++) {
+                for (let y = Math.max(0, topLeft.y); y <= Math.min(limit - 1, bottomRight.y); y++) {
+                    const key = zoom + "/" + x + "/" + y;
+                    wanted[key] = true;
+                    if (key in tiles) {
+                        if (tiles[key] && !layer.hasLayer(tiles[key])) layer.addLayer(tiles[key]);
+                        continue;
+                    }
+                    tiles[key] = null;  // Loading
+                    fetch(urlTemplate.replace("{z}", zoom).replace("{x}", x).replace("{y}", y))
+                        .then(function (response) {
+                            if (!response.ok) throw new Error("Tile request failed");
+                            return response.json();
+                        })
+                        .then(function (data) {
+                            tiles[key] = tileLayer(data);
+                            if (wantedNow[key]) layer.addLayer(tiles[key]);
+                        })
+                        .catch(function () {
+                            delete tiles[key];  // Retried on the next move
+                        });
+                }
+            }
+
+            // Hide tiles of other zoom levels or out of view; they stay loaded for later
+            Object.keys(tiles).forEach(function (key) {
+                if (!wanted[key] && tiles[key] && layer.hasLayer(tiles[key])) layer.removeLayer(tiles[key]);
+            });
+            wantedNow = wanted;
+        }
+
+        layer.on("add", function () {
+            map = layer._map;
+            if (!map.getPane("network")) {
+                // Below the overlay pane, so routes and markers stay on top of tiles that load late
+                map.createPane("network").style.zIndex = 350;
+            }
+            map.on("moveend", update);
+            update();
+        });
+        layer.on("remove", function () {
+            if (map) map.off("moveend", update);
+        });
+        return layer;
+    }
+
+    window.networkTileLayer = networkTileLayer;
+})();
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import re
+from collections import namedtuple
+from types import MappingProxyType
+
+# One station as shown in lists and dropdowns: lines serving it in display order (their
+# ids alongside), the first of them as its primary line, its position in the catalog and
+# the other names it is searched by
+Station = namedtuple('Station', ['index', 'name', 'lat', 'lon', 'lines', 'line_ids', 'primary_line',
+                                 'emoji', 'color', 'corridor', 'is_transfer', 'sort_key', 'aliases'])
+
+
+def station_sort_key(name):
+    """
+    Case-insensitive natural sort key, so "Sector 9" sorts before "Sector 10".
+    """
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part)
+                 for part in re.split(r'(\d+)', name.casefold()) if part)
+
+
+class StationCatalog:
+    """
+    Every station of a MetroNetwork, built once and never modified: line
+    membership, transfer flags, coordinates, aliases and sort keys, in a stable
+    alphabetical order that all pages and APIs share.
+
+    version is a digest of the contents, for ETags.
+    """
+
+    def __init__(self, network):
+        line_positions = {name: position for position, name in enumerate(network.lines, start=1)}
+        entries = []
+        for name, (lat, lon) in network.station_coords.items():
+            lines = network.lines_of(name)
+            primary = network.lines[lines[0]] if lines else None
+            entries.append((station_sort_key(name), name, lat, lon, lines, primary))
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+
+        self.stations = tuple(
+            Station(
+                index=index,
+                name=name,
+                lat=lat,
+                lon=lon,
+                lines=lines,
+                line_ids=tuple(network.lines[line].id for line in lines),
+                primary_line=primary.name if primary else None,
+                emoji=primary.emoji if primary else '🚇',
+                color=primary.color if primary else '#3388ff',
+                corridor=line_positions[primary.name] if primary else None,
+                is_transfer=name in network.transfer_stations,
+                sort_key=sort_key,
+                aliases=network.aliases.get(name, ())
+            )
+            for index, (sort_key, name, lat, lon, lines, primary) in enumerate(entries)
+        )
+        self.names = tuple(station.name for station in self.stations)
+        self.by_name = MappingProxyType({station.name: station for station in self.stations})
+        self.json = json.dumps({'stations': [self._as_dict(station) for station in self.stations]},
+                               separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        self.version = hashlib.sha1(self.json).hexdigest()[:16]
+
+    @staticmethod
+    def _as_dict(station):
+        return {
+            'name': station.name,
+            'lat': station.lat,
+            'lon': station.lon,
+            'lines': list(station.lines),
+            'line_ids': list(station.line_ids),
+            'transfer': station.is_transfer,
+            'aliases': list(station.aliases),
+        }
+
+    def get(self, name):
+        """
+        Return the Station called name, or None.
+        """
+        return self.by_name.get(name)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __iter__(self):
+        return iter(self.stations)
+
+    def __len__(self):
+        return len(self.stations)
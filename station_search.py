@@ -0,0 +1,178 @@
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+
+# Abbreviations common in station names, expanded in names, aliases and queries alike,
+# so "Railway Stn" finds "Surat Railway Station"
+ABBREVIATIONS = {
+    'stn': 'station',
+    'rly': 'railway',
+    'rd': 'road',
+    'jn': 'junction',
+    'jct': 'junction',
+    'chk': 'chowk',
+    'mkt': 'market',
+    'hosp': 'hospital',
+    'ngr': 'nagar',
+}
+
+# Match kinds, best first: the whole name, the start of the name, the start of a later word,
+# or enough shared trigrams to be a likely misspelling
+MATCH_EXACT, MATCH_PREFIX, MATCH_WORD, MATCH_FUZZY = range(4)
+MATCH_KINDS = ('exact', 'prefix', 'word', 'fuzzy')
+
+# Prefixes up to this long have their best matches precomputed; longer ones are rare enough
+# to scan in the sorted keys
+SHORT_PREFIX_LENGTH = 3
+# Share of the query's trigrams a station needs for a fuzzy match, and the shortest query
+# worth matching fuzzily
+FUZZY_MIN_SCORE = 0.55
+FUZZY_MIN_LENGTH = 4
+
+SearchMatch = namedtuple('SearchMatch', ['station', 'match', 'alias', 'score'])
+
+_separators = re.compile(r'[^\w]+')
+
+
+def normalize(text):
+    """
+    Case-fold, drop punctuation and expand abbreviations:
+    "Surat Rly. Stn" -> "surat railway station".
+    """
+    words = _separators.sub(' ', text.casefold()).split()
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def trigrams(text):
+    # Padded so the start of each word weighs more than its middle
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class StationSearchIndex:
+    """
+    Ranked typeahead search over station names and aliases.
+
+    Prefix matches come from a trie flattened into one sorted array of keys:
+    every name and alias, and every suffix of them that starts a word, so
+    "gate" finds "Majura Gate". A prefix query is a bisect for the range of
+    keys starting with it. The widest ranges, for queries of up to
+    SHORT_PREFIX_LENGTH characters, have their best matches precomputed.
+    Misspellings fall back to a trigram index: the stations sharing most of
+    the query's trigrams, counted with one bincount over the posting lists.
+
+    Results are ranked by match kind (exact, name prefix, word prefix,
+    fuzzy), fuzzy matches by score, then by station order.
+    """
+
+    def __init__(self, stations, max_limit=50):
+        """
+        Args:
+            stations (list): (name, aliases) pairs in the order ties are ranked by
+            max_limit (int): Most matches a search can return
+        """
+        self.names = []
+        self.max_limit = max_limit
+        self._exact = {}
+        keys = []
+        station_trigrams = []
+        for station_id, (name, aliases) in enumerate(stations):
+            self.names.append(name)
+            grams = set()
+            for alias in (None,) + tuple(aliases):
+                text = normalize(alias if alias is not None else name)
+                if not text:
+                    continue
+                grams |= trigrams(text)
+                self._exact.setdefault(text, []).append((station_id, alias))
+                for offset in [0] + [m.end() for m in re.finditer(' ', text)]:
+                    kind = MATCH_PREFIX if offset == 0 else MATCH_WORD
+                    keys.append((text[offset:], kind, station_id, alias))
+            station_trigrams.append(grams)
+
+        keys.sort(key=lambda key: key[:3])
+        self._keys = [key[0] for key in keys]
+        self._entries = [key[1:] for key in keys]
+
+        self._short = {}
+        for key, entry in zip(self._keys, self._entries):
+            for length in range(1, min(len(key), SHORT_PREFIX_LENGTH) + 1):
+                self._short.setdefault(key[:length], []).append(entry)
+        for prefix, entries in self._short.items():
+            self._short[prefix] = self._best(entries, max_limit)
+
+        # Trigram postings as CSR arrays: the stations of trigram t are
+        # _trigram_stations[_trigram_ptr[t]:_trigram_ptr[t + 1]]
+        self._trigram_ids = {}
+        postings = []
+        for station_id, grams in enumerate(station_trigrams):
+            for gram in grams:
+                gram_id = self._trigram_ids.setdefault(gram, len(self._trigram_ids))
+                postings.append((gram_id, station_id))
+        postings = np.array(sorted(postings), dtype=np.int32).reshape(-1, 2)
+        self._trigram_ptr = np.searchsorted(postings[:, 0], np.arange(len(self._trigram_ids) + 1)).astype(np.int32)
+        self._trigram_stations = np.ascontiguousarray(postings[:, 1])
+
+    @staticmethod
+    def _best(entries, limit):
+        # The best entry of each station, best stations first
+        best = {}
+        for kind, station_id, alias in sorted(entries, key=lambda entry: entry[:2]):
+            if station_id not in best:
+                best[station_id] = (kind, station_id, alias)
+                if len(best) == limit:
+                    break
+        return list(best.values())
+
+    def search(self, query, limit=10):
+        """
+        Return up to limit SearchMatch tuples for query, best first.
+        """
+        text = normalize(query)
+        limit = min(limit, self.max_limit)
+        if not text or limit < 1:
+            return []
+
+        found = {}
+        for station_id, alias in self._exact.get(text, ()):
+            found.setdefault(station_id, SearchMatch(self.names[station_id], MATCH_KINDS[MATCH_EXACT], alias, 1.0))
+
+        if len(text) <= SHORT_PREFIX_LENGTH:
+            candidates = self._short.get(text, ())
+        else:
+            start = bisect_left(self._keys, text)
+            end = bisect_left(self._keys, text + '\uffff', start)
+            candidates = self._best(self._entries[start:end], limit + len(found))
+        for kind, station_id, alias in candidates:
+            if len(found) >= limit:
+                break
+            if station_id not in found:
+                found[station_id] = SearchMatch(self.names[station_id], MATCH_KINDS[kind], alias, 1.0)
+
+        if len(found) < limit and len(text) >= FUZZY_MIN_LENGTH:
+            for station_id, score in self._fuzzy(text, limit + len(found)):
+                if len(found) >= limit:
+                    break
+                if station_id not in found:
+                    found[station_id] = SearchMatch(self.names[station_id], MATCH_KINDS[MATCH_FUZZY], None, score)
+        return list(found.values())
+
+    def _fuzzy(self, text, limit):
+        query_grams = trigrams(text)
+        gram_ids = [self._trigram_ids[gram] for gram in query_grams if gram in self._trigram_ids]
+        if not gram_ids:
+            return []
+        stations = np.concatenate([self._trigram_stations[self._trigram_ptr[g]:self._trigram_ptr[g + 1]]
+                                   for g in gram_ids])
+        shared = np.bincount(stations, minlength=len(self.names))
+        matches = np.flatnonzero(shared >= FUZZY_MIN_SCORE * len(query_grams))
+        # Most shared trigrams first, then station order, as one integer rank
+        rank = (len(query_grams) - shared[matches]).astype(np.int64) * len(self.names) + matches
+        if len(matches) > limit:
+            keep = np.argpartition(rank, limit - 1)[:limit]
+            matches, rank = matches[keep], rank[keep]
+        matches = matches[np.argsort(rank)]
+        return [(station_id, round(float(shared[station_id]) / len(query_grams), 3))
+                for station_id in matches.tolist()]
@@ -0,0 +1,69 @@
+import io
+import json
+
+import pytest
+
+import batch_routing
+from batch_routing import ElementTooLarge, iter_pairs, stream_routes
+
+
+class CountingStream(io.BytesIO):
+    """
+    A request body handing out small chunks and counting the bytes read.
+    """
+
+    def __init__(self, body, chunk_size):
+        super().__init__(body)
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(min(size, self.chunk_size) if size >= 0 else self.chunk_size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(batch_routing, 'CHUNK_SIZE', 7)
+
+
+def test_array_elements_split_across_chunks(small_chunks):
+    pairs = [{'id': i, 'start': f'Station {i}', 'end': 'Terminus'} for i in range(20)] + [['A', 'B'], [1.25, -3e5]]
+    stream = CountingStream(json.dumps(pairs).encode('utf-8'), 7)
+    assert list(iter_pairs(stream, 'application/json')) == (
+        [(i, f'Station {i}', 'Terminus') for i in range(20)] + [(None, 'A', 'B'), (None, 1.25, -3e5)])
+
+
+def test_malformed_element_stops_reading(small_chunks):
+    body = b'[["A", "B"], ["A" "B"], ' + b'["C", "D"], ' * 1000 + b']'
+    stream = CountingStream(body, 7)
+    pairs = iter_pairs(stream, 'application/json')
+    assert next(pairs) == (None, 'A', 'B')
+    with pytest.raises(ValueError):
+        next(pairs)
+    # Read up to the bad element and at most a chunk past it, not the rest of the body
+    assert stream.bytes_read < 40
+
+
+def test_ndjson_line_without_newline_is_capped(small_chunks, monkeypatch):
+    monkeypatch.setattr(batch_routing, 'MAX_ELEMENT_SIZE', 64)
+    body = b'{"start": "A", "end": "B"}\n' + b' ' * 10000
+    stream = CountingStream(body, 7)
+    pairs = iter_pairs(stream, 'application/x-ndjson')
+    assert next(pairs) == (None, 'A', 'B')
+    with pytest.raises(ElementTooLarge):
+        next(pairs)
+    # Stopped once the unfinished line passed the cap, not at the end of the body
+    assert stream.bytes_read < 100
+
+
+def test_stream_routes_reports_malformed_body_in_band():
+    def solve(start, end):
+        return {'start': start, 'end': end}
+
+    body = io.BytesIO(b'{"start": "A", "end": "B"}\n{"start": \n{"start": "C", "end": "D"}\n')
+    lines = [json.loads(line) for line in stream_routes(iter_pairs(body, 'application/x-ndjson'), solve)]
+    assert lines[0] == {'start': 'A', 'end': 'B'}
+    assert lines[1]['error'].startswith('malformed request body')
+    assert len(lines) == 2
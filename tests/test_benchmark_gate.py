@@ -0,0 +1,35 @@
+import importlib.util
+import os
+
+RUN_BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks',
+                              'run_benchmarks.py')
+spec = importlib.util.spec_from_file_location('run_benchmarks', RUN_BENCHMARKS)
+run_benchmarks = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(run_benchmarks)
+
+
+def stats(p95_ms, spread_ms=0.0):
+    return {'p95_ms': p95_ms, 'spread_ms': {'p95_ms': spread_ms}}
+
+
+def regressions(previous, current):
+    return run_benchmarks.compare({'results': {'bench': current}}, {'results': {'bench': previous}},
+                                  'p95_ms', 0.25, 0.05)
+
+
+def test_microsecond_regression_is_caught():
+    assert regressions(stats(0.006), stats(1.8))
+
+
+def test_change_within_round_spread_passes():
+    # An endpoint swinging 0.3-0.7 ms between rounds
+    assert not regressions(stats(0.4, 0.4), stats(0.7, 0.3))
+    assert regressions(stats(0.4, 0.4), stats(1.5, 0.3))
+
+
+def test_median_stats_records_spread():
+    rounds = [dict.fromkeys(run_benchmarks.STATISTICS, value) | {'n': 10} for value in (1.0, 3.0, 2.0)]
+    combined = run_benchmarks.median_stats(rounds)
+    assert combined['p95_ms'] == 2.0
+    assert combined['spread_ms']['p95_ms'] == 2.0
+    assert combined['n'] == 10
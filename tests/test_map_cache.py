@@ -0,0 +1,85 @@
+import os
+import stat
+import time
+
+import pytest
+
+from map_cache import ByteLRUCache, MapArtifactStore
+
+
+def test_lru_evicts_least_recently_used_to_stay_within_byte_budget():
+    cache = ByteLRUCache(10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    assert cache.get('a') == b'aaaa'
+    cache.put('c', b'cccc')
+    # 'b' was used least recently; evicting it alone brings 12 bytes back to 8
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.stats()['bytes'] == 8
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_counts_bytes_not_entries():
+    cache = ByteLRUCache(10)
+    cache.put('big', b'x' * 9)
+    cache.put('small', b'y' * 2)
+    assert 'big' not in cache and len(cache) == 1
+    cache.put('small', b'z' * 10)
+    assert cache.get('small') == b'z' * 10
+    assert cache.stats()['bytes'] == 10
+
+
+def test_lru_never_caches_a_value_larger_than_the_budget():
+    cache = ByteLRUCache(10)
+    cache.put('a', b'aaaa')
+    cache.put('huge', b'h' * 11)
+    assert 'huge' not in cache and cache.get('a') == b'aaaa'
+    assert cache.stats()['evictions'] == 0
+
+
+def test_artifact_directory_is_private(tmp_path):
+    cache_dir = tmp_path / 'maps'
+    cache_dir.mkdir(mode=0o777)
+    os.chmod(cache_dir, 0o777)
+    MapArtifactStore(1024, str(cache_dir))
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_tampered_artifact_is_not_served(tmp_path):
+    writer = MapArtifactStore(1024, str(tmp_path))
+    digest = writer.publish(b'<html>map</html>')
+    with open(tmp_path / f'{digest}.html', 'wb') as f:
+        f.write(b'<script>alert(1)</script>')
+
+    # A worker that only has the file on disk
+    reader = MapArtifactStore(1024, str(tmp_path))
+    assert reader.get(digest) is None
+    assert reader.stats()['corrupt_reads'] == 1
+
+
+def test_artifact_from_another_worker_is_served(tmp_path):
+    digest = MapArtifactStore(1024, str(tmp_path)).publish(b'<html>map</html>')
+    assert MapArtifactStore(1024, str(tmp_path)).get(digest) == b'<html>map</html>'
+
+
+def test_disk_is_pruned_least_recently_used_first(tmp_path):
+    store = MapArtifactStore(1024, str(tmp_path), max_disk_bytes=250)
+    first = store.publish(b'a' * 100)
+    second = store.publish(b'b' * 100)
+    old = time.time() - 60
+    os.utime(tmp_path / f'{first}.html', (old - 1, old - 1))
+    os.utime(tmp_path / f'{second}.html', (old, old))
+    # Reading the older document from disk makes it the most recently used
+    MapArtifactStore(1024, str(tmp_path)).get(first)
+
+    third = store.publish(b'c' * 100)
+    assert sorted(os.listdir(tmp_path)) == sorted([f'{first}.html', f'{third}.html'])
+    assert store.stats()['disk_evictions'] == 1
+    assert store.stats()['disk_bytes'] == 200
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid') or os.getuid() != 0, reason='needs root to chown')
+def test_directory_of_another_user_is_refused(tmp_path):
+    os.chown(tmp_path, 12345, 12345)
+    with pytest.raises(PermissionError):
+        MapArtifactStore(1024, str(tmp_path))
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from network_model import load_network
+
+
+def write_network(tmp_path, stations, lines):
+    path = tmp_path / 'network.json'
+    path.write_text(json.dumps({
+        'name': 'Test Metro',
+        'stations': stations,
+        'lines': [{'name': name, 'stations': line_stations} for name, line_stations in lines.items()]
+    }), encoding='utf-8')
+    return str(path)
+
+
+STATIONS = {'A': [21.0, 72.0], 'B': [21.01, 72.0], 'C': [21.02, 72.0], 'D': [21.02, 72.01], 'E': [21.03, 72.02]}
+
+
+def test_connected_network_loads(tmp_path):
+    network = load_network(write_network(tmp_path, STATIONS, {'Red Line': ['A', 'B', 'C'],
+                                                              'Green Line': ['C', 'D', 'E']}))
+    assert network.transfer_stations == {'C'}
+
+
+def test_station_on_no_line_is_rejected(tmp_path):
+    path = write_network(tmp_path, STATIONS, {'Red Line': ['A', 'B', 'C', 'D']})
+    with pytest.raises(ValueError, match='E'):
+        load_network(path)
+
+
+def test_lines_without_interchange_load(tmp_path):
+    # e.g. one file for the metros of several cities
+    network = load_network(write_network(tmp_path, STATIONS, {'Red Line': ['A', 'B', 'C'], 'Blue Line': ['D', 'E']}))
+    assert network.transfer_stations == frozenset()
+    assert network.lines_of('D') == ('Blue Line',)
@@ -0,0 +1,99 @@
+import os
+import random
+
+import pytest
+
+from network_model import load_network
+from raptor import INFINITY, RaptorEngine
+from routing_engine import haversine_km
+from timetable import Timetable, synthetic_feed
+
+NETWORK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'network.json')
+
+# A chain of lines, so the far corners are three trips apart, with a diagonal shortcut
+GRID_COORDS = {f"{row}{column}": (21.0 + 0.01 * i, 72.0 + 0.01 * j)
+               for i, row in enumerate('ABCDE') for j, column in enumerate('12345')}
+GRID_LINES = {
+    'Top Line': ['A1', 'A2', 'A3', 'A4', 'A5'],
+    'Middle Line': ['A3', 'B3', 'C3', 'D3', 'E3'],
+    'Bottom Line': ['E1', 'E2', 'E3', 'E4', 'E5'],
+    'Diagonal Line': ['E1', 'D2', 'C3'],
+}
+
+
+def feed_for(lines, station_coords, headway_seconds):
+    hop_seconds = {
+        (line, a, b): haversine_km(station_coords[a], station_coords[b]) / 34.0 * 3600.0
+        for line, line_stations in lines.items()
+        for a, b in zip(line_stations, line_stations[1:])
+    }
+    return Timetable(synthetic_feed(lines, hop_seconds, station_coords, headway_seconds=headway_seconds,
+                                    transfer_seconds=180))
+
+
+def connection_scan(timetable, origins, targets, departure_time):
+    """
+    Reference earliest arrival by the Connection Scan Algorithm (Dibbelt et al.):
+    every elementary connection in departure order, boarding where the stop was
+    reached before the departure (after the stop's change time) or staying on a
+    trip already boarded.
+    """
+    connections = []
+    for pattern in range(len(timetable.pattern_names)):
+        stops = timetable.pattern_stops[timetable.pattern_stop_ptr[pattern]:timetable.pattern_stop_ptr[pattern + 1]]
+        count = int(timetable.pattern_trip_counts[pattern])
+        offset = int(timetable.pattern_time_ptr[pattern])
+        for trip in range(count):
+            for position in range(len(stops) - 1):
+                departure = int(timetable.departures[offset + position * count + trip])
+                arrival = int(timetable.arrivals[offset + (position + 1) * count + trip])
+                connections.append((departure, arrival, int(stops[position]), int(stops[position + 1]),
+                                    (pattern, trip)))
+    connections.sort()
+
+    best = [INFINITY] * len(timetable.stop_ids)
+    ready = [INFINITY] * len(timetable.stop_ids)
+    for stop in origins:
+        best[stop] = ready[stop] = departure_time
+    boarded = set()
+    for departure, arrival, from_stop, to_stop, trip in connections:
+        if departure < departure_time:
+            continue
+        if trip in boarded or ready[from_stop] <= departure:
+            boarded.add(trip)
+            if arrival < best[to_stop]:
+                best[to_stop] = arrival
+                ready[to_stop] = arrival + int(timetable.change_seconds[to_stop])
+    return min(best[stop] for stop in targets)
+
+
+@pytest.mark.parametrize('lines, station_coords, headway_seconds', [
+    pytest.param(None, None, 600, id='network.json'),
+    pytest.param(GRID_LINES, GRID_COORDS, 420, id='grid'),
+])
+def test_raptor_matches_connection_scan(lines, station_coords, headway_seconds):
+    if lines is None:
+        network = load_network(NETWORK_PATH)
+        lines, station_coords = network.line_stations(), network.station_coords
+    timetable = feed_for(lines, station_coords, headway_seconds)
+    engine = RaptorEngine(timetable)
+    names = sorted({station for line_stations in lines.values() for station in line_stations})
+    rng = random.Random(0)
+
+    for _ in range(150):
+        start, end = rng.sample(names, 2)
+        departure_time = rng.randrange(5 * 3600, 24 * 3600)
+        origins, targets = timetable.stops_by_name[start], timetable.stops_by_name[end]
+        journey = engine.earliest_arrival(origins, targets, departure_time)
+        expected = connection_scan(timetable, origins, targets, departure_time)
+
+        assert (journey.arrival if journey else INFINITY) == expected, (start, end, departure_time)
+        if journey is not None:
+            # Legs chain in time from the departure to the arrival
+            clock = departure_time
+            for leg in journey.legs:
+                assert leg.departure >= clock
+                assert leg.arrival >= leg.departure
+                clock = leg.arrival
+            assert clock == journey.arrival
+            assert timetable.stop_names[journey.legs[-1].to_stop] == end
@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from render_pool import RenderPool, RenderQueueFull
+
+
+def test_running_job_is_shared():
+    pool = RenderPool(max_workers=1)
+    release = threading.Event()
+    job = pool.submit('key', lambda: release.wait(5) and 'map')
+    assert pool.submit('key', lambda: 'other') is job
+    release.set()
+    assert job.wait(5) and job.status == 'done' and job.result == 'map'
+
+
+def test_failed_job_is_rendered_again():
+    pool = RenderPool(max_workers=1)
+    attempts = []
+
+    def render():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise OSError('transient')
+        return 'map'
+
+    failed = pool.submit('key', render)
+    assert failed.wait(5) and failed.status == 'failed'
+    retried = pool.submit('key', render)
+    assert retried is not failed
+    assert retried.wait(5) and retried.status == 'done' and retried.result == 'map'
+    assert pool.get(retried.id) is retried
+    assert pool.stats()['failed'] == 1 and pool.stats()['completed'] == 1
+
+
+def test_full_queue_rejects():
+    pool = RenderPool(max_workers=1, max_queue=1)
+    release = threading.Event()
+    pool.submit('running', lambda: release.wait(5))
+    # Wait until the first job has left the queue for the worker
+    while pool.queued:
+        time.sleep(0.001)
+    pool.submit('queued', lambda: None)
+    with pytest.raises(RenderQueueFull):
+        pool.submit('rejected', lambda: None)
+    release.set()
@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from network_model import load_network
+from routing_engine import RouteTable, RoutingEngine
+from station_catalog import StationCatalog
+
+# Red and Green share C; Blue shares no station with them
+NETWORK = {
+    'name': 'Test Metro',
+    'stations': {
+        'A': [21.00, 72.00], 'B': [21.01, 72.00], 'C': [21.02, 72.00], 'D': [21.02, 72.01],
+        'E': [21.03, 72.02], 'X': [21.10, 72.10], 'Y': [21.11, 72.10],
+    },
+    'lines': [
+        {'name': 'Red Line', 'stations': ['A', 'B', 'C']},
+        {'name': 'Green Line', 'stations': ['C', 'D', 'E']},
+        {'name': 'Blue Line', 'stations': ['X', 'Y']},
+    ],
+}
+
+
+@pytest.fixture
+def app_client():
+    import base
+
+    return base.app.test_client()
+
+
+@pytest.fixture(params=['precomputed', 'searched'])
+def client(request, monkeypatch, tmp_path):
+    import base
+
+    path = tmp_path / 'network.json'
+    path.write_text(json.dumps(NETWORK), encoding='utf-8')
+    network = load_network(str(path))
+    engine = RoutingEngine(network.line_stations(), network.station_coords)
+    monkeypatch.setattr(base, 'network', network)
+    monkeypatch.setattr(base, 'all_stations', network.station_coords)
+    monkeypatch.setattr(base, 'station_catalog', StationCatalog(network))
+    monkeypatch.setattr(base, 'routing_engine', engine)
+    monkeypatch.setattr(base, 'route_table', RouteTable(engine) if request.param == 'precomputed' else None)
+    monkeypatch.setattr(base, '_network_digest', base.kml_geometry.digest)
+    monkeypatch.setattr(base, 'network_version', base.network_version + 1000)
+    monkeypatch.setattr(base, '_travel_times', {'version': None, 'matrix': None})
+    monkeypatch.setattr(base, 'rendered_maps', base.ByteLRUCache(1024 * 1024))
+    return base.app.test_client()
+
+
+def test_route_between_connected_stations(app_client):
+    response = app_client.get('/api/route?start=Sarthana&end=Saroli')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['route'][0]['station'], body['route'][-1]['station']) == ('Sarthana', 'Saroli')
+    assert body['estimated_minutes'] > 0
+    assert body['geometry']['type'] == 'FeatureCollection'
+
+
+def test_route_between_disconnected_stations_is_404(client):
+    response = client.get('/api/route?start=A&end=X')
+    assert response.status_code == 404
+    assert response.get_json()['error'] == 'no route'
+
+
+def test_isochrone_leaves_out_unreachable_stations(client):
+    response = client.get('/api/isochrone?origin=A&minutes=1440')
+    assert response.status_code == 200
+    assert {station['station'] for station in response.get_json()['stations']} == {'A', 'B', 'C', 'D', 'E'}
+
+
+def test_batch_reports_unreachable_pairs_and_keeps_streaming(client):
+    pairs = [['A', 'E'], ['A', 'X'], ['Nowhere', 'A'], ['X', 'Y']]
+    response = client.post('/api/routes/batch', data=json.dumps(pairs), content_type='application/json')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == len(pairs) + 1
+    assert lines[0]['route'][-1]['station'] == 'E'
+    assert lines[1] == {'start': 'A', 'end': 'X', 'error': 'no route'}
+    assert lines[2]['error'] == 'unknown station'
+    assert lines[3]['route'][-1]['station'] == 'Y'
+    assert lines[4] == {'done': True, 'count': 4, 'unique': 3}
+
+
+def test_batch_rejects_oversized_or_malformed_first_pair(client, monkeypatch):
+    import batch_routing
+
+    monkeypatch.setattr(batch_routing, 'MAX_ELEMENT_SIZE', 1024)
+    response = client.post('/api/routes/batch', data=b'{"start": "' + b'A' * 5000,
+                           content_type='application/x-ndjson')
+    assert response.status_code == 413
+    response = client.post('/api/routes/batch', data=b'[["A" "E"]]', content_type='application/json')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('k', [True, False, 1.0, '1'])
+def test_nearest_batch_rejects_non_integer_k(client, k):
+    response = client.post('/api/nearest/batch', json={'points': [[21.2, 72.8]], 'k': k})
+    assert response.status_code == 400
+
+
+def test_journey_resolves_station_names_like_route(app_client):
+    response = app_client.get('/api/journey?start=railway+stn&end=SARTHANA&depart=08:00')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['start'], body['end']) == ('Surat Railway Station', 'Sarthana')
+    assert app_client.get('/api/journey?start=Nowhere&end=Sarthana&depart=08:00').status_code == 400
+
+
+@pytest.mark.parametrize('depart', ['25:99', '08:60', '08:00:75'])
+def test_journey_rejects_out_of_range_departure(app_client, depart):
+    response = app_client.get(f'/api/journey?start=Sarthana&end=Saroli&depart={depart}')
+    assert response.status_code == 400
+
+
+def test_index_map_is_served_by_any_worker(app_client, monkeypatch):
+    import base
+
+    # A worker that has rendered nothing yet and has never seen the render job
+    monkeypatch.setattr(base, 'rendered_maps', base.ByteLRUCache(base.MAP_CACHE_MAX_BYTES))
+    monkeypatch.setattr(base, '_base_layers', {'key': None, 'layers': {}})
+    monkeypatch.setattr(base, 'render_pool', base.RenderPool(1, 4))
+
+    url = '/maps/route?start=Sarthana&end=Saroli'
+    response = app_client.get(url)
+    assert response.status_code == 202
+    base.render_pool.get(response.headers['X-Render-Job']).wait(60)
+    response = app_client.get(url)
+    assert response.status_code == 302
+    assert app_client.get(response.headers['Location']).status_code == 200
+    assert app_client.get('/maps/route?start=Sarthana&end=Nowhere').status_code == 404
+
+
+@pytest.mark.parametrize('url', ['/map', '/map?line=red', '/all_routes', '/route_info'])
+def test_overview_maps_answer_if_none_match_with_304(app_client, url):
+    response = app_client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+    cached = app_client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert app_client.get(url, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_overview_map_etag_depends_on_line_filter(app_client):
+    assert app_client.get('/map?line=red').headers['ETag'] != app_client.get('/map?line=green').headers['ETag']
@@ -0,0 +1,80 @@
+import itertools
+import pickle
+
+import numpy as np
+import pytest
+
+from routing_engine import RouteTable, RoutingEngine
+
+# Red and Green share C; Blue shares no station with them and F is on no line
+STATION_COORDS = {
+    'A': (21.00, 72.00), 'B': (21.01, 72.00), 'C': (21.02, 72.00), 'D': (21.02, 72.01),
+    'E': (21.03, 72.02), 'X': (21.10, 72.10), 'Y': (21.11, 72.10), 'F': (21.20, 72.20),
+}
+LINES = {'Red Line': ['A', 'B', 'C'], 'Green Line': ['C', 'D', 'E'], 'Blue Line': ['X', 'Y']}
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return RoutingEngine(LINES, STATION_COORDS)
+
+
+def random_engine(seed):
+    # Lines through random stations that cross each other, so routes have transfers and ties
+    rng = np.random.default_rng(seed)
+    names = [f"S{i}" for i in range(60)]
+    coords = {name: (21.0 + rng.random() * 0.2, 72.7 + rng.random() * 0.2) for name in names}
+    lines = {f"L{i}": [names[j] for j in rng.choice(len(names), size=int(rng.integers(4, 15)), replace=False)]
+             for i in range(8)}
+    return RoutingEngine(lines, coords)
+
+
+def test_route_table_reports_unreachable_pairs(engine):
+    table = RouteTable(engine)
+    for start, end in (('A', 'X'), ('X', 'A'), ('A', 'F'), ('F', 'A'), ('F', 'F')):
+        with pytest.raises(ValueError):
+            table.timed_route(start, end)
+    with pytest.raises(KeyError):
+        table.timed_route('A', 'Nowhere')
+    assert table.timed_route('X', 'Y')[1][-1]['station'] == 'Y'
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_route_table_matches_search(seed):
+    engine = random_engine(seed) if seed else RoutingEngine(LINES, STATION_COORDS)
+    table = RouteTable(engine)
+    for start, end in itertools.product(engine.station_names, repeat=2):
+        try:
+            expected_seconds, expected_route = engine.timed_route(start, end)
+        except ValueError:
+            with pytest.raises(ValueError):
+                table.timed_route(start, end)
+            continue
+        seconds, route = table.timed_route(start, end)
+        assert seconds == pytest.approx(expected_seconds)
+        assert route[0]['station'] == start and route[-1]['station'] == end
+        # Lines sharing a segment give equal-time routes that differ only in the line ridden
+        if route != expected_route:
+            assert sum(stop['is_transfer'] for stop in route) == sum(stop['is_transfer'] for stop in expected_route)
+
+
+def test_route_table_survives_pickling(engine):
+    table = pickle.loads(pickle.dumps(RouteTable(engine)))
+    assert table.timed_route('A', 'E') == engine.timed_route('A', 'E')
+
+
+def test_lookup_reports_no_route(engine, monkeypatch):
+    import base
+
+    monkeypatch.setattr(base, 'routing_engine', engine)
+    monkeypatch.setattr(base, '_network_digest', base.kml_geometry.digest)
+    for table in (RouteTable(engine), None):
+        # Precomputed, and searched per request when the network is too large to precompute
+        monkeypatch.setattr(base, 'route_table', table)
+        seconds, route = base.find_timed_route('A', 'E')
+        assert [station['station'] for station in route] == ['A', 'B', 'C', 'C', 'D', 'E']
+        assert seconds > 0
+        with pytest.raises(ValueError):
+            base.find_route_with_changes('A', 'X')
+        with pytest.raises(KeyError):
+            base.find_route_with_changes('A', 'Nowhere')
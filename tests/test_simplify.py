@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+from kml_store import extract_route_coordinates_from_kml
+from simplify import SIMPLIFY_TOLERANCES_M, max_deviation_m, simplification_ranks
+
+KML_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'base.kml')
+
+
+def random_polylines(count=100, seed=0):
+    # Random walks around Surat, from nearly straight to zigzagging, each with a few pinned vertices
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        n = int(rng.integers(2, 400))
+        step_m = rng.uniform(1.0, 200.0)
+        jitter = rng.uniform(0.0, 1.5)
+        heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0.0, jitter, n))
+        steps = np.column_stack((np.sin(heading), np.cos(heading))) * step_m / 111_000.0
+        coords = np.array([21.2, 72.83]) + np.cumsum(steps, axis=0)
+        pinned = rng.choice(n, size=min(n, int(rng.integers(0, 6))), replace=False)
+        yield coords, pinned
+
+
+def polylines():
+    for name, coords in extract_route_coordinates_from_kml(KML_PATH).items():
+        yield pytest.param(np.asarray(coords, dtype=np.float64), (), id=name)
+    for i, (coords, pinned) in enumerate(random_polylines()):
+        yield pytest.param(coords, pinned, id=f'random-{i}')
+
+
+@pytest.mark.parametrize('coords, pinned', list(polylines()))
+def test_deviation_within_tolerance_at_every_level(coords, pinned):
+    ranks = simplification_ranks(coords, pinned=pinned)
+    for tolerance in SIMPLIFY_TOLERANCES_M:
+        keep = ranks > tolerance
+        assert keep[0] and keep[-1]
+        assert keep[list(pinned)].all()
+        assert max_deviation_m(coords, keep) <= tolerance + 1e-6
+
+
+@pytest.mark.parametrize('coords, pinned', list(polylines())[:10])
+def test_levels_are_nested(coords, pinned):
+    # A coarser level keeps a subset of the vertices of every finer one
+    ranks = simplification_ranks(coords, pinned=pinned)
+    masks = [ranks > tolerance for tolerance in sorted(SIMPLIFY_TOLERANCES_M)]
+    for finer, coarser in zip(masks, masks[1:]):
+        assert not (coarser & ~finer).any()
@@ -0,0 +1,52 @@
+import pytest
+
+from station_search import StationSearchIndex, normalize
+
+STATIONS = [
+    ('Majura Gate', ('Majura',)),
+    ('Gateway Mall', ()),
+    ('Surat Railway Station', ('Railway Stn',)),
+    ('Gandhi Gate Road', ()),
+    ('Majuri Nagar', ()),
+]
+
+
+@pytest.fixture
+def index():
+    return StationSearchIndex(STATIONS)
+
+
+def ranked(matches):
+    return [(match.station, match.match) for match in matches]
+
+
+def test_name_prefix_ranks_before_word_prefix_then_station_order(index):
+    assert ranked(index.search('gate')) == [
+        ('Gateway Mall', 'prefix'), ('Majura Gate', 'word'), ('Gandhi Gate Road', 'word')]
+    # Short queries read precomputed matches instead of bisecting the keys, and rank the same
+    assert ranked(index.search('gat')) == ranked(index.search('gate'))
+    assert ranked(index.search('ga')) == [
+        ('Gateway Mall', 'prefix'), ('Gandhi Gate Road', 'prefix'), ('Majura Gate', 'word')]
+
+
+def test_exact_then_fuzzy(index):
+    matches = index.search('majura')
+    assert ranked(matches) == [('Majura Gate', 'exact'), ('Majuri Nagar', 'fuzzy')]
+    assert matches[0].alias == 'Majura'
+    assert 0 < matches[1].score < 1
+
+
+def test_misspelling_falls_back_to_fuzzy(index):
+    assert ranked(index.search('majira gate'))[0] == ('Majura Gate', 'fuzzy')
+
+
+def test_abbreviations_and_punctuation_are_normalized(index):
+    assert normalize('Surat Rly. Stn') == 'surat railway station'
+    assert ranked(index.search('rly stn')) == [('Surat Railway Station', 'exact')]
+    assert ranked(index.search('Rly. St')) == [('Surat Railway Station', 'prefix')]
+
+
+def test_limit_and_empty_queries(index):
+    assert len(index.search('g', limit=1)) == 1
+    assert index.search('  ') == []
+    assert index.search('gate', limit=0) == []
@@ -0,0 +1,36 @@
+import pytest
+
+from timetable import Timetable, parse_gtfs_time
+
+
+def feed(stop_times):
+    return {
+        'stops': [{'stop_id': stop, 'stop_name': stop} for stop in 'ABCD'],
+        'routes': [{'route_id': 'R', 'route_short_name': 'Red'}],
+        'trips': [{'route_id': 'R', 'trip_id': 'T'}],
+        'stop_times': [{'trip_id': 'T', 'stop_sequence': str(i), 'stop_id': stop,
+                        'arrival_time': time, 'departure_time': time}
+                       for i, (stop, time) in enumerate(stop_times)],
+    }
+
+
+def test_parse_gtfs_time():
+    assert parse_gtfs_time('08:05') == 8 * 3600 + 5 * 60
+    assert parse_gtfs_time(' 25:10:30 ') == 25 * 3600 + 10 * 60 + 30
+
+
+@pytest.mark.parametrize('value', ['25:99', '08:60', '08:00:60', '08', '8:00:00:00', '-1:00', 'a:b', '08:+5'])
+def test_parse_gtfs_time_rejects_invalid_times(value):
+    with pytest.raises(ValueError):
+        parse_gtfs_time(value)
+
+
+def test_untimed_stops_are_interpolated():
+    timetable = Timetable(feed([('A', '08:00:00'), ('B', ''), ('C', ''), ('D', '08:09:00')]))
+    assert timetable.departures.tolist() == [8 * 3600, 8 * 3600 + 180, 8 * 3600 + 360, 8 * 3600 + 540]
+    assert timetable.arrivals.tolist() == timetable.departures.tolist()
+
+
+def test_trip_without_time_at_its_last_stop_is_rejected():
+    with pytest.raises(ValueError, match='first and last stop'):
+        Timetable(feed([('A', '08:00:00'), ('B', '08:03:00'), ('C', '')]))
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+from vector_tiles import NetworkTiles, clip_polyline, tile_bounds, tile_coordinates
+
+BOX = (0.0, 0.0, 1.0, 1.0)  # south, west, north, east
+
+
+def test_clip_cuts_segments_at_the_bounds():
+    parts = clip_polyline(np.array([[0.5, -1.0], [0.5, 2.0]]), BOX)
+    assert parts == [[(0.5, 0.0), (0.5, 1.0)]]
+
+
+def test_clip_drops_lines_outside_and_splits_lines_leaving_and_coming_back():
+    assert clip_polyline(np.array([[2.0, 2.0], [3.0, 3.0]]), BOX) == []
+    parts = clip_polyline(np.array([[0.5, 0.5], [0.5, 1.5], [0.2, 1.5], [0.2, 0.5]]), BOX)
+    assert parts == [[(0.5, 0.5), (0.5, 1.0)], [(0.2, 1.0), (0.2, 0.5)]]
+
+
+def test_clip_keeps_vertices_of_a_line_inside():
+    coords = np.array([[0.1, 0.1], [0.5, 0.9], [0.9, 0.1]])
+    parts = clip_polyline(coords, BOX)
+    assert len(parts) == 1
+    np.testing.assert_allclose(parts[0], coords)
+
+
+def test_tile_bounds_match_tile_coordinates():
+    south, west, north, east = tile_bounds(12, 2876, 1828)
+    x, y = tile_coordinates(np.array([(south + north) / 2]), np.array([(west + east) / 2]), 12)
+    assert (int(x[0]), int(y[0])) == (2876, 1828)
+    assert south < north and west < east
+
+
+@pytest.fixture
+def tiles():
+    line = {'name': 'Red Line', 'id': 'red', 'color': '#ff0000',
+            'geometry': lambda zoom: [(21.17, 72.78), (21.21, 72.86)]}
+    station = {'name': 'A', 'coord': (21.17, 72.78), 'lines': ['red'], 'color': '#ff0000', 'transfer': False}
+    return NetworkTiles([line], [station], 10, 12)
+
+
+def test_tiles_outside_zoom_range_or_grid_are_missing(tiles):
+    assert tiles.get(9, 0, 0) is None
+    assert tiles.get(13, 0, 0) is None
+    assert tiles.get(10, -1, 0) is None
+    assert tiles.get(10, 0, 2 ** 10) is None
+    assert json.loads(tiles.get(10, 0, 0)) == {'type': 'FeatureCollection', 'features': []}
+
+
+def test_station_tile_holds_the_station_and_the_clipped_line(tiles):
+    x, y = tile_coordinates(np.array([21.17]), np.array([72.78]), 12)
+    features = json.loads(tiles.get(12, int(x[0]), int(y[0])))['features']
+    kinds = {feature['properties']['kind']: feature for feature in features}
+    assert kinds['station']['properties']['name'] == 'A'
+    south, west, north, east = tile_bounds(12, int(x[0]), int(y[0]))
+    pad_lat, pad_lon = (north - south) / 32, (east - west) / 32
+    for part in kinds['line']['geometry']['coordinates']:
+        for lon, lat in part:
+            assert south - pad_lat <= lat <= north + pad_lat and west - pad_lon <= lon <= east + pad_lon
+
+
+def test_tile_endpoint_rejects_stale_versions_and_bad_tiles():
+    import base
+
+    client = base.app.test_client()
+    config = base.network_tiles_config()
+    url = config['url'].replace('{z}/{x}/{y}', '{}/{}/{}')
+    zoom = config['min_zoom']
+    response = client.get(url.format(zoom, 0, 0))
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert client.get(url.format(zoom, 2 ** zoom, 0)).status_code == 404
+    assert client.get(url.format(config['max_zoom'] + 1, 0, 0)).status_code == 404
+    assert client.get(url.replace(base.network_tiles().version, 'stale').format(zoom, 0, 0)).status_code == 404
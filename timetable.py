@@ -0,0 +1,314 @@
+import csv
+import io
+import os
+import zipfile
+
+import numpy as np
+
+GTFS_TABLES = ('stops', 'routes', 'trips', 'stop_times')
+
+
+def parse_gtfs_time(value):
+    """
+    Seconds after midnight for a GTFS "HH:MM:SS" (or "HH:MM") time. Hours may
+    exceed 23 for trips running past midnight.
+
+    Raises:
+        ValueError: If value is not such a time, e.g. "25:99"
+    """
+    parts = value.strip().split(':')
+    if len(parts) == 2:
+        parts.append('0')
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        raise ValueError(f"Not a GTFS time: {value!r}")
+    hours, minutes, seconds = (int(part) for part in parts)
+    if minutes > 59 or seconds > 59:
+        raise ValueError(f"Not a GTFS time: {value!r}")
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def format_gtfs_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def read_gtfs(path):
+    """
+    Read the tables of a GTFS feed (a directory or a .zip) as lists of row dicts,
+    keyed by table name ('stops', 'routes', 'trips', 'stop_times' and, when
+    present, 'transfers').
+    """
+    tables = {}
+    if os.path.isdir(path):
+        for name in GTFS_TABLES + ('transfers',):
+            file_path = os.path.join(path, name + '.txt')
+            if os.path.exists(file_path):
+                with open(file_path, encoding='utf-8-sig', newline='') as f:
+                    tables[name] = list(csv.DictReader(f))
+    else:
+        with zipfile.ZipFile(path) as feed:
+            names = set(feed.namelist())
+            for name in GTFS_TABLES + ('transfers',):
+                if name + '.txt' in names:
+                    with feed.open(name + '.txt') as f:
+                        tables[name] = list(csv.DictReader(io.TextIOWrapper(f, encoding='utf-8-sig', newline='')))
+
+    missing = [name for name in GTFS_TABLES if name not in tables]
+    if missing:
+        raise ValueError(f"GTFS feed {path} is missing {', '.join(name + '.txt' for name in missing)}")
+    return tables
+
+
+def write_gtfs(path, tables):
+    """
+    Write GTFS tables (as returned by read_gtfs()) to a directory.
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, rows in tables.items():
+        if not rows:
+            continue
+        with open(os.path.join(path, name + '.txt'), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def synthetic_feed(lines, hop_seconds, station_coords, first_departure=6 * 3600, last_departure=23 * 3600,
+                   headway_seconds=600, dwell_seconds=30, transfer_seconds=180):
+    """
+    Build GTFS tables for a network with no published timetable: every line
+    runs in both directions from first_departure to last_departure at a fixed
+    headway, and stations served by several lines get a same-stop transfer time.
+
+    Args:
+        lines (dict): Line name -> ordered list of station names
+        hop_seconds (dict): (line, a, b) -> running time between adjacent stations
+        station_coords (dict): Station name -> (lat, lon)
+    """
+    stop_ids = {station: f"S{i}" for i, station in enumerate(station_coords)}
+    tables = {
+        'stops': [
+            {'stop_id': stop_ids[station], 'stop_name': station, 'stop_lat': lat, 'stop_lon': lon}
+            for station, (lat, lon) in station_coords.items()
+        ],
+        'routes': [],
+        'trips': [],
+        'stop_times': [],
+        'transfers': [],
+    }
+
+    served = {}
+    for line_number, (line, line_stations) in enumerate(lines.items()):
+        route_id = f"R{line_number}"
+        tables['routes'].append({'route_id': route_id, 'route_short_name': line, 'route_long_name': line,
+                                 'route_type': 1})
+        for station in line_stations:
+            served.setdefault(station, set()).add(line)
+
+        for direction, sequence in enumerate((line_stations, line_stations[::-1])):
+            for departure in range(first_departure, last_departure + 1, headway_seconds):
+                trip_id = f"{route_id}_{direction}_{departure}"
+                tables['trips'].append({'route_id': route_id, 'service_id': 'daily', 'trip_id': trip_id,
+                                        'direction_id': direction})
+                clock = departure
+                for stop_sequence, station in enumerate(sequence):
+                    if stop_sequence > 0:
+                        previous = sequence[stop_sequence - 1]
+                        seconds = hop_seconds.get((line, previous, station))
+                        if seconds is None:
+                            seconds = hop_seconds[(line, station, previous)]
+                        clock += int(round(seconds))
+                    arrival = clock
+                    if 0 < stop_sequence < len(sequence) - 1:
+                        clock += dwell_seconds
+                    tables['stop_times'].append({
+                        'trip_id': trip_id,
+                        'arrival_time': format_gtfs_time(arrival),
+                        'departure_time': format_gtfs_time(clock),
+                        'stop_id': stop_ids[station],
+                        'stop_sequence': stop_sequence,
+                    })
+
+    for station, station_lines in served.items():
+        if len(station_lines) > 1:
+            tables['transfers'].append({'from_stop_id': stop_ids[station], 'to_stop_id': stop_ids[station],
+                                        'transfer_type': 2, 'min_transfer_time': transfer_seconds})
+    return tables
+
+
+class Timetable:
+    """
+    Array-backed timetable laid out for RAPTOR.
+
+    Trips are grouped into patterns: trips of one GTFS route that visit the
+    same stop sequence and never overtake each other, so the trips of a
+    pattern are ordered at every stop. For each pattern the arrival and
+    departure times are stored stop-major (all trips at the pattern's first
+    stop, then all trips at its second stop, ...) in flat int32 arrays, so
+    finding the earliest catchable trip at a stop is a binary search over a
+    contiguous slice. Stop -> pattern and stop -> footpath lookups are CSR arrays.
+    """
+
+    def __init__(self, tables):
+        """
+        Args:
+            tables (dict): GTFS tables as returned by read_gtfs() or synthetic_feed()
+        """
+        self.stop_ids = [row['stop_id'] for row in tables['stops']]
+        self.stop_names = [row.get('stop_name') or row['stop_id'] for row in tables['stops']]
+        self.stop_index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.stops_by_name = {}
+        for i, name in enumerate(self.stop_names):
+            self.stops_by_name.setdefault(name, []).append(i)
+
+        route_names = {
+            row['route_id']: row.get('route_short_name') or row.get('route_long_name') or row['route_id']
+            for row in tables['routes']
+        }
+        trip_route = {row['trip_id']: row['route_id'] for row in tables['trips']}
+
+        # Stop sequence and times of every trip
+        trip_stop_times = {}
+        for row in tables['stop_times']:
+            if row['trip_id'] not in trip_route:
+                continue
+            # Non-timepoint stops leave both times blank; they are interpolated below
+            arrival = (row.get('arrival_time') or '').strip() or (row.get('departure_time') or '').strip()
+            departure = (row.get('departure_time') or '').strip() or arrival
+            trip_stop_times.setdefault(row['trip_id'], []).append((
+                int(row['stop_sequence']),
+                self.stop_index[row['stop_id']],
+                parse_gtfs_time(arrival) if arrival else None,
+                parse_gtfs_time(departure) if departure else None
+            ))
+
+        # Group trips by route and stop sequence, ordered by first departure
+        groups = {}
+        for trip_id, stop_times in trip_stop_times.items():
+            stop_times.sort()
+            _interpolate_stop_times(trip_id, stop_times)
+            stops = tuple(stop for _, stop, _, _ in stop_times)
+            times = ([arrival for _, _, arrival, _ in stop_times], [departure for _, _, _, departure in stop_times])
+            groups.setdefault((trip_route[trip_id], stops), []).append((times[1][0], trip_id, times))
+
+        # Split each group into patterns without overtaking
+        patterns = []
+        for (route_id, stops), trips in groups.items():
+            trips.sort()
+            route_patterns = []
+            for _, trip_id, times in trips:
+                for pattern in route_patterns:
+                    last_arrivals, last_departures = pattern[-1][2]
+                    if (all(arrival >= last for arrival, last in zip(times[0], last_arrivals))
+                            and all(departure >= last for departure, last in zip(times[1], last_departures))):
+                        pattern.append((None, trip_id, times))
+                        break
+                else:
+                    route_patterns.append([(None, trip_id, times)])
+            for pattern in route_patterns:
+                patterns.append((route_names.get(route_id, route_id), stops, pattern))
+
+        self.pattern_names = []
+        self.pattern_trip_ids = []
+        pattern_stops = []
+        stop_ptr = [0]
+        time_ptr = [0]
+        trip_counts = []
+        arrivals = []
+        departures = []
+        for route_name, stops, trips in patterns:
+            self.pattern_names.append(route_name)
+            self.pattern_trip_ids.append([trip_id for _, trip_id, _ in trips])
+            pattern_stops.extend(stops)
+            stop_ptr.append(len(pattern_stops))
+            trip_counts.append(len(trips))
+            for position in range(len(stops)):
+                arrivals.extend(times[0][position] for _, _, times in trips)
+                departures.extend(times[1][position] for _, _, times in trips)
+            time_ptr.append(len(arrivals))
+
+        self.pattern_stops = np.array(pattern_stops, dtype=np.int32)
+        self.pattern_stop_ptr = np.array(stop_ptr, dtype=np.int32)
+        self.pattern_time_ptr = np.array(time_ptr, dtype=np.int64)
+        self.pattern_trip_counts = np.array(trip_counts, dtype=np.int32)
+        self.arrivals = np.array(arrivals, dtype=np.int32)
+        self.departures = np.array(departures, dtype=np.int32)
+
+        # Patterns serving each stop, with the stop's position in the pattern
+        serving = [[] for _ in self.stop_ids]
+        for pattern in range(len(patterns)):
+            for position, stop in enumerate(pattern_stops[stop_ptr[pattern]:stop_ptr[pattern + 1]]):
+                serving[stop].append((pattern, position))
+        self.stop_pattern_ptr = np.array([0] + np.cumsum([len(entries) for entries in serving]).tolist(), dtype=np.int32)
+        self.stop_patterns = np.array([pattern for entries in serving for pattern, _ in entries], dtype=np.int32)
+        self.stop_pattern_positions = np.array([position for entries in serving for _, position in entries], dtype=np.int32)
+
+        # Minimum change time at a stop, and footpaths between different stops
+        self.change_seconds = np.zeros(len(self.stop_ids), dtype=np.int32)
+        footpaths = [[] for _ in self.stop_ids]
+        for row in tables.get('transfers', []):
+            if str(row.get('transfer_type', '0')) == '3':
+                continue
+            from_stop = self.stop_index.get(row['from_stop_id'])
+            to_stop = self.stop_index.get(row['to_stop_id'])
+            if from_stop is None or to_stop is None:
+                continue
+            seconds = int(row.get('min_transfer_time') or 0)
+            if from_stop == to_stop:
+                self.change_seconds[from_stop] = seconds
+            else:
+                footpaths[from_stop].append((to_stop, seconds))
+        self.footpath_ptr = np.array([0] + np.cumsum([len(paths) for paths in footpaths]).tolist(), dtype=np.int32)
+        self.footpath_stops = np.array([stop for paths in footpaths for stop, _ in paths], dtype=np.int32)
+        self.footpath_seconds = np.array([seconds for paths in footpaths for _, seconds in paths], dtype=np.int32)
+
+    @property
+    def num_trips(self):
+        return int(self.pattern_trip_counts.sum())
+
+    def stats(self):
+        return {
+            'stops': len(self.stop_ids),
+            'patterns': len(self.pattern_names),
+            'trips': self.num_trips,
+            'stop_times': len(self.arrivals),
+            'bytes': sum(array.nbytes for array in (
+                self.pattern_stops, self.pattern_stop_ptr, self.pattern_time_ptr, self.pattern_trip_counts,
+                self.arrivals, self.departures, self.stop_pattern_ptr, self.stop_patterns,
+                self.stop_pattern_positions, self.change_seconds, self.footpath_ptr, self.footpath_stops,
+                self.footpath_seconds
+            )),
+        }
+
+
+def _interpolate_stop_times(trip_id, stop_times):
+    """
+    Fill in the times of a trip's untimed stops, spacing them evenly between
+    the timed stops around them.
+
+    Args:
+        trip_id (str): Trip the stop times belong to, for error messages
+        stop_times (list): (stop_sequence, stop, arrival, departure) tuples in
+            sequence order, with None times at untimed stops; updated in place
+
+    Raises:
+        ValueError: If the first or last stop of the trip has no time
+    """
+    timed = [i for i, (_, _, arrival, _) in enumerate(stop_times) if arrival is not None]
+    if not timed or timed[0] != 0 or timed[-1] != len(stop_times) - 1:
+        raise ValueError(f"Trip {trip_id} needs times at its first and last stop")
+    for before, after in zip(timed, timed[1:]):
+        leave = stop_times[before][3]
+        reach = stop_times[after][2]
+        for i in range(before + 1, after):
+            seconds = leave + round((reach - leave) * (i - before) / (after - before))
+            sequence, stop, _, _ = stop_times[i]
+            stop_times[i] = (sequence, stop, seconds, seconds)
+
+
+def load_gtfs(path):
+    """
+    Load a GTFS feed (directory or .zip) into a Timetable. All trips are
+    treated as running every day; calendar.txt is not applied.
+    """
+    return Timetable(read_gtfs(path))
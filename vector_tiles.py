@@ -0,0 +1,183 @@
+import hashlib
+import json
+import math
+
+import numpy as np
+
+# Overlap drawn into each tile, as a fraction of the tile, so lines join seamlessly across edges
+TILE_BUFFER = 1.0 / 64
+
+
+def tile_coordinates(lat, lon, zoom):
+    """
+    Fractional Web Mercator (x, y) tile coordinates of points, as arrays.
+    """
+    n = 2 ** zoom
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = (np.asarray(lon) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * n
+    return x, y
+
+
+def tile_bounds(zoom, x, y):
+    """
+    (south, west, north, east) in degrees of tile z/x/y.
+    """
+    n = 2 ** zoom
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def clip_polyline(coords, bounds):
+    """
+    Clip a polyline of (lat, lon) rows to bounds (south, west, north, east)
+    with Liang-Barsky, vectorized over the segments.
+
+    Returns:
+        list: The parts inside bounds, each a list of (lat, lon)
+    """
+    if len(coords) < 2:
+        return []
+    south, west, north, east = bounds
+    start, end = coords[:-1], coords[1:]
+    delta = end - start
+    t0 = np.zeros(len(start))
+    t1 = np.ones(len(start))
+    visible = np.ones(len(start), dtype=bool)
+    for p, q in ((-delta[:, 1], start[:, 1] - west), (delta[:, 1], east - start[:, 1]),
+                 (-delta[:, 0], start[:, 0] - south), (delta[:, 0], north - start[:, 0])):
+        parallel = p == 0
+        visible &= ~(parallel & (q < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = q / p
+        t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+        t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+    visible &= t0 <= t1
+
+    parts = []
+    current = None
+    clipped_start = start + t0[:, None] * delta
+    clipped_end = start + t1[:, None] * delta
+    for i in np.flatnonzero(visible).tolist():
+        # A part continues while consecutive segments stay inside across their shared vertex
+        if current is None or i - 1 != previous or t1[previous] < 1 or t0[i] > 0:
+            current = [tuple(clipped_start[i])]
+            parts.append(current)
+        current.append(tuple(clipped_end[i]))
+        previous = i
+    return parts
+
+
+class NetworkTiles:
+    """
+    The network layer pre-cut into z/x/y GeoJSON tiles for a range of zoom
+    levels, serialized once and held in memory.
+
+    Each tile is a FeatureCollection with one MultiLineString per line
+    (clipped to the tile plus a small buffer, from the geometry simplified
+    for that zoom) and a Point per station inside the tile. Coordinates are
+    rounded to the precision the zoom level can show. Tiles the network
+    does not touch share one empty collection.
+    """
+
+    def __init__(self, lines, stations, min_zoom, max_zoom):
+        """
+        Args:
+            lines (list): Dicts with 'name', 'id', 'color' and 'geometry', a
+                function returning the (N, 2) (lat, lon) array to draw at a zoom
+            stations (list): Dicts with 'name', 'coord', 'lines' (line ids), 'color' and 'transfer'
+            min_zoom (int): Lowest zoom level served
+            max_zoom (int): Highest zoom level served; clients over-zoom beyond it
+        """
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.tiles = {}
+        self.empty = json.dumps({'type': 'FeatureCollection', 'features': []}).encode('utf-8')
+
+        for zoom in range(min_zoom, max_zoom + 1):
+            decimals = min(7, max(3, math.ceil(math.log10(256 * 2 ** zoom / 360.0)) + 1))
+            features = {}
+            for line in lines:
+                coords = np.asarray(line['geometry'](zoom), dtype=np.float64).reshape(-1, 2)
+                for tile, parts in self._clip_line(coords, zoom).items():
+                    features.setdefault(tile, []).append({
+                        'type': 'Feature',
+                        'geometry': {
+                            'type': 'MultiLineString',
+                            'coordinates': [[[round(lon, decimals), round(lat, decimals)] for lat, lon in part]
+                                            for part in parts]
+                        },
+                        'properties': {'kind': 'line', 'line': line['name'], 'id': line['id'],
+                                       'color': line['color']}
+                    })
+            for station in stations:
+                lat, lon = station['coord']
+                x, y = tile_coordinates(lat, lon, zoom)
+                features.setdefault((zoom, int(x), int(y)), []).append({
+                    'type': 'Feature',
+                    'geometry': {'type': 'Point', 'coordinates': [round(lon, decimals), round(lat, decimals)]},
+                    'properties': {'kind': 'station', 'name': station['name'], 'lines': station['lines'],
+                                   'color': station['color'], 'transfer': station['transfer']}
+                })
+            for tile, tile_features in features.items():
+                self.tiles[tile] = json.dumps({'type': 'FeatureCollection', 'features': tile_features},
+                                              separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+        digest = hashlib.sha1()
+        for tile in sorted(self.tiles):
+            digest.update(repr(tile).encode('utf-8'))
+            digest.update(self.tiles[tile])
+        # Part of every tile URL, so tiles can be cached as immutable
+        self.version = digest.hexdigest()[:12]
+
+    @staticmethod
+    def _clip_line(coords, zoom):
+        # Tiles overlapped by each segment's bounding box (plus the buffer), then one clip per tile
+        if len(coords) < 2:
+            return {}
+        x, y = tile_coordinates(coords[:, 0], coords[:, 1], zoom)
+        lo_x = np.floor(np.minimum(x[:-1], x[1:]) - TILE_BUFFER).astype(int)
+        hi_x = np.floor(np.maximum(x[:-1], x[1:]) + TILE_BUFFER).astype(int)
+        lo_y = np.floor(np.minimum(y[:-1], y[1:]) - TILE_BUFFER).astype(int)
+        hi_y = np.floor(np.maximum(y[:-1], y[1:]) + TILE_BUFFER).astype(int)
+        segments_of = {}
+        for i in range(len(coords) - 1):
+            for tile_x in range(lo_x[i], hi_x[i] + 1):
+                for tile_y in range(lo_y[i], hi_y[i] + 1):
+                    segments_of.setdefault((tile_x, tile_y), []).append(i)
+
+        clipped = {}
+        for (tile_x, tile_y), segments in segments_of.items():
+            south, west, north, east = tile_bounds(zoom, tile_x, tile_y)
+            pad_lat, pad_lon = (north - south) * TILE_BUFFER, (east - west) * TILE_BUFFER
+            bounds = (south - pad_lat, west - pad_lon, north + pad_lat, east + pad_lon)
+            # Clip runs of consecutive segments, so parts stay joined where they can
+            parts = []
+            run_start = segments[0]
+            for previous, current in zip(segments, segments[1:] + [None]):
+                if current != previous + 1:
+                    parts += clip_polyline(coords[run_start:previous + 2], bounds)
+                    run_start = current
+            if parts:
+                clipped[(zoom, tile_x, tile_y)] = parts
+        return clipped
+
+    def get(self, zoom, x, y):
+        """
+        Return the tile as GeoJSON bytes, or None outside the zoom range.
+        """
+        if not self.min_zoom <= zoom <= self.max_zoom or not (0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+            return None
+        return self.tiles.get((zoom, x, y), self.empty)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'min_zoom': self.min_zoom,
+            'max_zoom': self.max_zoom,
+            'tiles': len(self.tiles),
+            'bytes': sum(len(body) for body in self.tiles.values()),
+        }